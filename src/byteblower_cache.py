@@ -0,0 +1,99 @@
+"""
+On disk cache of rewritten ByteBlower projects.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 32
+
+
+class ProjectCache(object):
+    """Content addressed cache of rewritten projects and their pre-calculated metadata.
+
+    Entries are keyed by the hash of the source project and the reservation attributes used to patch it. The least
+    recently used entries are evicted once the total size of the cached projects or the number of entries exceeds the
+    limits, the most recently used entry is never evicted.
+
+    :param cache_dir: parent directory for the cache directory, the cache directory itself is created on first use.
+    """
+
+    def __init__(self, logger, cache_dir=None, max_size=DEFAULT_MAX_SIZE, max_entries=DEFAULT_MAX_ENTRIES):
+        self.logger = logger
+        self.parent_dir = cache_dir
+        self.max_size = max_size
+        self.max_entries = max_entries
+        self.cache_dir = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(project, attributes):
+        """Calculate cache key from the source project content and the attributes used to patch it.
+
+        :param project: full path to the source project.
+        :param attributes: JSON serializable reservation attributes.
+        """
+        digest = hashlib.sha256()
+        with open(project, "rb") as reader:
+            for chunk in iter(lambda: reader.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        digest.update(json.dumps(attributes, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def project_file(self, key):
+        """Full path of the rewritten project for the requested key, the caller writes it before calling put."""
+        if not self.cache_dir:
+            if self.parent_dir:
+                os.makedirs(self.parent_dir, exist_ok=True)
+            self.cache_dir = tempfile.mkdtemp(prefix="bbp-cache-", dir=self.parent_dir).replace("\\", "/")
+        return f"{self.cache_dir}/{key}.bbp"
+
+    def get(self, key):
+        """Get cached entry.
+
+        :return: (rewritten project full path, metadata) or None if the key is not cached.
+        """
+        if key not in self.entries or not os.path.exists(self.project_file(key)):
+            self.entries.pop(key, None)
+            self.misses += 1
+            self.logger.debug(f"Project cache miss {key} (hits {self.hits}, misses {self.misses})")
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        self.logger.debug(f"Project cache hit {key} (hits {self.hits}, misses {self.misses})")
+        with open(self._metadata_file(key), "r") as reader:
+            return self.project_file(key), json.load(reader)
+
+    def put(self, key, metadata):
+        """Add the rewritten project, already written to project_file(key), and its metadata to the cache."""
+        with open(self._metadata_file(key), "w") as writer:
+            json.dump(metadata, writer)
+        self.entries[key] = os.path.getsize(self.project_file(key))
+        self.entries.move_to_end(key)
+        self._evict()
+
+    def clear(self):
+        """Remove all cached entries and the cache directory."""
+        self.entries.clear()
+        if self.cache_dir:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self.cache_dir = None
+
+    def _metadata_file(self, key):
+        return f"{self.cache_dir}/{key}.json"
+
+    def _evict(self):
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or sum(self.entries.values()) > self.max_size):
+            key, _ = self.entries.popitem(last=False)
+            self.logger.debug(f"Project cache evict {key}")
+            for file_name in (self.project_file(key), self._metadata_file(key)):
+                if os.path.exists(file_name):
+                    os.remove(file_name)
@@ -0,0 +1,191 @@
+"""
+Incremental parser for ByteBlower CLT output.
+"""
+import codecs
+import re
+import threading
+import time
+from collections import deque
+
+SCENARIO_START = "scenario_start"
+FLOW_START = "flow_start"
+FLOW_STOP = "flow_stop"
+PROGRESS = "progress"
+WARNING = "warning"
+FAILURE = "failure"
+
+# (event type, pattern), the first matching pattern sets the line event type.
+CLT_PATTERNS = [
+    (FAILURE, re.compile(r"Action failed|!MESSAGE Failed")),
+    (FLOW_START, re.compile(r"StartTraffic")),
+    (FLOW_STOP, re.compile(r"StopTraffic")),
+    (SCENARIO_START, re.compile(r"start(ing)? scenario|scenario\b.*\bstart", re.IGNORECASE)),
+    (WARNING, re.compile(r"\bwarn(ing)?\b|!MESSAGE Warning", re.IGNORECASE)),
+    (PROGRESS, re.compile(r"(?P<progress>\d+(\.\d+)?)\s*%")),
+]
+
+MAX_LINE_LENGTH = 64 * 1024
+MAX_EVENTS = 1024
+
+
+class CltEvent(object):
+    """Single event parsed from CLT output.
+
+    :ivar type: one of SCENARIO_START, FLOW_START, FLOW_STOP, PROGRESS, WARNING, FAILURE.
+    :ivar line: the CLT output line.
+    :ivar flow: flow name for FLOW_START/FLOW_STOP events, if found in the line.
+    :ivar progress: progress percentage for PROGRESS events.
+    """
+
+    def __init__(self, type, line, flow=None, progress=None):
+        self.type = type
+        self.line = line
+        self.flow = flow
+        self.progress = progress
+        self.timestamp = time.time()
+
+    def __repr__(self):
+        return f"CltEvent({self.type}, {self.line!r})"
+
+
+class CltOutputParser(object):
+    """Turn chunks of CLT output into CltEvents, keeping partial lines between chunks.
+
+    :param callback: called with each event, in output order.
+    :param flows: known flow names, used to identify the flow of FLOW_START/FLOW_STOP events.
+    """
+
+    def __init__(self, callback, flows=None):
+        self.callback = callback
+        self.flows_re = None
+        if flows:
+            names = sorted(flows, key=len, reverse=True)
+            self.flows_re = re.compile(r"(?<![\w-])(" + "|".join(re.escape(f) for f in names) + r")(?![\w-])")
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.partial = ""
+
+    def feed(self, chunk):
+        """Parse chunk of output, bytes or str, only complete lines are parsed."""
+        if isinstance(chunk, bytes):
+            chunk = self.decoder.decode(chunk)
+        if not chunk:
+            return
+        lines = (self.partial + chunk).split("\n")
+        self.partial = lines.pop()
+        if len(self.partial) > MAX_LINE_LENGTH:
+            lines.append(self.partial)
+            self.partial = ""
+        for line in lines:
+            self._parse_line(line.rstrip("\r"))
+
+    def close(self):
+        """Parse the last, unterminated, line."""
+        self.feed(self.decoder.decode(b"", final=True))
+        if self.partial:
+            self._parse_line(self.partial.rstrip("\r"))
+            self.partial = ""
+
+    def _parse_line(self, line):
+        for event_type, pattern in CLT_PATTERNS:
+            match = pattern.search(line)
+            if not match:
+                continue
+            event = CltEvent(event_type, line.strip())
+            if event_type in (FLOW_START, FLOW_STOP) and self.flows_re:
+                flow = self.flows_re.search(line)
+                event.flow = flow.group(1) if flow else None
+            elif event_type == PROGRESS:
+                event.progress = float(match.group("progress"))
+            self.callback(event)
+            return
+
+
+class CltState(object):
+    """Thread safe run state fed by CltEvents, with a bounded queue of events for consumers.
+
+    :param expected_flows: number of flows in the scenario, if known the traffic is completed only after that many flows
+        stopped, otherwise after the first time all started flows stopped.
+    :param completed: event to set on failure or when the traffic is completed.
+    :ivar traffic_started: set once the first flow started.
+    :ivar traffic_running: True while at least one flow is running.
+    :ivar failed: first failure line or None.
+    :ivar exit_code: CLT exit code, None while the CLT is running.
+    """
+
+    def __init__(self, logger, state_changed=None, max_events=MAX_EVENTS, expected_flows=None, completed=None):
+        self.logger = logger
+        self.state_changed = state_changed or threading.Event()
+        self.expected_flows = expected_flows
+        self.completed = completed or threading.Event()
+        self.stopped_flows = 0
+        self.lock = threading.Lock()
+        self.events = deque(maxlen=max_events)
+        self.dropped = 0
+        self.running_flows = 0
+        self.traffic_started = threading.Event()
+        self.traffic_running = False
+        self.failed = None
+        self.progress = None
+        self.exit_code = None
+
+    def on_event(self, event):
+        self.logger.debug(f"CLT event {event.type}: {event.line}")
+        with self.lock:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            traffic_running = self.traffic_running
+            if event.type == FLOW_START:
+                self.running_flows += 1
+                self.traffic_started.set()
+            elif event.type == FLOW_STOP:
+                self.running_flows = max(self.running_flows - 1, 0)
+                self.stopped_flows += 1
+            elif event.type == PROGRESS:
+                self.progress = event.progress
+            elif event.type == FAILURE and not self.failed:
+                self.failed = event.line
+                self.logger.error(f"CLT failure: {event.line}")
+            elif event.type == WARNING:
+                self.logger.warning(f"CLT warning: {event.line}")
+            self.traffic_running = self.running_flows > 0
+            changed = self.traffic_running != traffic_running or event.type in (FAILURE, FLOW_START)
+            completed = self.failed or (
+                self.traffic_started.isSet() and not self.traffic_running and self.stopped_flows >= (self.expected_flows or 0)
+            )
+        if completed and not self.completed.isSet():
+            self.logger.info("CLT traffic completed")
+            self.completed.set()
+        if changed:
+            self.state_changed.set()
+
+    def on_exit(self, exit_code, stopped=False):
+        """Clear the running state once the CLT exited.
+
+        An exit with error or with flows still running is a failure, unless the CLT was stopped.
+
+        :param exit_code: CLT exit code, None if unknown.
+        :param stopped: True if the CLT was stopped by the driver.
+        """
+        with self.lock:
+            running_flows = self.running_flows
+            self.running_flows = 0
+            self.traffic_running = False
+            self.exit_code = exit_code
+            if not stopped and not self.failed and (exit_code or running_flows):
+                self.failed = f"CLT exited with code {exit_code}" + (
+                    f" while {running_flows} flows were running" if running_flows else ""
+                )
+                self.logger.error(f"CLT failure: {self.failed}")
+        self.completed.set()
+        self.state_changed.set()
+
+    def get_events(self):
+        """Pop all queued events.
+
+        :return: list of CltEvents, oldest first.
+        """
+        with self.lock:
+            events = list(self.events)
+            self.events.clear()
+        return events
@@ -1,6 +1,9 @@
+import json
+
 from cloudshell.traffic.tg import TgControllerDriver, enqueue_keep_alive
 
 from byteblower_handler import ByteBlowerHandler
+from byteblower_series import DEFAULT_PERCENTILES
 
 
 class ByteBlowerControllerShell2GDriver(TgControllerDriver):
@@ -9,26 +12,69 @@ class ByteBlowerControllerShell2GDriver(TgControllerDriver):
 
     def load_config(self, context, config_file_location, scenario):
         enqueue_keep_alive(context)
-        self.handler.load_config(context, config_file_location, scenario)
+        with self.handler.spans.span("load_config", scenario=scenario):
+            self.handler.load_config(context, config_file_location, scenario)
 
-    def start_traffic(self, context, blocking):
+    def start_traffic(self, context, blocking, registration_timeout=""):
         """Start traffic on all ports.
 
         :param blocking: True - return after traffic finish to run, False - return immediately.
+        :param registration_timeout: seconds to wait for all endpoints to register, empty for the default.
         """
-        return super().start_traffic(context, blocking)
+        with self.handler.spans.span("start_traffic", blocking=str(blocking)):
+            status = self.handler.start_traffic(
+                context, blocking, float(registration_timeout) if registration_timeout else None
+            )
+        if status:
+            return f"traffic finished with status {status}"
+        return f"traffic started in {blocking} mode"
 
     def stop_traffic(self, context):
         """Stop traffic on all ports."""
-        return super().stop_traffic(context)
+        with self.handler.spans.span("stop_traffic"):
+            return super().stop_traffic(context)
 
     def get_test_status(self, context):
         """Get test status - not started, running, finished."""
-        return self.handler.get_test_status()
+        with self.handler.spans.span("get_test_status"):
+            return self.handler.get_test_status()
 
     def get_rt_statistics(self, context):
         """Get real time statistics for all ports and endpoints."""
-        return self.handler.get_rt_statistics()
+        with self.handler.spans.span("get_rt_statistics"):
+            return self.handler.get_rt_statistics()
+
+    def get_rt_statistics_delta(self, context, cursor, interval, names):
+        """Get ports and endpoints samples recorded since the previous call as compact JSON.
+
+        :param cursor: cursor returned by the previous call, empty to get all samples of the current run.
+        :param interval: average samples to buckets of interval seconds, empty for raw samples.
+        :param names: comma separated ports and endpoints logical names, empty for all.
+        """
+        with self.handler.spans.span("get_rt_statistics_delta"):
+            delta = self.handler.get_rt_statistics_delta(
+                cursor or None,
+                float(interval) if interval else None,
+                [n.strip() for n in names.split(",") if n.strip()] if names else None,
+            )
+        return json.dumps(delta, separators=(",", ":"))
+
+    def query_statistics(self, context, names, start, end, percentiles):
+        """Get min, max, mean and percentiles of ports and endpoints statistics over time window.
+
+        :param names: comma separated ports and endpoints logical names, empty for all.
+        :param start: window start in seconds since traffic start, empty for run start.
+        :param end: window end in seconds since traffic start, empty for run end.
+        :param percentiles: comma separated percentiles, ex. 50,90,99.
+        """
+        with self.handler.spans.span("query_statistics"):
+            summary = self.handler.query_statistics(
+                [n.strip() for n in names.split(",") if n.strip()] if names else None,
+                float(start) if start else None,
+                float(end) if end else None,
+                [float(p) for p in percentiles.split(",") if p.strip()] if percentiles else DEFAULT_PERCENTILES,
+            )
+        return json.dumps(summary, indent=2)
 
     def get_statistics(self, context, view_name, output_type):
         """Get view statistics.
@@ -36,11 +82,13 @@ class ByteBlowerControllerShell2GDriver(TgControllerDriver):
         :param view_name: port, traffic item, flow group etc.
         :param output_type: CSV or JSON.
         """
-        return super().get_statistics(context, view_name, output_type)
+        with self.handler.spans.span("get_statistics", view_name=view_name, output_type=output_type):
+            return super().get_statistics(context, view_name, output_type)
 
     def endpoint_health_check(self, context):
         """Verify all EndPoints are up and running."""
-        return self.handler._validate_endpoint_wifi(context)
+        with self.handler.spans.span("endpoint_health_check"):
+            return self.handler._validate_endpoint_wifi(context)
 
     #
     # Parent commands are not visible so we re define them in child.
@@ -50,7 +98,8 @@ class ByteBlowerControllerShell2GDriver(TgControllerDriver):
         super().initialize(context)
 
     def cleanup(self):
-        super().cleanup()
+        with self.handler.spans.span("cleanup"):
+            super().cleanup()
 
     def cleanup_reservation(self, context):
         pass
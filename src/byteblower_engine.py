@@ -0,0 +1,128 @@
+"""
+Single event loop that drives the endpoints agents, the CLT and the statistics sampling of a run.
+"""
+import asyncio
+import sys
+import threading
+from concurrent import futures
+
+# blocking RPyC and byteblowerll calls run on a bounded pool, so the number of threads does not grow with endpoints.
+ENGINE_MAX_WORKERS = 16
+
+
+class RunEngine(object):
+    """Event loop running in a dedicated thread plus a bounded executor for blocking calls.
+
+    Tasks are submitted from the synchronous driver commands with submit and awaited with the returned future.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, max_workers=ENGINE_MAX_WORKERS):
+        # subprocesses on Windows need the proactor loop, it is the default only from python 3.8.
+        self.loop = asyncio.ProactorEventLoop() if sys.platform == "win32" else asyncio.new_event_loop()
+        self.executor = futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="RunEngineWorker")
+        self.loop.set_default_executor(self.executor)
+        self.thread = threading.Thread(target=self._run, name="RunEngineLoop")
+        self.thread.daemon = True
+        self.thread.start()
+
+    @classmethod
+    def default(cls):
+        """Get the engine shared by all tasks created without explicit engine."""
+        with cls._default_lock:
+            if cls._default is None or cls._default.loop.is_closed():
+                cls._default = RunEngine()
+            return cls._default
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine):
+        """Schedule coroutine on the loop.
+
+        :return: concurrent.futures.Future of the coroutine result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def call_soon(self, callback, *args):
+        """Call callback in the loop thread, safe to call from any thread."""
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    async def run_blocking(self, func, *args):
+        """Run blocking function on the engine executor."""
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    def close(self):
+        """Cancel all tasks, stop the loop and the executor."""
+        if self.loop.is_closed():
+            return
+
+        async def cancel_all():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            self.submit(cancel_all()).result(5)
+        except futures.TimeoutError:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        if not self.thread.is_alive():
+            self.loop.close()
+        self.executor.shutdown(wait=False)
+
+
+class EngineTask(object):
+    """Coroutine running on RunEngine behind the threading.Thread interface (start, join, is_alive).
+
+    Subclasses implement the run coroutine and use wait_finished to sleep until the next iteration or until stopped.
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine or RunEngine.default()
+        self.finished = threading.Event()
+        self.future = None
+        self._wake = None
+
+    def start(self):
+        self.future = self.engine.submit(self._main())
+
+    def is_alive(self):
+        return self.future is not None and not self.future.done()
+
+    def join(self, timeout=None):
+        if self.future is not None:
+            futures.wait([self.future], timeout)
+
+    def stop_task(self):
+        """Set finished and wake the task if it is waiting, safe to call from any thread."""
+        self.finished.set()
+        if self._wake is not None:
+            self.engine.call_soon(self._wake.set)
+
+    async def wait_finished(self, timeout):
+        """Wait until finished is set or timeout passed.
+
+        :return: True if finished is set.
+        """
+        if not self.finished.isSet():
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.finished.isSet()
+
+    async def _main(self):
+        self._wake = asyncio.Event()
+        if self.finished.isSet():
+            self._wake.set()
+        await self.run()
+
+    async def run(self):
+        raise NotImplementedError
@@ -1,311 +1,723 @@
+import json
 import os
-import tempfile
+import threading
 import time
-import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from types import MappingProxyType
 
-from byteblowerll import byteblower
-from cloudshell.traffic.helpers import get_family_attribute, get_resources_from_reservation
-from cloudshell.traffic.tg import BYTEBLOWER_CHASSIS_MODEL, TgControllerHandler, is_blocking
-from netaddr import EUI
-from netaddr.core import AddrFormatError
+from cloudshell.traffic.tg import BYTEBLOWER_CHASSIS_MODEL, TgControllerHandler, attach_stats_csv, is_blocking
 
+from byteblower_cache import ProjectCache
+from byteblower_clt import FLOW_START, FLOW_STOP, PROGRESS, SCENARIO_START
 from byteblower_data_model import ByteBlower_Controller_Shell_2G
-from byteblower_threads import EpCmd, EpThread, ServerThread
+from byteblower_engine import RunEngine
+from byteblower_lazy import byteblower, netaddr, prewarm, prewarm_enabled
+from byteblower_project import PortPatch, ProjectIndex, RateProfile, get_intended_tx, get_rate_profiles, rewrite_project
+from byteblower_report import CltReport
+from byteblower_reservation import ReservationAttributes
+from byteblower_samples import SampleRing
+from byteblower_series import DEFAULT_PERCENTILES, SeriesStore
+from byteblower_session import ByteBlowerSession
+from byteblower_spans import Spans, spans_enabled
+from byteblower_supervisor import CLT_METRICS, reap_orphan_clts
+from byteblower_threads import (
+    EP_CONNECT_TIMEOUT,
+    CltRun,
+    EpAgent,
+    EpCmd,
+    EpConnectionPool,
+    EpThread,
+    SamplingOptions,
+    ServerThread,
+    StatsSampler,
+    is_transport_error,
+)
 
 BYTEBLOWER_PORT_MODEL = BYTEBLOWER_CHASSIS_MODEL + ".GenericTrafficGeneratorPort"
 BYTEBLOWER_ENDPOINT_MODEL = BYTEBLOWER_CHASSIS_MODEL + ".ByteBlowerEndPoint"
 
+PROJECTS_DIR = "c:/temp/"
+
+EP_START_MAX_WORKERS = 16
+EP_REGISTRATION_TIMEOUT = 60
+EP_SAMPLES_CAPACITY = 4096
+TRAFFIC_START_TIMEOUT = 300
+# blocking start_traffic waits for the scenario duration * factor + margin, or the default if the duration is unknown.
+TRAFFIC_END_TIMEOUT_FACTOR = 1.5
+TRAFFIC_END_TIMEOUT_MARGIN = 300
+TRAFFIC_END_DEFAULT_TIMEOUT = 24 * 60 * 60
+TRAFFIC_PROGRESS_INTERVAL = 60
+CLT_EXIT_TIMEOUT = 60
+STATS_SAMPLER_STOP_TIMEOUT = 30
+
+# get_rt_statistics key of the snapshot metadata, reserved so it cannot collide with ports and endpoints logical names.
+RT_STATISTICS_META = "_meta"
+
+WIFI_COMMAND_TIMEOUT = 10
+WIFI_CHECK_DEADLINE = 30
+WIFI_CHECK_MAX_WORKERS = 32
+
+RunContext = namedtuple(
+    "RunContext",
+    [
+        "project",
+        "scenario",
+        "reservation_ports",
+        "reservation_eps",
+        "bb_ports",
+        "intended_tx",
+        "flows",
+        "scenarios",
+        "rate_profiles",
+        "eps_threads",
+        "server_thread",
+        "stats_sampler",
+        "series_store",
+        "clt_report",
+        "traffic_start_time",
+    ],
+)
+RunContext.__doc__ = """Immutable configuration and run state.
+
+Commands read the handler run_context once and use only that snapshot, load_config and start_traffic publish a new
+context by replacing the attribute, so readers never see a half built configuration or run.
+
+:ivar reservation_ports: {logical name: reservation port resource}, same for reservation_eps.
+:ivar bb_ports: {logical name: byteblowerll ResultHistory}
+:ivar eps_threads: {logical name: EpThread}
+"""
+EMPTY_RUN_CONTEXT = RunContext(
+    project=None,
+    scenario=None,
+    reservation_ports=MappingProxyType({}),
+    reservation_eps=MappingProxyType({}),
+    bb_ports=MappingProxyType({}),
+    intended_tx=MappingProxyType({}),
+    flows=(),
+    scenarios=MappingProxyType({}),
+    rate_profiles=MappingProxyType({}),
+    eps_threads=MappingProxyType({}),
+    server_thread=None,
+    stats_sampler=None,
+    series_store=None,
+    clt_report=None,
+    traffic_start_time=None,
+)
+
 
 class ByteBlowerHandler(TgControllerHandler):
     def __init__(self):
         super().__init__()
 
-        self.server_thread = None
-        self.eps_threads = None
-        self.reservation_ports = {}
-        self.reservation_eps = {}
-        self.bb_ports = {}
-        self.intended_tx = {}
-        self.project = None
-        self.scenario = None
+        self.run_context = EMPTY_RUN_CONTEXT
+        # serialize the commands that publish new run context.
+        self.lock = threading.RLock()
+        self.bb_session = None
+        self.engine = None
+        self.project_cache = None
+        self.eps_pool = None
+        self.clt_progress = None
+        self.prewarm_thread = None
+        self.orphans_reaped = False
+        self.reservation = ReservationAttributes()
+        self.spans = Spans(None, enabled=False)
 
     def initialize(self, context, logger):
         service = ByteBlower_Controller_Shell_2G.create_from_context(context)
         super().initialize(service, logger, service)
+        # heavy modules are imported on first use, pre-warm them while the driver waits for its first command.
+        self.prewarm_thread = prewarm(logger) if prewarm_enabled() else None
+        log_file_name = logger.handlers[0].baseFilename if logger.handlers else None
+        metrics_file = os.path.splitext(log_file_name)[0] + "-metrics.jsonl" if log_file_name else None
+        self.spans = Spans(logger, metrics_file, enabled=spans_enabled())
+        self.project_cache = ProjectCache(logger, PROJECTS_DIR)
+        self.eps_pool = EpConnectionPool(logger)
+        self.reservation = ReservationAttributes(logger)
+        self.engine = RunEngine()
 
     def cleanup(self):
-        self.stop_traffic()
-        if self.project:
-            if os.path.exists(self.project):
-                os.remove(self.project)
+        with self.lock:
+            self.stop_traffic()
+            if self.project_cache:
+                self.project_cache.clear()
+            if self.eps_pool:
+                self.eps_pool.close()
+            self.reservation.invalidate()
+            if self.run_context.series_store:
+                self.run_context.series_store.close()
+            if self.bb_session:
+                self.bb_session.close()
+                self.bb_session = None
+            self.run_context = EMPTY_RUN_CONTEXT
+            if self.engine:
+                self.engine.close()
+                self.engine = None
 
     def load_config(self, context, bbl_config_file_name, scenario):
+        with self.lock:
+            self._load_config(context, bbl_config_file_name, scenario)
+
+    def _load_config(self, context, bbl_config_file_name, scenario):
+        # pick up attributes edited during the reservation, the next commands use the attributes read by this load.
+        self.reservation.invalidate()
+
+        # walking the processes imports psutil, reap once before the first run starts CLT instead of at initialize.
+        if not self.orphans_reaped:
+            with self.spans.span("reap_orphan_clts"):
+                reap_orphan_clts(self.logger)
+            self.orphans_reaped = True
+
         # check connected state of eps
-        self._validate_endpoint_wifi(context)
+        with self.spans.span("validate_wifi"):
+            self._validate_endpoint_wifi(context)
 
         project = bbl_config_file_name.replace("\\", "/")
         if not os.path.exists(project):
-            raise EnvironmentError(f"Configuration file {self.project} not found")
-        self.project = tempfile.mktemp(".bbp", dir="c:/temp/").replace("\\", "/")
-        self.scenario = scenario
-
-        xml = ET.parse(project)
-        xml_root = xml.getroot()
-        xml_gui_ports = xml_root.findall("ByteBlowerGuiPort")
-
-        bb = byteblower.ByteBlower.InstanceGet()
-        server = bb.ServerAdd(self.service.address)
-
-        self.reservation_eps = {}
-        for ep in get_resources_from_reservation(context, BYTEBLOWER_ENDPOINT_MODEL):
-            logical_name = get_family_attribute(context, ep.Name, "Logical Name")
-            self.reservation_eps[logical_name] = ep
-            xml_gui_port = self._find_xml_gui_port(xml_gui_ports, logical_name)
-            identifier = get_family_attribute(context, ep.Name, "Identifier")
-            xml_gui_port.find("ByteBlowerGuiPortConfiguration").attrib["physicalInterfaceId"] = identifier
-
-        self.reservation_ports = {}
-        self.bb_ports = {}
-        for port in get_resources_from_reservation(context, BYTEBLOWER_PORT_MODEL):
-            logical_name = get_family_attribute(context, port.Name, "Logical Name")
-            self.reservation_ports[logical_name] = port
-            xml_gui_port = self._find_xml_gui_port(xml_gui_ports, logical_name)
-            bb_port_name = port.Name.split("/")[-1]
+            raise EnvironmentError(f"Configuration file {project} not found")
+
+        with self.spans.span("reservation_attributes"):
+            resources = self.reservation.resources(context, BYTEBLOWER_ENDPOINT_MODEL, BYTEBLOWER_PORT_MODEL)
+            reservation_eps = {}
+            eps_identifiers = {}
+            for ep in [r for r in resources if r.ResourceModelName == BYTEBLOWER_ENDPOINT_MODEL]:
+                logical_name = self.reservation.get(context, ep.Name, "Logical Name")
+                reservation_eps[logical_name] = ep
+                eps_identifiers[logical_name] = self.reservation.get(context, ep.Name, "Identifier")
+
+            reservation_ports = {}
+            ports_attributes = {}
+            for port in [r for r in resources if r.ResourceModelName == BYTEBLOWER_PORT_MODEL]:
+                logical_name = self.reservation.get(context, port.Name, "Logical Name")
+                reservation_ports[logical_name] = port
+                try:
+                    value = netaddr.EUI(self.reservation.get(context, port.Name, "Mac Address"))
+                except netaddr.AddrFormatError:
+                    raise Exception(f"Invalid Mac Address value for {port.Name}")
+                ports_attributes[logical_name] = {
+                    "Name": port.Name,
+                    "Mac Address": str(value),
+                    "Address": self.reservation.get(context, port.Name, "Address"),
+                    "Gateway": self.reservation.get(context, port.Name, "Gateway"),
+                    "Netmask": self.reservation.get(context, port.Name, "Netmask"),
+                }
+            if RT_STATISTICS_META in reservation_eps or RT_STATISTICS_META in reservation_ports:
+                raise Exception(f"Logical Name {RT_STATISTICS_META} is reserved")
+
+        with self.spans.span("project"):
+            key = ProjectCache.key(project, {"endpoints": eps_identifiers, "ports": ports_attributes})
+            cached = self.project_cache.get(key)
+            if cached:
+                new_project, metadata = cached
+            else:
+                new_project = self.project_cache.project_file(key)
+                metadata = self._rewrite_project(project, new_project, eps_identifiers, ports_attributes)
+                self.project_cache.put(key, metadata)
+        if scenario not in metadata["scenarios"]:
+            self.logger.warning(f"Scenario {scenario} not found in project, project scenarios: {list(metadata['scenarios'])}")
+
+        # the previous run threads are kept so stop_traffic still stops them, its statistics sampler is replaced. It is
+        # stopped before the server setup clears the results histories it refreshes.
+        stats_sampler = self.run_context.stats_sampler
+        if stats_sampler:
+            stats_sampler.stop()
+            stats_sampler.join(STATS_SAMPLER_STOP_TIMEOUT)
+
+        with self.spans.span("server_setup"):
+            bb_ports = self._setup_server(reservation_ports, metadata, ports_attributes)
+
+        self.run_context = self.run_context._replace(
+            project=new_project,
+            scenario=scenario,
+            reservation_ports=MappingProxyType(reservation_ports),
+            reservation_eps=MappingProxyType(reservation_eps),
+            bb_ports=MappingProxyType(bb_ports),
+            intended_tx=MappingProxyType(metadata["intended_tx"]),
+            flows=tuple(metadata["flows"]),
+            scenarios=MappingProxyType(metadata["scenarios"]),
+            rate_profiles=MappingProxyType(
+                {
+                    kind: {name: RateProfile.from_dict(profile) for name, profile in profiles.items()}
+                    for kind, profiles in metadata["profiles"].get(scenario, {}).items()
+                }
+            ),
+            stats_sampler=None,
+        )
+        # the ports of the previous context are destroyed only once it is no longer published.
+        self.bb_session.release()
 
-            try:
-                value = EUI(get_family_attribute(context, port.Name, "Mac Address"))
-            except AddrFormatError:
-                raise Exception(f"Invalid Mac Address value for {port.Name}")
-            xml_entry = xml_gui_port.find("layer2Configuration").find("MacAddress")
-            for mac_byte, xml_byte in zip(str(value).split("-"), xml_entry.findall("bytes")):
-                xml_byte.text = str(int(mac_byte, 16)) if int(mac_byte, 16) <= 127 else str(int(mac_byte, 16) - 256)
-
-            attributes = ["Address", "Gateway", "Netmask"]
-            entries = ["IpAddress", "DefaultGateway", "Netmask"]
-            for attribute, entry in zip(attributes, entries):
-                value = get_family_attribute(context, port.Name, attribute)
-                xml_entry = xml_gui_port.find("ipv4Configuration").find(entry)
-                for ip_byte, xml_byte in zip(value.split("."), xml_entry.findall("bytes")):
-                    xml_byte.text = ip_byte if int(ip_byte) <= 127 else str(int(ip_byte) - 256)
-
-            trigger = server.PortCreate(bb_port_name).RxTriggerBasicAdd()
-            if xml_gui_port.find("ByteBlowerGuiPortConfiguration").attrib["physicalPortId"] != "-1":
-                identifier = int(bb_port_name.split("-")[-1]) - 1
-                xml_gui_port.find("ByteBlowerGuiPortConfiguration").attrib["physicalPortId"] = str(identifier)
+    def _setup_server(self, reservation_ports, metadata, ports_attributes):
+        """Get the ports result histories from the session scoped ByteBlower objects.
+
+        :return: {logical name: byteblowerll ResultHistory}
+        """
+        if not self.bb_session:
+            self.bb_session = ByteBlowerSession(self.logger, byteblower.ByteBlower.InstanceGet())
+        ports = {}
+        for logical_name, port in reservation_ports.items():
+            bpf = None
+            if logical_name in metadata["filtered_ports"]:
+                bpf = f"ip and host {ports_attributes[logical_name]['Address']}"
+            ports[logical_name] = (port.Name.split("/")[-1], bpf)
+        return self.bb_session.setup(self.service.address, ports)
+
+    def _rewrite_project(self, project, new_project, eps_identifiers, ports_attributes):
+        """Write the project patched with the reservation attributes and calculate its metadata.
+
+        :return: {'intended_tx': {port name: intended Mbps}, 'filtered_ports': [names of ports that need host filter],
+            'flows': [flow names], 'scenarios': {scenario name: {'duration': seconds or None, 'flows': int}},
+            'profiles': {scenario name: {'tx'|'rx'|'flows': {name: RateProfile as dict}}}}
+        """
+        project_index = ProjectIndex(project)
+
+        patches = {}
+        for logical_name, identifier in eps_identifiers.items():
+            self._find_xml_gui_port(project_index, logical_name)
+            patches[logical_name] = PortPatch(configuration={"physicalInterfaceId": identifier})
+
+        filtered_ports = []
+        for logical_name, attributes in ports_attributes.items():
+            gui_port = self._find_xml_gui_port(project_index, logical_name)
+            patch = PortPatch(
+                mac_address=attributes["Mac Address"],
+                ip_address=attributes["Address"],
+                gateway=attributes["Gateway"],
+                netmask=attributes["Netmask"],
+            )
+            if gui_port.configuration["physicalPortId"] != "-1":
+                identifier = int(attributes["Name"].split("/")[-1].split("-")[-1]) - 1
+                patch.configuration["physicalPortId"] = str(identifier)
             else:
-                ip = ""
-                xml_wan_ip = xml_gui_port.find("ipv4Configuration").find("IpAddress")
-                for xml_byte in xml_wan_ip.findall("bytes"):
-                    byte = xml_byte.text
-                    if int(byte) < 0:
-                        byte = str(int(byte) + 256)
-                    ip += byte
-                    ip += "."
-                ip = ip.rstrip(".")
-                trigger.FilterSet(f"ip and host {ip}")
-            self.bb_ports[logical_name] = trigger.ResultHistoryGet()
-
-        xml.write(self.project)
-        # When we write the new xml, the root element is written in different style then the original one, probably
-        # due to multiple namespaces. BB-CLT can't load the changed configuration. The code bellow replaces the root
-        # element with the original one.
-        # todo: is there any standard way to manipulate the xml so the result will be valid?
-        with open(project, "r") as p_f:
-            project_lines = p_f.readlines()
-            with open(self.project, "r+") as np_f:
-                new_project_lines = np_f.readlines()
-                new_project_lines[0] = project_lines[1]
-                new_project_lines[-1] = project_lines[-1]
-                np_f.seek(0)
-                np_f.writelines(new_project_lines)
-
-        self.intended_tx = get_intended_tx(self.project)
-
-    def start_traffic(self, context, blocking):
+                filtered_ports.append(logical_name)
+            patches[logical_name] = patch
+
+        found = rewrite_project(project, new_project, patches)
+        if set(found) != set(patches):
+            raise Exception(f"Failed to patch configuration ports {sorted(set(patches) - set(found))} in {project}")
+        return {
+            "intended_tx": get_intended_tx(project_index),
+            "filtered_ports": filtered_ports,
+            "flows": [flow.name for flow in project_index.flows.values()],
+            "scenarios": {
+                name: {"duration": scenario.duration, "flows": len(scenario.measurements)}
+                for name, scenario in project_index.scenarios.items()
+            },
+            "profiles": {
+                name: {
+                    kind: {n: profile.to_dict() for n, profile in profiles.items()}
+                    for kind, profiles in get_rate_profiles(project_index, name).items()
+                }
+                for name in project_index.scenarios
+            },
+        }
+
+    def start_traffic(self, context, blocking, registration_timeout=None, traffic_start_timeout=TRAFFIC_START_TIMEOUT):
+        """Start the endpoints agents and the CLT.
+
+        :param registration_timeout: seconds to wait for all endpoints to register, default to EP_REGISTRATION_TIMEOUT.
+        """
+        if registration_timeout is None:
+            registration_timeout = EP_REGISTRATION_TIMEOUT
+        elif registration_timeout <= 0:
+            raise Exception(f"Invalid registration timeout {registration_timeout}, must be positive")
+        with self.lock:
+            self._start_traffic(context, registration_timeout, traffic_start_timeout)
+        # stop_traffic and the statistics commands must not wait for the traffic end.
+        if is_blocking(blocking):
+            with self.spans.span("wait_traffic_end"):
+                return self._wait_for_traffic_end()
+        return None
+
+    def _start_traffic(self, context, registration_timeout, traffic_start_timeout):
         # check connected state of eps
-        self._validate_endpoint_wifi(context)
+        with self.spans.span("validate_wifi"):
+            self._validate_endpoint_wifi(context)
 
+        run = self.run_context
         log_file_name = self.logger.handlers[0].baseFilename
         self.output = (os.path.splitext(log_file_name)[0] + "--output").replace("\\", "/")
+        clt_report = CltReport(self.logger, self.output, time.time())
+
+        eps_state_changed = threading.Event()
+        with self.spans.span("start_eps", endpoints=len(run.reservation_eps)):
+            eps_threads = self._start_eps_threads(context, run.reservation_eps, eps_state_changed)
+        run = self.run_context = run._replace(
+            eps_threads=MappingProxyType(eps_threads), server_thread=None, clt_report=clt_report, traffic_start_time=None
+        )
 
-        self.eps_threads = {}
-        for name, ep in self.reservation_eps.items():
-            ep_ip = get_family_attribute(context, ep.Name, "Address")
-            self.eps_threads[name] = EpThread(
-                self.logger, ep_ip, self.service.meeting_point, self.service.endpoint_install_path, name
+        with self.spans.span("eps_registration"):
+            # wait until all clients are registered before starting traffic
+            registered = self._wait_for(
+                eps_state_changed,
+                lambda: any(t.failed for t in eps_threads.values()) or all(t.registered.isSet() for t in eps_threads.values()),
+                registration_timeout,
             )
-            self.eps_threads[name].start()
-            time.sleep(1)
-            if not self.eps_threads[name].popen:
+            for name, ep_thread in eps_threads.items():
+                if ep_thread.failed:
+                    self.stop_traffic()
+                    raise Exception(f"Failed to start thread on EP {name}, IP {ep_thread.ip} - {ep_thread.failed}")
+            if not registered:
+                not_registered = [(n, t.ip) for n, t in eps_threads.items() if not t.registered.isSet()]
                 self.stop_traffic()
-                raise Exception(f"Failed to start thread on EP {name}, IP {ep_ip}")
+                raise Exception(
+                    f"The following endpoints did not register with meeting point {self.service.meeting_point} "
+                    f"within {registration_timeout} seconds: {not_registered}"
+                )
 
-        # add delay to ensure clients are registered before starting traffic
-        time.sleep(8)
-        self.server_thread = ServerThread(
-            self.logger, self.service.client_install_path, self.project, self.scenario, self.output
+        with self.spans.span("clt_start"):
+            server_state_changed = threading.Event()
+            clt_run = CltRun(
+                run.project,
+                run.scenario,
+                self.output,
+                flows=run.flows,
+                expected_flows=run.scenarios.get(run.scenario, {}).get("flows"),
+            )
+            server_thread = ServerThread(
+                self.logger, self.service.client_install_path, clt_run, state_changed=server_state_changed, engine=self.engine
+            )
+            server_thread.start()
+            run = self.run_context = run._replace(server_thread=server_thread)
+            started = self._wait_for(
+                server_state_changed,
+                lambda: server_thread.traffic_started or server_thread.failed or not server_thread.is_alive(),
+                traffic_start_timeout,
+            )
+            if server_thread.failed:
+                self.stop_traffic()
+                raise Exception(f"Failed to start traffic - {server_thread.failed}")
+            if not started:
+                self.stop_traffic()
+                raise Exception(f"Traffic did not start within {traffic_start_timeout} seconds")
+            if not server_thread.traffic_started:
+                self.stop_traffic()
+                raise Exception("Failed to start traffic - CLT exited before traffic started")
+        traffic_start_time = time.time()
+
+        if run.series_store:
+            run.series_store.close()
+        series_store = SeriesStore(self.logger, os.path.dirname(log_file_name))
+        stats_sampler = StatsSampler(
+            self.logger,
+            run.bb_ports,
+            run.eps_threads,
+            run.intended_tx,
+            SamplingOptions(
+                store=series_store,
+                profiles=(run.rate_profiles.get("tx", {}), run.rate_profiles.get("rx", {})),
+                start_time=traffic_start_time,
+            ),
+            clt=run.server_thread.supervisor,
+            engine=self.engine,
         )
-        self.server_thread.start()
-        time.sleep(1)
-        if not self.server_thread.popen:
-            self.stop_traffic()
-            raise Exception("Failed to start thread on server")
-        while not self.server_thread.traffic_running:
-            time.sleep(1)
-            if self.server_thread.failed:
+        stats_sampler.start()
+        self.run_context = run._replace(
+            stats_sampler=stats_sampler, series_store=series_store, traffic_start_time=traffic_start_time
+        )
+
+    def _wait_for_traffic_end(self, timeout=None, progress_interval=TRAFFIC_PROGRESS_INTERVAL):
+        """Wait for the server thread completion event, log progress every progress_interval seconds.
+
+        :param timeout: timeout in seconds, default to derive it from the scenario duration.
+        :return: final test status.
+        """
+        run = self.run_context
+        server_thread = run.server_thread
+        if timeout is None:
+            duration = run.scenarios.get(run.scenario, {}).get("duration")
+            if duration is None:
+                timeout = TRAFFIC_END_DEFAULT_TIMEOUT
+            else:
+                timeout = duration * TRAFFIC_END_TIMEOUT_FACTOR + TRAFFIC_END_TIMEOUT_MARGIN
+        self.logger.info(f"Waiting up to {timeout} seconds for traffic to end")
+        start = time.time()
+        deadline = start + timeout
+        while not server_thread.completed.wait(max(min(progress_interval, deadline - time.time()), 0)):
+            if time.time() >= deadline:
                 self.stop_traffic()
-                raise Exception(f"Failed to start traffic - {self.server_thread.failed}")
+                raise Exception(f"Traffic did not end within {timeout} seconds")
+            self._consume_clt_events(server_thread)
+            self.logger.info(f"Traffic running for {int(time.time() - start)} seconds, progress {self.clt_progress}%")
+        self._consume_clt_events(server_thread)
+        if server_thread.failed:
+            raise Exception(f"Traffic failed - {server_thread.failed}")
+        # let the CLT write its reports.
+        server_thread.join(CLT_EXIT_TIMEOUT)
+        status = self.get_test_status()
+        self.logger.info(f"Traffic ended after {int(time.time() - start)} seconds, status {status}")
+        return status
+
+    def _start_eps_threads(self, context, reservation_eps, state_changed):
+        """Launch all endpoints agents concurrently and start their threads.
+
+        If any agent fails to launch, all launched agents are stopped and the exception lists all failures.
+
+        :return: {logical name: EpThread}
+        """
+        if not reservation_eps:
+            return {}
+        executor = ThreadPoolExecutor(max_workers=min(len(reservation_eps), EP_START_MAX_WORKERS))
+        futures = {
+            name: executor.submit(self._launch_ep_thread, context, name, ep, state_changed)
+            for name, ep in reservation_eps.items()
+        }
+        eps_threads = {}
+        failures = []
+        for name, future in futures.items():
+            try:
+                eps_threads[name] = future.result()
+            except Exception as e:
+                failures.append(str(e))
+        if failures:
+            list(executor.map(lambda ep_thread: ep_thread.stop(), eps_threads.values()))
+            executor.shutdown()
+            raise Exception(f"Failed to start endpoints agents: {failures}")
+        executor.shutdown()
+        for ep_thread in eps_threads.values():
+            ep_thread.start()
+        return eps_threads
+
+    def _launch_ep_thread(self, context, name, ep, state_changed):
+        ep_ip = self.reservation.get(context, ep.Name, "Address")
+        ep_thread = EpThread(
+            self.logger,
+            EpAgent(name, ep_ip, self.service.meeting_point, self.service.endpoint_install_path),
+            pool=self.eps_pool,
+            state_changed=state_changed,
+            counters=SampleRing(EP_SAMPLES_CAPACITY, downsample=True),
+            engine=self.engine,
+        )
+        try:
+            ep_thread.launch()
+        except Exception as e:
+            self.logger.error(f"Failed to start thread on EP {name}, IP {ep_ip} - {e}")
+            raise Exception(f"Failed to start thread on EP {name}, IP {ep_ip} - {e}")
+        return ep_thread
 
-        if is_blocking(blocking):
-            # todo: implement wait test.
-            pass
+    @staticmethod
+    def _wait_for(event, condition, timeout):
+        """Wait until condition is true, re-evaluate it each time the event is set.
+
+        :return: True if condition is true, False on timeout.
+        """
+        deadline = time.time() + timeout
+        while True:
+            event.clear()
+            if condition():
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            event.wait(remaining)
 
     def stop_traffic(self):
-        if self.eps_threads:
-            for ep_thread in self.eps_threads.values():
-                ep_thread.stop()
-        if self.server_thread:
-            self.server_thread.stop()
+        run = self.run_context
+        if run.stats_sampler:
+            run.stats_sampler.stop()
+        for ep_thread in run.eps_threads.values():
+            ep_thread.stop()
+        if run.server_thread:
+            run.server_thread.stop()
 
     def get_test_status(self):
-        if not self.server_thread:
+        server_thread = self.run_context.server_thread
+        if not server_thread:
             return "Not started"
         else:
-            if self.server_thread.failed:
-                raise Exception(f"Server Failed: {self.server_thread.failed}")
-            if self.server_thread.traffic_running:
+            self._consume_clt_events(server_thread)
+            if server_thread.failed:
+                raise Exception(f"Server Failed: {server_thread.failed}")
+            if server_thread.traffic_running:
                 return "Running"
             else:
                 return "Finished"
 
+    def _consume_clt_events(self, server_thread):
+        """Drain the CLT events queued by the server thread and track the scenario progress."""
+        for event in server_thread.get_events():
+            if event.type == PROGRESS:
+                self.clt_progress = event.progress
+            elif event.type in (SCENARIO_START, FLOW_START, FLOW_STOP):
+                self.logger.info(f"CLT {event.type} {event.flow or ''}: {event.line}")
+        if server_thread.clt_state.dropped:
+            self.logger.debug(f"CLT events dropped: {server_thread.clt_state.dropped}")
+
     def get_rt_statistics(self, num_samples=1):
-        """
+        """Get the latest statistics snapshot published by the statistics sampler.
+
+        While traffic is not running the snapshot is sampled on demand.
 
-        :return: {'name': [[str, int,int]]}
+        :return: {'name': [[str, int,int]], '_meta': {'timestamp': snapshot sample time,
+            'clt': {'cpu_percent': float, 'rss_mb': float} if the CLT is supervised,
+            'lost_intervals': {port name: count} if ports result histories overflowed}}
         """
+        run = self.run_context
+        stats_sampler = run.stats_sampler
+        if not stats_sampler:
+            stats_sampler = StatsSampler(self.logger, run.bb_ports, run.eps_threads, run.intended_tx, engine=self.engine)
+        snapshot = stats_sampler.snapshot
+        if snapshot is None or not stats_sampler.is_alive():
+            snapshot = stats_sampler.sample()
         rt_stats = {}
-        for name, thread in self.eps_threads.items():
-            rt_stats[name] = thread.counters[-num_samples:]
-        for name, bb_port in self.bb_ports.items():
-            bb_port.Refresh()
-            cumulative = bb_port.CumulativeLatestGet()
-            interval = bb_port.IntervalLatestGet()
-            cumulative_bytes = cumulative.ByteCountGet()
-            cumulative_mb = "{0:.2f}".format(cumulative_bytes * 8 / 1000000.0)
-            interval_bytes = interval.ByteCountGet()
-            interval_mb = "{0:.2f}".format(interval_bytes * 8 / 1000000.0)
-            # intended Tx placeholder of -1 [cumulative, Rx rate, Intended Tx Placeholder]
-            rt_stats[name] = [cumulative_mb, interval_mb, self.intended_tx[name]]
-            self.logger.debug(f"Port {name} stats: {rt_stats[name]}")
+        for name, samples in snapshot.eps.items():
+            rt_stats[name] = [list(sample) for sample in samples[len(samples) - min(num_samples, len(samples)) :]]
+        for name, port_stats in snapshot.ports.items():
+            # [cumulative, Rx rate, intended Tx, expected Rx]
+            rt_stats[name] = list(port_stats)
+        meta = {"timestamp": snapshot.timestamp}
+        if snapshot.clt:
+            meta["clt"] = {metric: round(value, 2) for metric, value in zip(CLT_METRICS, snapshot.clt)}
+        if snapshot.lost_intervals:
+            meta["lost_intervals"] = dict(snapshot.lost_intervals)
+        rt_stats[RT_STATISTICS_META] = meta
         return rt_stats
 
-    def get_statistics(self, context, view_name, output_type):
-        # todo: attach requested output file to reservation.
-        return self.output
+    def get_rt_statistics_delta(self, cursor=None, interval=None, names=None):
+        """Get the ports, endpoints and CLT samples recorded since the previous call.
 
-    def _find_xml_gui_port(self, xml_gui_ports, logical_name):
-        requested_xml_gui_ports = [p for p in xml_gui_ports if p.attrib["name"] == logical_name]
-        if not requested_xml_gui_ports:
-            raise Exception(
-                "Logical name {} not found in configuration ports {}".format(
-                    logical_name, [p.attrib["name"] for p in xml_gui_ports]
-                )
-            )
-        return requested_xml_gui_ports[0]
-
-    def _validate_endpoint_wifi(self, context):
-        disconnected_eps = []
-        for name, ep in self.reservation_eps.items():
-            ep_ip = get_family_attribute(context, ep.Name, "Address")
-            try:
-                ep_cmd = EpCmd(self.logger, ep_ip, name)
-            except Exception as e:
-                msg = f"{name} could not establish RPyC command connection: {e}"
-                self.logger.debug(msg)
-                raise Exception(msg)
+        :param cursor: cursor returned by the previous call, None to get all samples of the current run.
+        :param interval: average samples to interval seconds buckets, None for raw samples.
+        :param names: ports and endpoints logical names or CLT, default to all.
+        :return: {'cursor': str, 'reset': bool, 'series': {name: {'columns': [...], 'samples': [[...], ...]}}}, see
+            SeriesStore.delta.
+        """
+        series_store = self.run_context.series_store
+        if not series_store:
+            return {"cursor": cursor or "", "reset": False, "series": {}}
+        return series_store.delta(cursor, names, interval)
 
-            cmd = ["netsh", "wlan", "show", "interfaces", "|", "findstr", "State"]
+    def get_intended_rates(self, elapsed=None):
+        """Get the intended rates of all ports and flows at the requested scenario time.
 
-            try:
-                outp = ep_cmd.run_command(cmd)
-            except Exception as e:
-                msg = f"{name} had issue running rpyc command {cmd}: {e}"
-                self.logger.debug(msg)
-                raise Exception(msg)
-            else:
-                if "disconnected" in outp:
-                    disconnected_eps.append((name, ep_ip))
-            finally:
-                ep_cmd.conn.close()
-                self.logger.debug(f"{name} command connection closed")
+        :param elapsed: seconds since the scenario start, default to now.
+        :return: {'tx': {port name: Mbps}, 'rx': {port name: Mbps}, 'flows': {flow name: Mbps}}
+        """
+        run = self.run_context
+        if elapsed is None:
+            if run.traffic_start_time is None:
+                raise Exception("No intended rates - traffic was not started")
+            elapsed = time.time() - run.traffic_start_time
+        return {kind: {n: p.at(elapsed) for n, p in profiles.items()} for kind, profiles in run.rate_profiles.items()}
+
+    def query_statistics(self, names=None, start=None, end=None, percentiles=DEFAULT_PERCENTILES):
+        """Summarize ports and endpoints samples of the current run over time window.
+
+        :param names: ports and endpoints logical names or CLT for the CLT process resources, default to all.
+        :param start: window start in seconds since traffic start, default to run start.
+        :param end: window end in seconds since traffic start, default to run end.
+        :return: {name: {metric: {'count', 'min', 'max', 'mean', 'p<percent>'...}}}
+        """
+        series_store = self.run_context.series_store
+        if not series_store:
+            raise Exception("No statistics - traffic was not started")
+        return series_store.query(names, start, end, percentiles)
 
-        if disconnected_eps:
-            raise Exception(f"The following endpoints are disconnected from wifi: {disconnected_eps}")
+    def get_statistics(self, context, view_name, output_type):
+        """Get view statistics from the CLT reports of the last run.
 
-        return "All Endpoints Connected to Wifi"
+        :param view_name: port, flow or endpoint, default to port.
+        :param output_type: CSV - attach view to reservation and return it as CSV string, JSON - return view as JSON
+            string, default to CSV.
+        """
+        view_name = view_name or "port"
+        output_type = (output_type or "csv").lower().strip()
+        if output_type not in ("csv", "json"):
+            raise Exception(f"Invalid output type {output_type}, valid types: csv, json")
+        clt_report = self.run_context.clt_report
+        if not clt_report:
+            raise Exception("No statistics - traffic was not started")
+        view = clt_report.view(view_name)
+        if output_type == "json":
+            return json.dumps(view.to_json())
+        else:
+            statistics = view.to_csv()
+            attach_stats_csv(context, self.logger, view_name, statistics)
+            return statistics
 
-    def connect_endpoints(self, context):
-        disconnected_eps = []
-        for name, ep in self.reservation_eps.items():
-            ep_ip = get_family_attribute(context, ep.Name, "Address")
-            try:
-                ep_cmd = EpCmd(self.logger, ep_ip, name)
-            except Exception as e:
-                msg = f"{name} could not establish rypc command connection: {e}"
+    def _find_xml_gui_port(self, project_index, logical_name):
+        if logical_name not in project_index.ports:
+            raise Exception(
+                "Logical name {} not found in configuration ports {}".format(logical_name, list(project_index.ports))
+            )
+        return project_index.ports[logical_name]
+
+    def get_endpoints_wifi_status(
+        self,
+        context,
+        connect_timeout=EP_CONNECT_TIMEOUT,
+        command_timeout=WIFI_COMMAND_TIMEOUT,
+        deadline=WIFI_CHECK_DEADLINE,
+    ):
+        """Check Wi-Fi state of all endpoints concurrently.
+
+        :param connect_timeout: per endpoint RPyC connect timeout in seconds.
+        :param command_timeout: per endpoint netsh command timeout in seconds.
+        :param deadline: overall timeout in seconds, endpoints that did not answer by then are reported as 'timeout'.
+        :return: {name: {'ip': str, 'state': str, 'latency': float seconds, 'error': str or None}}, where state is one of
+            'connected', 'disconnected', 'connect_failed', 'command_failed', 'timeout'.
+        """
+        reservation_eps = self.run_context.reservation_eps
+        eps_ips = {name: self.reservation.get(context, ep.Name, "Address") for name, ep in reservation_eps.items()}
+        if not eps_ips:
+            return {}
+        executor = ThreadPoolExecutor(max_workers=min(len(eps_ips), WIFI_CHECK_MAX_WORKERS))
+        futures = {
+            name: executor.submit(self._get_endpoint_wifi_status, name, ep_ip, connect_timeout, command_timeout)
+            for name, ep_ip in eps_ips.items()
+        }
+        wait(futures.values(), timeout=deadline)
+        # Do not wait for endpoints that missed the deadline, their connect/command timeouts will release the workers.
+        executor.shutdown(wait=False)
+
+        eps_status = {}
+        for name, future in futures.items():
+            if future.done():
+                eps_status[name] = future.result()
+            else:
+                msg = f"{name} did not answer within {deadline} seconds"
                 self.logger.debug(msg)
-                raise Exception(msg)
+                eps_status[name] = {"ip": eps_ips[name], "state": "timeout", "latency": deadline, "error": msg}
+        return eps_status
 
+    def _get_endpoint_wifi_status(self, name, ep_ip, connect_timeout, command_timeout):
+        start = time.time()
+        status = {"ip": ep_ip, "state": None, "latency": None, "error": None}
+        try:
+            ep_cmd = EpCmd(self.logger, ep_ip, name, connect_timeout, command_timeout, self.eps_pool)
+        except Exception as e:
+            status["state"] = "connect_failed"
+            status["error"] = f"{name} could not establish RPyC command connection: {e}"
+        else:
             cmd = ["netsh", "wlan", "show", "interfaces", "|", "findstr", "State"]
-
+            broken = False
             try:
                 outp = ep_cmd.run_command(cmd)
             except Exception as e:
-                msg = f"{name} had issue running rpyc command {cmd}: {e}"
-                self.logger.debug(msg)
-                raise Exception(msg)
+                status["state"] = "command_failed"
+                status["error"] = f"{name} had issue running rpyc command {cmd}: {e}"
+                # a command that failed on the endpoint leaves the connection usable.
+                broken = is_transport_error(e)
             else:
-                if "disconnected" in outp:
-                    disconnected_eps.append((name, ep_ip))
+                status["state"] = "disconnected" if "disconnected" in outp else "connected"
             finally:
-                ep_cmd.conn.close()
-                self.logger.debug(f"{name} command connection closed")
+                ep_cmd.close(broken=broken)
+        status["latency"] = time.time() - start
+        if status["error"]:
+            self.logger.debug(status["error"])
+        return status
+
+    def _validate_endpoint_wifi(self, context):
+        eps_status = self.get_endpoints_wifi_status(context)
+
+        for status in eps_status.values():
+            if status["error"]:
+                raise Exception(status["error"])
 
+        disconnected_eps = [(name, s["ip"]) for name, s in eps_status.items() if s["state"] == "disconnected"]
         if disconnected_eps:
             raise Exception(f"The following endpoints are disconnected from wifi: {disconnected_eps}")
 
         return "All Endpoints Connected to Wifi"
 
-
-def get_intended_tx(bbl_config_file_name):
-
-    xml = ET.parse(bbl_config_file_name)
-    xml_root = xml.getroot()
-    xml_gui_ports = xml_root.findall("ByteBlowerGuiPort")
-    xml_flows_templates = xml_root.findall("FlowTemplate")
-    xml_frames = xml_root.findall("Frame")
-
-    bb_ports = {}
-    for xml_gui_port in xml_gui_ports:
-        try:
-            # int(xml_gui_port.find('ByteBlowerGuiPortConfiguration').attrib['physicalInterfaceId'])
-            bb_port = xml_gui_port.attrib["name"]
-            bb_ports[bb_port] = {}
-            for bb_flow in xml_gui_port.attrib["theSourceOfFlow"].split():
-                bb_ports[bb_port][bb_flow] = {}
-                xml_flow = [f for f in xml_flows_templates if f.attrib["Flow"] == bb_flow][0]
-                bb_ports[bb_port][bb_flow]["template"] = xml_flow
-                frame_index = int(xml_flow.find("frameBlastingFrames").attrib["frame"].split(".")[-1])
-                bb_ports[bb_port][bb_flow]["frame"] = xml_frames[frame_index]
-        except ValueError:
-            pass
-
-    bb_ports_intended_tx = {}
-    for bb_port, bb_flows in bb_ports.items():
-        bb_ports_intended_tx[bb_port] = 0
-        for bb_flow in bb_flows.values():
-            frame_interval_ns = float(bb_flow["template"].attrib["frameInterval"])
-            frame_length = len(bb_flow["frame"].attrib["bytesHexString"]) / 2
-            intended_mbps = 1000000000 / frame_interval_ns * frame_length * 8 / 1000 / 1000
-            bb_ports_intended_tx[bb_port] += int(intended_mbps)
-
-    return bb_ports_intended_tx
+    def connect_endpoints(self, context):
+        return self._validate_endpoint_wifi(context)
@@ -0,0 +1,92 @@
+"""
+Lossless harvesting of the interval results accumulated in the ByteBlower result histories.
+"""
+
+# an interval is lost when the next interval starts later than this many interval durations.
+GAP_TOLERANCE = 1.5
+
+
+class HistoryHarvester(object):
+    """Read all the interval snapshots added to result histories since the previous harvest.
+
+    Each port keeps the timestamp of the newest harvested interval, the new intervals are read from the end of the
+    history backwards until that timestamp. Intervals missing between harvested intervals, because the server buffer or
+    the history overflowed between two refreshes, are counted as lost and reported.
+
+    The interval timestamps are in the ByteBlower server clock, they are converted to the controller clock with the
+    offset between the history refresh timestamp and the controller time the refresh returned. The refresh round trip
+    only makes that offset larger, so the lowest offset observed is kept.
+
+    The histories are not cleared between runs, intervals older than start_time are not harvested so the first harvest
+    does not walk back through the previous runs intervals.
+
+    :param start_time: controller time of the run start, ignored until the clock offset of the port is known.
+    :ivar lost: {port name: number of lost intervals}
+    :ivar clock_offsets: {port name: controller time - server time in seconds}
+    """
+
+    def __init__(self, logger, start_time=None):
+        self.logger = logger
+        self.start_time = start_time
+        self.last_timestamps = {}
+        self.last_durations = {}
+        self.lost = {}
+        self.clock_offsets = {}
+
+    def harvest(self, name, history, refresh_time=None):
+        """Get the intervals added to refreshed history since the previous harvest.
+
+        :param history: byteblowerll ResultHistory, already refreshed.
+        :param refresh_time: controller time.time() when the refresh returned, without it timestamps are in server time.
+        :return: list of (timestamp seconds, cumulative bytes or None, interval bytes), oldest first.
+        """
+        if refresh_time is not None:
+            offset = refresh_time - history.RefreshTimestampGet() / 1e9
+            self.clock_offsets[name] = min(offset, self.clock_offsets.get(name, offset))
+        clock_offset = self.clock_offsets.get(name, 0)
+        last_timestamp = self.last_timestamps.get(name)
+        since = last_timestamp
+        if since is None and self.start_time is not None and name in self.clock_offsets:
+            since = (self.start_time - clock_offset) * 1e9
+        length = history.IntervalLengthGet()
+        snapshots = []
+        index = length - 1
+        while index >= 0:
+            snapshot = history.IntervalGetByIndex(index)
+            timestamp = snapshot.TimestampGet()
+            if since is not None and timestamp <= since:
+                break
+            snapshots.append((index, timestamp, snapshot))
+            index -= 1
+        if not snapshots:
+            return []
+        snapshots.reverse()
+
+        # cumulative and interval lists are transferred together, align them on their ends.
+        cumulative_offset = history.CumulativeLengthGet() - length
+        lost = 0
+        previous_timestamp, previous_duration = last_timestamp, self.last_durations.get(name)
+        intervals = []
+        for index, timestamp, snapshot in snapshots:
+            duration = snapshot.IntervalDurationGet()
+            if previous_timestamp is not None and duration:
+                gap = timestamp - previous_timestamp
+                if gap > GAP_TOLERANCE * (previous_duration or duration):
+                    lost += int(round(gap / float(duration))) - 1
+            cumulative_bytes = None
+            if 0 <= index + cumulative_offset < history.CumulativeLengthGet():
+                cumulative = history.CumulativeGetByIndex(index + cumulative_offset)
+                if cumulative.TimestampGet() == timestamp:
+                    cumulative_bytes = cumulative.ByteCountGet()
+            intervals.append((timestamp / 1e9 + clock_offset, cumulative_bytes, snapshot.ByteCountGet()))
+            previous_timestamp, previous_duration = timestamp, duration
+
+        self.last_timestamps[name] = previous_timestamp
+        self.last_durations[name] = previous_duration
+        if lost:
+            self.lost[name] = self.lost.get(name, 0) + lost
+            self.logger.warning(
+                f"Port {name} result history overflowed, {lost} intervals lost ({self.lost[name]} since start), "
+                f"refresh more often or increase the sampling buffer length"
+            )
+        return intervals
@@ -0,0 +1,78 @@
+"""
+Deferred imports of the heavy dependencies, each one is imported by the first command that uses it.
+"""
+import importlib
+import os
+import threading
+import time
+
+# set to 0, false or off to disable the pre-warm at initialize.
+PREWARM_ENV = "BYTEBLOWER_PREWARM"
+
+
+def prewarm_enabled():
+    return os.environ.get(PREWARM_ENV, "on").lower() not in ("0", "false", "off", "no")
+
+
+class LazyModule(object):
+    """Module proxy that imports the module on first attribute access.
+
+    :param name: full module name, ex. 'byteblowerll.byteblower'.
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def load(self):
+        """Import the module if it was not imported yet.
+
+        :return: the module.
+        """
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self.__dict__["_module"] = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
+    def __repr__(self):
+        return f"<lazy module {self._name} {'loaded' if self.loaded else 'not loaded'}>"
+
+
+byteblower = LazyModule("byteblowerll.byteblower")
+netaddr = LazyModule("netaddr")
+psutil = LazyModule("psutil")
+rpyc = LazyModule("rpyc")
+
+HEAVY_MODULES = [byteblower, netaddr, psutil, rpyc]
+
+
+def prewarm(logger, modules=None):
+    """Import modules in a background thread so the first command that needs them does not pay the import.
+
+    :param modules: LazyModule list, default to all heavy modules.
+    :return: the started thread.
+    """
+
+    def load():
+        for module in modules or HEAVY_MODULES:
+            start = time.perf_counter()
+            try:
+                module.load()
+            except Exception as e:
+                logger.warning(f"Failed to pre-warm {module._name} - {e}")
+                continue
+            logger.debug(f"Pre-warmed {module._name} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    thread = threading.Thread(target=load, name="ImportPrewarm")
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,451 @@
+"""
+Streaming helpers for ByteBlower GUI project (.bbp) files.
+
+ByteBlower projects are EMF/XMI documents where every Frame carries its full payload as a hex string, so projects with
+many flows are large. The helpers here never keep the whole document tree, or the frames payloads, in memory.
+"""
+import re
+import xml.etree.ElementTree as ET
+from bisect import bisect_right
+from xml.sax.saxutils import escape, unescape
+
+TAG_RE = re.compile(r"<(/?)([\w.:-]+)([^<>]*?)(/?)>")
+# a tag that continues on the next line.
+OPEN_TAG_RE = re.compile(r"<[^<>]*$")
+ATTRIBUTE_RE = re.compile(r'([\w.:-]+)="([^"]*)"')
+
+GUI_PORT_TAG = "ByteBlowerGuiPort"
+GUI_PORT_CONFIGURATION_TAG = "ByteBlowerGuiPortConfiguration"
+
+XML_ENTITIES = {"&quot;": '"', "&apos;": "'"}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def signed_bytes(octets):
+    """Encode unsigned octets as the signed (java) byte strings stored in the project.
+
+    :param octets: list of int in range 0..255.
+    """
+    return [str(octet) if octet <= 127 else str(octet - 256) for octet in octets]
+
+
+class PortPatch(object):
+    """Values to replace in a single ByteBlowerGuiPort.
+
+    :param mac_address: MAC address as hex octets separated by '-' or ':'.
+    :param ip_address: IPv4 address as dotted string, same for gateway and netmask.
+    :param configuration: ByteBlowerGuiPortConfiguration attributes to set, ex. {'physicalPortId': '12'}.
+    """
+
+    def __init__(self, mac_address=None, ip_address=None, gateway=None, netmask=None, configuration=None):
+        self.mac_address = mac_address
+        self.ip_address = ip_address
+        self.gateway = gateway
+        self.netmask = netmask
+        self.configuration = configuration or {}
+
+    def byte_values(self):
+        """Map (parent, element) of each patched bytes list to its new signed byte strings."""
+        values = {}
+        if self.mac_address:
+            octets = [int(octet, 16) for octet in re.split("[-:]", self.mac_address)]
+            values[("layer2Configuration", "MacAddress")] = signed_bytes(octets)
+        for entry, address in (("IpAddress", self.ip_address), ("DefaultGateway", self.gateway), ("Netmask", self.netmask)):
+            if address:
+                values[("ipv4Configuration", entry)] = signed_bytes([int(octet) for octet in address.split(".")])
+        return values
+
+
+class _PortState(object):
+    def __init__(self, patch):
+        self.byte_values = patch.byte_values()
+        self.configuration = patch.configuration
+        self.stack = []
+        self.values = None
+        self.index = 0
+        self.pending = None
+
+
+def rewrite_project(source, target, patches):
+    """Write a copy of the source project with the requested ports patched, in a single streaming pass.
+
+    Only the patched values change, every other byte (XML declaration, root element, namespaces, frames payloads) is
+    copied as is so the ByteBlower CLT can load the result.
+
+    :param source: full path to the original project.
+    :param target: full path to the patched project.
+    :param patches: {port name: PortPatch}
+    :return: list of patched port names found in the project.
+    """
+    found = []
+    port = None
+    with open(source, "r", encoding="utf-8", errors="surrogateescape", newline="") as reader, open(
+        target, "w", encoding="utf-8", errors="surrogateescape", newline=""
+    ) as writer:
+        for line in reader:
+            if port is None:
+                if GUI_PORT_TAG not in line:
+                    writer.write(line)
+                    continue
+                line = _join_open_tag(line, reader)
+                name = _gui_port_name(line)
+                if name not in patches:
+                    writer.write(line)
+                    continue
+                found.append(name)
+                port = _PortState(patches[name])
+            else:
+                line = _join_open_tag(line, reader)
+            line, closed = _rewrite_port_line(line, port)
+            writer.write(line)
+            if closed:
+                port = None
+    return found
+
+
+def _join_open_tag(line, reader):
+    """Append the next lines of the reader to line until its last tag is complete."""
+    while OPEN_TAG_RE.search(line):
+        next_line = next(reader, "")
+        if not next_line:
+            break
+        line += next_line
+    return line
+
+
+def _gui_port_name(line):
+    for match in TAG_RE.finditer(line):
+        if not match.group(1) and match.group(2) == GUI_PORT_TAG:
+            return _attribute(match.group(3), "name")
+    return None
+
+
+def _attribute(attributes, name):
+    match = re.search(rf'\s{name}="([^"]*)"', attributes)
+    return unescape(match.group(1), XML_ENTITIES) if match else None
+
+
+def _set_attributes(tag, attributes):
+    for name, value in attributes.items():
+        value = escape(value, {'"': "&quot;"})
+        pattern = re.compile(rf'(\s{name}=")[^"]*(")')
+        if pattern.search(tag):
+            tag = pattern.sub(lambda m: m.group(1) + value + m.group(2), tag, count=1)
+        else:
+            end = -2 if tag.endswith("/>") else -1
+            tag = f'{tag[:end]} {name}="{value}"{tag[end:]}'
+    return tag
+
+
+def _rewrite_port_line(line, port):
+    """Rewrite one line inside a patched ByteBlowerGuiPort.
+
+    :return: (new line, True if the ByteBlowerGuiPort element was closed on this line).
+    """
+    out = []
+    position = 0
+    for match in TAG_RE.finditer(line):
+        text = line[position : match.start()]
+        out.append(text if port.pending is None else port.pending)
+        position = match.end()
+        tag = match.group(0)
+        closing, name, self_closing = match.group(1), match.group(2), match.group(4)
+        if closing:
+            if port.stack:
+                port.stack.pop()
+            port.pending = None
+            if name != "bytes":
+                port.values = None
+            out.append(tag)
+            if name == GUI_PORT_TAG and not port.stack:
+                out.append(line[position:])
+                return "".join(out), True
+            continue
+        if name == GUI_PORT_CONFIGURATION_TAG and port.configuration:
+            tag = _set_attributes(tag, port.configuration)
+        elif name == "bytes" and port.values is not None:
+            if port.index < len(port.values):
+                port.pending = port.values[port.index]
+            port.index += 1
+        elif len(port.stack) >= 1:
+            port.values = port.byte_values.get((port.stack[-1], name))
+            port.index = 0
+        out.append(tag)
+        if self_closing and name == GUI_PORT_TAG and not port.stack:
+            out.append(line[position:])
+            return "".join(out), True
+        if not self_closing:
+            port.stack.append(name)
+    text = line[position:]
+    out.append(text if port.pending is None else port.pending)
+    return "".join(out), False
+
+
+class GuiPort(object):
+    def __init__(self, name, reference, sources, destinations, configuration):
+        self.name = name
+        self.reference = reference
+        self.sources = sources
+        self.destinations = destinations
+        self.configuration = configuration
+
+
+class Flow(object):
+    def __init__(self, name, reference, source, destination, template):
+        self.name = name
+        self.reference = reference
+        self.source = source
+        self.destination = destination
+        self.template = template
+
+
+class FlowTemplate(object):
+    def __init__(self, name, reference, flow, attributes, frames):
+        self.name = name
+        self.reference = reference
+        self.flow = flow
+        self.attributes = attributes
+        self.frames = frames
+
+
+class Frame(object):
+    def __init__(self, name, reference, length):
+        self.name = name
+        self.reference = reference
+        self.length = length
+
+
+class Measurement(object):
+    def __init__(self, flow, start, stop):
+        self.flow = flow
+        self.start = start
+        self.stop = stop
+
+
+class Scenario(object):
+    def __init__(self, name, measurements):
+        self.name = name
+        self.measurements = measurements
+
+    @property
+    def duration(self):
+        """Scenario duration in seconds, None if any measurement has no scheduled stop."""
+        stops = [m.stop for m in self.measurements]
+        return max(stops) if stops and None not in stops else None
+
+
+class ProjectIndex(object):
+    """Compact index of a ByteBlower project, built in a single parse.
+
+    Frames payloads are dropped, only their length in bytes is kept.
+
+    :ivar ports: {port name: GuiPort}
+    :ivar flows: {flow XMI reference: Flow}
+    :ivar templates: {flow XMI reference: FlowTemplate}
+    :ivar frames: {frame XMI reference: Frame}
+    :ivar scenarios: {scenario name: Scenario}
+    """
+
+    def __init__(self, project):
+        self.ports = {}
+        self.flows = {}
+        self.templates = {}
+        self.frames = {}
+        self.scenarios = {}
+        self._parse(project)
+
+    def _parse(self, project):
+        parser = ET.XMLParser(target=_IndexBuilder(self))
+        with open(project, "rb") as reader:
+            for chunk in iter(lambda: reader.read(CHUNK_SIZE), b""):
+                parser.feed(chunk)
+        parser.close()
+
+    def _add_element(self, tag, attributes, children, reference):
+        if tag == GUI_PORT_TAG:
+            configuration = [a for t, a, _ in children if t == GUI_PORT_CONFIGURATION_TAG]
+            self.ports[attributes["name"]] = GuiPort(
+                attributes["name"],
+                reference,
+                attributes.get("theSourceOfFlow", "").split(),
+                attributes.get("theDestinationOfFlow", "").split(),
+                configuration[0] if configuration else {},
+            )
+        elif tag == "Flow":
+            self.flows[reference] = Flow(
+                attributes.get("name"),
+                reference,
+                attributes.get("source"),
+                attributes.get("destination"),
+                attributes.get("FlowTemplate"),
+            )
+        elif tag == "FlowTemplate":
+            frames = [(a["frame"], int(a.get("weight", 1))) for t, a, _ in children if t == "frameBlastingFrames"]
+            template = FlowTemplate(attributes.get("name"), reference, attributes.get("Flow"), attributes, frames)
+            self.templates[template.flow] = template
+        elif tag == "Frame":
+            self.frames[reference] = Frame(attributes.get("name"), reference, attributes["length"])
+        elif tag == "Scenario":
+            measurements = []
+            for child_tag, child_attributes, events in children:
+                if child_tag != "measurements" or "flow" not in child_attributes:
+                    continue
+                times = {t: _scheduled_time(a) for t, a in events}
+                measurements.append(
+                    Measurement(child_attributes["flow"], times.get("flowStartEvent", 0), times.get("flowStopEvent"))
+                )
+            self.scenarios[attributes.get("name")] = Scenario(attributes.get("name"), measurements)
+
+
+def _scheduled_time(attributes):
+    """Event scheduled time in seconds, the project keeps it in nanoseconds."""
+    return int(attributes.get("scheduledTime", 0)) / 1000000000.0
+
+
+class _IndexBuilder(object):
+    """XMLParser target that feeds the project top level elements into ProjectIndex without building a tree.
+
+    Elements are passed as (tag, attributes, [(child tag, child attributes, [(grandchild tag, attributes)])]).
+    """
+
+    def __init__(self, project_index):
+        self.project_index = project_index
+        self.counters = {}
+        self.depth = 0
+        self.element = None
+
+    def start(self, tag, attributes):
+        self.depth += 1
+        if self.depth == 2:
+            if tag == "Frame":
+                attributes = {"name": attributes.get("name"), "length": len(attributes.get("bytesHexString", "")) // 2}
+            self.element = (tag, attributes, [])
+        elif self.depth == 3:
+            self.element[2].append((tag, attributes, []))
+        elif self.depth == 4:
+            self.element[2][-1][2].append((tag, attributes))
+
+    def end(self, tag):
+        if self.depth == 2:
+            index = self.counters.get(tag, 0)
+            self.counters[tag] = index + 1
+            self.project_index._add_element(*self.element, f"//@{tag}.{index}")
+            self.element = None
+        self.depth -= 1
+
+    def data(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+def get_intended_tx(project_index):
+    """Calculate the intended Tx rate of each port.
+
+    :return: {port name: intended Mbps}
+    """
+    bb_ports_intended_tx = {}
+    for bb_port in project_index.ports.values():
+        bb_ports_intended_tx[bb_port.name] = 0
+        for bb_flow in bb_port.sources:
+            template = project_index.templates.get(bb_flow)
+            if not template or not template.frames or "frameInterval" not in template.attributes:
+                continue
+            frame_interval_ns = float(template.attributes["frameInterval"])
+            frame_length = project_index.frames[template.frames[0][0]].length
+            intended_mbps = 1000000000 / frame_interval_ns * frame_length * 8 / 1000 / 1000
+            bb_ports_intended_tx[bb_port.name] += int(intended_mbps)
+    return bb_ports_intended_tx
+
+
+def get_flow_rate(project_index, flow_reference):
+    """Calculate the rate of a frame blasting flow, one frame per frameInterval with the frames sent by their weights.
+
+    :return: Mbps, 0 if the flow has no frame blasting template.
+    """
+    template = project_index.templates.get(flow_reference)
+    if not template or not template.frames or "frameInterval" not in template.attributes:
+        return 0.0
+    weights = sum(weight for _, weight in template.frames)
+    if not weights:
+        return 0.0
+    frame_length = sum(project_index.frames[frame].length * weight for frame, weight in template.frames) / weights
+    return 1000000000 / float(template.attributes["frameInterval"]) * frame_length * 8 / 1000 / 1000
+
+
+class RateProfile(object):
+    """Step function of rate over the scenario time.
+
+    :param times: sorted step start times in seconds since the scenario start.
+    :param rates: rate in Mbps from each step start time until the next one.
+    """
+
+    def __init__(self, times, rates):
+        self.times = times
+        self.rates = rates
+
+    def at(self, elapsed):
+        """Get the rate at elapsed seconds since the scenario start, 0 before the first step."""
+        index = bisect_right(self.times, elapsed) - 1
+        return self.rates[index] if index >= 0 else 0.0
+
+    def to_dict(self):
+        return {"times": self.times, "rates": self.rates}
+
+    @staticmethod
+    def from_dict(profile):
+        return RateProfile(profile["times"], profile["rates"])
+
+    @staticmethod
+    def from_steps(steps):
+        """Build profile from rate changes.
+
+        :param steps: list of (time, rate delta), a None time is never reached.
+        """
+        times = []
+        rates = []
+        rate = 0.0
+        for step_time, delta in sorted((t, d) for t, d in steps if t is not None):
+            rate += delta
+            if times and times[-1] == step_time:
+                rates[-1] = round(rate, 6)
+            else:
+                times.append(step_time)
+                rates.append(round(rate, 6))
+        return RateProfile(times, rates)
+
+
+def get_rate_profiles(project_index, scenario_name):
+    """Calculate the intended Tx and expected Rx profile of each port and the intended profile of each flow in the scenario.
+
+    Each flow measurement adds the flow rate to its source port Tx and destination port Rx between the flow start and
+    stop events. Flows without a stop event run until the end of the scenario.
+
+    :return: {'tx': {port name: RateProfile}, 'rx': {port name: RateProfile}, 'flows': {flow name: RateProfile}}, the
+        dicts are empty if the scenario is not found.
+    """
+    scenario = project_index.scenarios.get(scenario_name)
+    if not scenario:
+        return {"tx": {}, "rx": {}, "flows": {}}
+    port_names = {port.reference: port.name for port in project_index.ports.values()}
+    tx_steps = {name: [] for name in port_names.values()}
+    rx_steps = {name: [] for name in port_names.values()}
+    flows_steps = {}
+    for measurement in scenario.measurements:
+        flow = project_index.flows.get(measurement.flow)
+        if not flow:
+            continue
+        rate = get_flow_rate(project_index, measurement.flow)
+        steps = [(measurement.start, rate), (measurement.stop, -rate)]
+        flows_steps.setdefault(flow.name, []).extend(steps)
+        if flow.source in port_names:
+            tx_steps[port_names[flow.source]].extend(steps)
+        if flow.destination in port_names:
+            rx_steps[port_names[flow.destination]].extend(steps)
+    return {
+        "tx": {name: RateProfile.from_steps(steps) for name, steps in tx_steps.items()},
+        "rx": {name: RateProfile.from_steps(steps) for name, steps in rx_steps.items()},
+        "flows": {name: RateProfile.from_steps(steps) for name, steps in flows_steps.items()},
+    }
@@ -0,0 +1,252 @@
+"""
+Streaming parser for the ByteBlower CLT report files.
+
+The CLT writes its reports into the -output folder. CSV reports are made of sections, each section is an optional single
+cell title row, a header row and the data rows, sections are separated by empty rows. JSON reports are objects whose
+top level members are lists of records. Sections and members are mapped to views by keywords in their title or key.
+"""
+import csv
+import io
+import json
+import os
+
+CHUNK_SIZE = 1024 * 1024
+
+# Checked in order, the first view with a keyword in the section title wins.
+VIEWS_KEYWORDS = [
+    ("endpoint", ("endpoint", "wireless", "wi-fi", "wifi")),
+    ("flow", ("flow", "frame blasting", "tcp", "latency")),
+    ("port", ("port", "interface")),
+]
+
+SECTION_COLUMN = "Section"
+
+
+def view_of(section):
+    """Get the view of a report section title, None if the section does not match any view."""
+    section = section.lower()
+    for view, keywords in VIEWS_KEYWORDS:
+        if any(keyword in section for keyword in keywords):
+            return view
+    return None
+
+
+def iter_csv_records(path):
+    """Iterate over the records of sectioned CSV report.
+
+    :return: iterator over (section title, {column: value})
+    """
+    default_title = os.path.splitext(os.path.basename(path))[0]
+    with open(path, "r", newline="", encoding="utf-8", errors="replace") as reader:
+        title = None
+        header = None
+        for row in csv.reader(reader):
+            cells = [cell.strip() for cell in row]
+            if not any(cells):
+                title = None
+                header = None
+                continue
+            if header is None:
+                values = [cell for cell in cells if cell]
+                if title is None and len(values) == 1:
+                    title = values[0]
+                else:
+                    header = cells
+                continue
+            yield title or default_title, dict(zip(header, cells))
+
+
+class _JsonStream(object):
+    """Minimal incremental JSON reader, decodes one value at a time from chunks of the file."""
+
+    def __init__(self, reader, chunk_size=CHUNK_SIZE):
+        self.reader = reader
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.reader.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Skip white spaces and return the next character, empty string at the end of the file."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in " \t\r\n":
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ""
+
+    def expect(self, characters):
+        character = self.peek()
+        if character not in characters:
+            raise ValueError(f"Invalid JSON report, expected one of {characters!r} got {character!r}")
+        self.position += 1
+        return character
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # a number at the end of the buffer may continue in the next chunk.
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_json_records(path, chunk_size=CHUNK_SIZE):
+    """Iterate over the records of JSON report, only one record is decoded at a time.
+
+    :return: iterator over (top level key, record)
+    """
+    default_title = os.path.splitext(os.path.basename(path))[0]
+    with io.open(path, "r", encoding="utf-8", errors="replace") as reader:
+        stream = _JsonStream(reader, chunk_size)
+        if stream.peek() == "[":
+            for record in _iter_json_list(stream):
+                yield default_title, record
+            return
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if stream.peek() == "[":
+                for record in _iter_json_list(stream):
+                    yield key, record
+            else:
+                yield key, stream.value()
+            if stream.expect(",}") == "}":
+                return
+
+
+def _iter_json_list(stream):
+    stream.expect("[")
+    if stream.peek() == "]":
+        stream.expect("]")
+        return
+    while True:
+        yield stream.value()
+        if stream.expect(",]") == "]":
+            return
+
+
+def _flatten(record, prefix=""):
+    if not isinstance(record, dict):
+        return {prefix or "value": record}
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value if not isinstance(value, list) else json.dumps(value)
+    return flat
+
+
+class CltView(object):
+    """Records of a single view, indexed by section.
+
+    :ivar columns: all columns of all sections, in order of appearance, starting with SECTION_COLUMN.
+    :ivar sections: {section title: [{column: value}]}
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.columns = [SECTION_COLUMN]
+        self.column_names = set(self.columns)
+        self.sections = {}
+
+    def add(self, section, record):
+        for column in record:
+            if column not in self.column_names:
+                self.column_names.add(column)
+                self.columns.append(column)
+        self.sections.setdefault(section, []).append(record)
+
+    def to_csv(self):
+        output = io.StringIO()
+        writer = csv.DictWriter(output, self.columns, lineterminator="\n")
+        writer.writeheader()
+        for section, records in self.sections.items():
+            for record in records:
+                writer.writerow(dict(record, **{SECTION_COLUMN: section}))
+        return output.getvalue()
+
+    def to_json(self):
+        return self.sections
+
+
+class CltReport(object):
+    """Lazy, cached access to the views of the reports of a single run in the CLT output folder.
+
+    All runs write their reports into the same output folder, only the files written since the run start are read. When
+    the CLT wrote the run reports in both formats only the JSON reports are read, so records are not counted twice.
+
+    Each view is parsed on first request, in one streaming pass over the report files that keeps only the view records.
+    Parsed views are reused until the report files change.
+
+    :param start_time: run start time, default to read the reports of all runs.
+    """
+
+    def __init__(self, logger, output_dir, start_time=None):
+        self.logger = logger
+        self.output_dir = output_dir
+        self.start_time = start_time
+        self.signature = None
+        self.views = {}
+
+    def report_files(self):
+        """Get the JSON files written under the output folder since the run start, or the CSV files if there are no
+        JSON files, oldest first."""
+        files = {".csv": [], ".json": []}
+        for root, _, file_names in os.walk(self.output_dir):
+            for file_name in file_names:
+                extension = os.path.splitext(file_name)[1].lower()
+                path = os.path.join(root, file_name).replace("\\", "/")
+                if extension in files and (self.start_time is None or os.path.getmtime(path) >= self.start_time):
+                    files[extension].append(path)
+        return sorted(files[".json"] or files[".csv"], key=os.path.getmtime)
+
+    def view(self, name):
+        """Get parsed view.
+
+        :param name: port, flow or endpoint.
+        """
+        name = name.lower().strip()
+        if name not in [v for v, _ in VIEWS_KEYWORDS]:
+            raise Exception(f"Invalid view {name}, valid views: {[v for v, _ in VIEWS_KEYWORDS]}")
+        files = self.report_files()
+        if not files:
+            raise Exception(f"No CSV or JSON reports of the run found in {self.output_dir}")
+        signature = [(f, os.path.getsize(f), os.path.getmtime(f)) for f in files]
+        if signature != self.signature:
+            self.signature = signature
+            self.views = {}
+        if name not in self.views:
+            self.views[name] = self._parse_view(name, files)
+        return self.views[name]
+
+    def _parse_view(self, name, files):
+        view = CltView(name)
+        for report_file in files:
+            self.logger.debug(f"Parse {name} view from {report_file}")
+            records = iter_csv_records(report_file) if report_file.lower().endswith(".csv") else iter_json_records(report_file)
+            for section, record in records:
+                if view_of(section) == name:
+                    view.add(section, _flatten(record))
+        return view
@@ -0,0 +1,90 @@
+"""
+Cache of the CloudShell attributes of the reserved ByteBlower resources.
+"""
+import threading
+
+from cloudshell.traffic.helpers import get_cs_session, get_reservation_id, get_resources_from_reservation
+
+
+def get_resource_attributes(context, resource_name):
+    """Get all attributes of resource with a single API call.
+
+    :return: {attribute name: value}, 2nd gen attributes are stored with and without the model/family namespace.
+    """
+    details = get_cs_session(context).GetResourceDetails(resource_name)
+    attributes = {}
+    for attribute in details.ResourceAttributes:
+        attributes[attribute.Name] = attribute.Value
+        for namespace in (details.ResourceModelName, details.ResourceFamilyName):
+            if attribute.Name.startswith(f"{namespace}."):
+                attributes[attribute.Name[len(namespace) + 1 :]] = attribute.Value
+    return attributes
+
+
+class ReservationAttributes(object):
+    """Attributes of the reserved resources, cached until invalidated.
+
+    All attributes of a resource are fetched together on first access. The resources list is fetched again by each
+    resources call and the attributes of resources that left the reservation are dropped. Everything is dropped when
+    a command context of another reservation is used or when invalidate is called, the handler invalidates the cache
+    at the start of each load_config so the run commands use a snapshot of the attributes read by that load.
+
+    :ivar counters: {counter name: count}, API calls and cache hits since the cache was created.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.reservation_id = None
+        self.models = {}
+        self.attributes = {}
+        self.lock = threading.Lock()
+        self.counters = {"resources_calls": 0, "attributes_calls": 0, "hits": 0, "invalidations": 0}
+
+    def _scope(self, context):
+        reservation_id = get_reservation_id(context)
+        if reservation_id != self.reservation_id:
+            if self.reservation_id is not None:
+                self._invalidate()
+            self.reservation_id = reservation_id
+
+    def resources(self, context, *resource_models):
+        """Get the reserved resources of the requested models.
+
+        :return: list of ReservedResourceInfo.
+        """
+        resources = get_resources_from_reservation(context, *resource_models)
+        with self.lock:
+            self._scope(context)
+            self.counters["resources_calls"] += 1
+            names = {resource.Name for resource in resources}
+            for name in [n for n, model in self.models.items() if n not in names and model in resource_models]:
+                del self.models[name]
+                self.attributes.pop(name, None)
+            self.models.update({resource.Name: resource.ResourceModelName for resource in resources})
+        return resources
+
+    def get(self, context, resource_name, attribute):
+        """Get attribute value, fetch all attributes of the resource if they were not fetched yet."""
+        with self.lock:
+            self._scope(context)
+            attributes = self.attributes.get(resource_name)
+            if attributes is None:
+                attributes = self.attributes[resource_name] = get_resource_attributes(context, resource_name)
+                self.counters["attributes_calls"] += 1
+            else:
+                self.counters["hits"] += 1
+        if attribute not in attributes:
+            raise Exception(f"Resource {resource_name} has no attribute {attribute}")
+        return attributes[attribute]
+
+    def invalidate(self):
+        """Drop all cached attributes."""
+        with self.lock:
+            self._invalidate()
+
+    def _invalidate(self):
+        self.models = {}
+        self.attributes = {}
+        self.counters["invalidations"] += 1
+        if self.logger:
+            self.logger.debug(f"Reservation attributes cache invalidated, counters {self.counters}")
@@ -0,0 +1,111 @@
+"""
+Compact fixed capacity storage for status samples.
+"""
+import threading
+from array import array
+
+DEFAULT_CAPACITY = 4096
+
+
+class SampleRing(object):
+    """Ring buffer of (timestamp, state, values) samples stored in typed array columns.
+
+    States are stored as codes into a table of the state names seen so far. Once the ring is full the oldest sample is
+    overwritten or, if downsample is set, the oldest half of the samples is merged pairwise so older data is kept at a
+    lower resolution.
+
+    :param capacity: maximum number of samples.
+    :param values: initial number of float values columns, a wider sample adds columns and missing values are stored as
+        NaN.
+    :param downsample: merge old samples instead of dropping them when full.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, values=0, downsample=False):
+        self.capacity = capacity
+        self.downsample = downsample
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.states = array("H", bytes(2 * capacity))
+        self.values = [array("d", [float("nan")]) * capacity for _ in range(values)]
+        self.state_names = []
+        self.state_codes = {}
+        self.start = 0
+        self.count = 0
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, state, values):
+        """Add sample.
+
+        :param state: state name, ex. 'Running'.
+        :param values: list of float.
+        """
+        with self.lock:
+            while len(self.values) < len(values):
+                self.values.append(array("d", [float("nan")]) * self.capacity)
+            if state not in self.state_codes:
+                self.state_codes[state] = len(self.state_names)
+                self.state_names.append(state)
+            if self.count == self.capacity:
+                if self.downsample and self.capacity >= 4:
+                    self._merge_oldest()
+                else:
+                    self.start = (self.start + 1) % self.capacity
+                    self.count -= 1
+            index = (self.start + self.count) % self.capacity
+            self.timestamps[index] = timestamp
+            self.states[index] = self.state_codes[state]
+            for column, value in zip(self.values, list(values) + [float("nan")] * (len(self.values) - len(values))):
+                column[index] = value
+            self.count += 1
+            self.total += 1
+
+    def last(self, num_samples=1, with_timestamp=False):
+        """Get the newest samples, oldest first, only the requested samples are read.
+
+        :return: list of [state, value strings...], prefixed with the timestamp if with_timestamp is set.
+        """
+        with self.lock:
+            num_samples = min(max(num_samples, 0), self.count)
+            samples = []
+            for offset in range(self.count - num_samples, self.count):
+                index = (self.start + offset) % self.capacity
+                sample = [self.state_names[self.states[index]]] + [f"{column[index]:.2f}" for column in self.values]
+                samples.append([self.timestamps[index]] + sample if with_timestamp else sample)
+            return samples
+
+    def since(self, total):
+        """Get the samples appended after the ring total count was total, limited to the samples still in the ring.
+
+        :return: (current total, [(timestamp, state, (values...)), ...] oldest first)
+        """
+        with self.lock:
+            samples = []
+            for offset in range(self.count - min(self.total - total, self.count), self.count):
+                index = (self.start + offset) % self.capacity
+                values = tuple(column[index] for column in self.values)
+                samples.append((self.timestamps[index], self.state_names[self.states[index]], values))
+            return self.total, samples
+
+    def _merge_oldest(self):
+        """Merge the oldest half of the samples pairwise, the merged sample keeps the newer timestamp and state.
+
+        If the oldest half is odd its newest sample is kept as is.
+        """
+        ordered = [(self.start + offset) % self.capacity for offset in range(self.count)]
+        merged = self.count // 2 - (self.count // 2) % 2
+        sources = [(ordered[i], ordered[i + 1]) for i in range(0, merged, 2)] + [(i, i) for i in ordered[merged:]]
+        columns = [self.timestamps, self.states] + self.values
+        new_columns = [array(column.typecode) for column in columns]
+        for older, newer in sources:
+            new_columns[0].append(self.timestamps[newer])
+            new_columns[1].append(self.states[newer])
+            for column, new_column in zip(self.values, new_columns[2:]):
+                new_column.append((column[older] + column[newer]) / 2)
+        for column, new_column in zip(columns, new_columns):
+            for offset, value in enumerate(new_column):
+                column[offset] = value
+        self.start = 0
+        self.count = len(sources)
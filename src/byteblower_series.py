@@ -0,0 +1,271 @@
+"""
+Columnar time series store for the statistics samples of a run.
+"""
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+TIME_DIGITS = 3
+VALUE_DIGITS = 2
+
+
+def percentile(sorted_values, percent):
+    """Calculate percentile with linear interpolation between closest ranks.
+
+    :param sorted_values: non empty sorted sequence.
+    :param percent: 0..100
+    """
+    position = (len(sorted_values) - 1) * percent / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def aggregate(rows, interval):
+    """Average rows into interval buckets aligned to time 0.
+
+    :param rows: [[time, value...], ...] in time order.
+    :return: [[bucket start time, number of rows, mean value...], ...], NaN values are skipped in the means.
+    """
+    buckets = []
+    for row in rows:
+        start = (row[0] // interval) * interval
+        if not buckets or buckets[-1][0] != start:
+            buckets.append([start, 0] + [[] for _ in row[1:]])
+        bucket = buckets[-1]
+        bucket[1] += 1
+        for values, value in zip(bucket[2:], row[1:]):
+            if value == value:
+                values.append(value)
+    return [bucket[:2] + [sum(v) / len(v) if v else float("nan") for v in bucket[2:]] for bucket in buckets]
+
+
+def _compact(value, digits):
+    """Round value for JSON output, NaN becomes None."""
+    return round(value, digits) if value == value else None
+
+
+class _SpillFile(object):
+    """Append only file of doubles, read through a memory map."""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.map = None
+        self.view = None
+        self.mapped_size = 0
+
+    def append(self, column):
+        self.close()
+        with open(self.path, "ab") as writer:
+            column.tofile(writer)
+        self.size += len(column)
+
+    def values(self):
+        """Memory view of all values in the file as doubles."""
+        if not self.size:
+            return array("d")
+        if self.mapped_size != self.size:
+            self.close()
+            with open(self.path, "rb") as reader:
+                self.map = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.map).cast("d")
+            self.mapped_size = self.size
+        return self.view
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.mapped_size = 0
+
+
+class Series(object):
+    """Timestamp column and one column per metric of a single port or endpoint.
+
+    New samples are kept in memory, every chunk_size samples the columns are appended to spill files. The last column
+    holds the store sequence number of each sample. Timestamps are kept sorted for the bisect based windows, a sample
+    older than the last sample gets the last sample timestamp.
+
+    :param spill_prefix: full path prefix of the spill files.
+    """
+
+    def __init__(self, name, metrics, spill_prefix, chunk_size):
+        self.name = name
+        self.metrics = list(metrics)
+        self.chunk_size = chunk_size
+        self.columns = [array("d") for _ in range(len(self.metrics) + 2)]
+        self.spill_files = [_SpillFile(f"{spill_prefix}-{i}.bin") for i in range(len(self.columns))]
+        self.last_timestamp = float("-inf")
+
+    def append(self, timestamp, values, sequence=0):
+        # clock offset corrections can move a sample slightly before the previous one.
+        timestamp = self.last_timestamp = max(timestamp, self.last_timestamp)
+        values = (list(values) + [float("nan")] * len(self.metrics))[: len(self.metrics)]
+        for column, value in zip(self.columns, [timestamp] + values + [sequence]):
+            column.append(value)
+        if len(self.columns[0]) >= self.chunk_size:
+            for column, spill_file in zip(self.columns, self.spill_files):
+                spill_file.append(column)
+            self.columns = [array("d") for _ in self.columns]
+
+    def __len__(self):
+        return self.spill_files[0].size + len(self.columns[0])
+
+    def window(self, metric, start, end):
+        """Get metric values with start <= timestamp <= end.
+
+        :return: list of floats, NaN values are skipped.
+        """
+        column = self.metrics.index(metric) + 1
+        values = []
+        for timestamps, metric_values in (
+            (self.spill_files[0].values(), self.spill_files[column].values()),
+            (self.columns[0], self.columns[column]),
+        ):
+            first = bisect_left(timestamps, start) if start is not None else 0
+            last = bisect_right(timestamps, end) if end is not None else len(timestamps)
+            values.extend(v for v in metric_values[first:last] if v == v)
+        return values
+
+    def since(self, sequence):
+        """Get the samples with store sequence number greater than sequence.
+
+        :return: [[timestamp, value...], ...] oldest first.
+        """
+        rows = []
+        for columns in ([spill_file.values() for spill_file in self.spill_files], self.columns):
+            first = bisect_right(columns[-1], sequence)
+            rows.extend([list(row) for row in zip(*(column[first:] for column in columns[:-1]))])
+        return rows
+
+    def close(self):
+        for spill_file in self.spill_files:
+            spill_file.close()
+
+
+class SeriesStore(object):
+    """Time series of all ports and endpoints samples of a single run.
+
+    Samples should be appended in timestamp order per series, a late sample is clamped to the last timestamp of its
+    series. Times in queries are seconds since the store was created.
+    Every sample gets a store wide sequence number so pollers can get only the samples appended since a cursor.
+
+    :param spill_dir: parent directory for the spill directory, the spill directory itself is created on first use.
+    :param chunk_size: number of samples per series kept in memory before spilling to disk.
+    """
+
+    def __init__(self, logger, spill_dir=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.logger = logger
+        self.parent_dir = spill_dir
+        self.chunk_size = chunk_size
+        self.spill_dir = None
+        self.series = {}
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.sequence = 0
+        # identify the store in cursors so a cursor of a previous run is not applied to the current run.
+        self.run_id = uuid.uuid4().hex[:8]
+
+    def append(self, name, timestamp, values, metrics=None):
+        """Add sample.
+
+        :param metrics: metrics names, used when the series is created, default to value1, value2...
+        """
+        with self.lock:
+            series = self.series.get(name)
+            if series is None:
+                if not self.spill_dir:
+                    if self.parent_dir:
+                        os.makedirs(self.parent_dir, exist_ok=True)
+                    self.spill_dir = tempfile.mkdtemp(prefix="bb-series-", dir=self.parent_dir)
+                    self.logger.debug(f"Statistics spill directory {self.spill_dir}")
+                metrics = metrics or [f"value{i + 1}" for i in range(len(values))]
+                spill_prefix = os.path.join(self.spill_dir, f"series{len(self.series)}")
+                series = self.series[name] = Series(name, metrics, spill_prefix, self.chunk_size)
+            self.sequence += 1
+            series.append(timestamp, values, self.sequence)
+
+    def query(self, names=None, start=None, end=None, percentiles=DEFAULT_PERCENTILES):
+        """Summarize the metrics of the requested series over time window.
+
+        :param names: series names, default to all series.
+        :param start: window start in seconds since the store was created, default to the first sample.
+        :param end: window end in seconds since the store was created, default to the last sample.
+        :return: {name: {metric: {'count': int, 'min': float, 'max': float, 'mean': float, 'p<percent>': float...}}}
+        """
+        start = self.start_time + start if start is not None else None
+        end = self.start_time + end if end is not None else None
+        summary = {}
+        with self.lock:
+            for name in names or self.series:
+                if name not in self.series:
+                    raise Exception(f"No statistics for {name}, available names: {list(self.series)}")
+                series = self.series[name]
+                summary[name] = {}
+                for metric in series.metrics:
+                    values = sorted(series.window(metric, start, end))
+                    metric_summary = {"count": len(values)}
+                    if values:
+                        metric_summary.update({"min": values[0], "max": values[-1], "mean": sum(values) / len(values)})
+                        for percent in percentiles:
+                            metric_summary[f"p{percent:g}"] = percentile(values, percent)
+                    summary[name][metric] = metric_summary
+        return summary
+
+    def delta(self, cursor=None, names=None, interval=None):
+        """Get the samples appended since cursor in a compact form.
+
+        With interval, samples are averaged into interval buckets. A bucket split between two calls is returned by both
+        calls with the samples of each call, merge them with the count column.
+
+        :param cursor: cursor returned by the previous call, None or a cursor of another run to get all samples.
+        :param names: series names, default to all series.
+        :param interval: bucket size in seconds, None for raw samples.
+        :return: {'cursor': str, 'reset': bool, 'series': {name: {'columns': [...], 'samples': [[...], ...]}}}, times are
+            seconds since the store was created, 'reset' is True if the cursor belongs to another run.
+        """
+        run_id, _, sequence = (cursor or "").partition(":")
+        reset = bool(cursor) and run_id != self.run_id
+        sequence = int(sequence) if cursor and not reset else 0
+        delta = {}
+        with self.lock:
+            for name in names or self.series:
+                if name not in self.series:
+                    raise Exception(f"No statistics for {name}, available names: {list(self.series)}")
+                series = self.series[name]
+                rows = series.since(sequence)
+                if not rows:
+                    continue
+                for row in rows:
+                    row[0] -= self.start_time
+                columns = ["time"] + series.metrics
+                if interval:
+                    rows = aggregate(rows, interval)
+                    columns.insert(1, "count")
+                samples = [[_compact(row[0], TIME_DIGITS)] + [_compact(v, VALUE_DIGITS) for v in row[1:]] for row in rows]
+                delta[name] = {"columns": columns, "samples": samples}
+            cursor = f"{self.run_id}:{self.sequence}"
+        return {"cursor": cursor, "reset": reset, "series": delta}
+
+    def close(self):
+        """Release all memory maps and remove the spill directory."""
+        with self.lock:
+            for series in self.series.values():
+                series.close()
+            self.series = {}
+            if self.spill_dir:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir = None
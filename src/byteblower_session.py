@@ -0,0 +1,122 @@
+"""
+Session scoped ByteBlower API objects.
+"""
+
+
+class _PortEntry(object):
+    def __init__(self, port, trigger, bpf):
+        self.port = port
+        self.trigger = trigger
+        self.bpf = bpf
+        self.history = trigger.ResultHistoryGet()
+
+
+class ByteBlowerSession(object):
+    """Keep one ByteBlower server connection and one port with Rx trigger per interface across load_config calls.
+
+    Ports and triggers of interfaces that are still used are reused and their results are cleared, only changed filters
+    are set again. Interfaces that are no longer used, and the previous server when the address changed, are retired by
+    setup and destroyed by release, once the caller no longer publishes their result histories. Close destroys
+    everything.
+
+    :param bb: byteblowerll ByteBlower instance.
+    :ivar counters: {counter name: count}, API objects created, reused and destroyed since the session was created.
+    """
+
+    def __init__(self, logger, bb):
+        self.logger = logger
+        self.bb = bb
+        self.address = None
+        self.server = None
+        self.ports = {}
+        # [(server, interface, _PortEntry)] and [(address, server)] to destroy on release.
+        self.retired_ports = []
+        self.retired_servers = []
+        self.counters = {
+            "servers_created": 0,
+            "servers_reused": 0,
+            "servers_removed": 0,
+            "ports_created": 0,
+            "ports_reused": 0,
+            "ports_destroyed": 0,
+            "filters_set": 0,
+            "filters_kept": 0,
+        }
+
+    def setup(self, address, ports):
+        """Get server ports and triggers, reuse existing objects when possible.
+
+        :param address: ByteBlower server address.
+        :param ports: {logical name: (interface, BPF filter or None)}
+        :return: {logical name: byteblowerll ResultHistory}
+        """
+        if self.server is not None and address != self.address:
+            for interface in list(self.ports):
+                self.retired_ports.append((self.server, interface, self.ports.pop(interface)))
+            self.retired_servers.append((self.address, self.server))
+            self.server = None
+        if self.server is None:
+            self.server = self.bb.ServerAdd(address)
+            self.address = address
+            self.counters["servers_created"] += 1
+        else:
+            self.counters["servers_reused"] += 1
+
+        interfaces = {interface for interface, _ in ports.values()}
+        for interface in [i for i in self.ports if i not in interfaces]:
+            self.retired_ports.append((self.server, interface, self.ports.pop(interface)))
+
+        bb_ports = {}
+        for logical_name, (interface, bpf) in ports.items():
+            entry = self.ports.get(interface)
+            if entry is None:
+                port = self.server.PortCreate(interface)
+                entry = self.ports[interface] = _PortEntry(port, port.RxTriggerBasicAdd(), None)
+                self.counters["ports_created"] += 1
+            else:
+                entry.trigger.ResultClear()
+                entry.history.Clear()
+                self.counters["ports_reused"] += 1
+            if (bpf or "") != (entry.bpf or ""):
+                entry.trigger.FilterSet(bpf or "")
+                entry.bpf = bpf
+                self.counters["filters_set"] += 1
+            else:
+                self.counters["filters_kept"] += 1
+            bb_ports[logical_name] = entry.history
+        self.logger.debug(f"ByteBlower session counters {self.counters}")
+        return bb_ports
+
+    def release(self):
+        """Destroy the ports and servers retired by setup."""
+        retired_ports, self.retired_ports = self.retired_ports, []
+        for server, interface, entry in retired_ports:
+            self._destroy_port(server, interface, entry)
+        retired_servers, self.retired_servers = self.retired_servers, []
+        for address, server in retired_servers:
+            self._remove_server(address, server)
+
+    def _destroy_port(self, server, interface, entry):
+        try:
+            entry.port.RxTriggerBasicRemove(entry.trigger)
+            server.PortDestroy(entry.port)
+        except Exception as e:
+            self.logger.warning(f"Failed to destroy port {interface} - {e}")
+        self.counters["ports_destroyed"] += 1
+
+    def _remove_server(self, address, server):
+        try:
+            self.bb.ServerRemove(server)
+        except Exception as e:
+            self.logger.warning(f"Failed to remove server {address} - {e}")
+        self.counters["servers_removed"] += 1
+
+    def close(self):
+        """Destroy all ports and triggers and remove the servers."""
+        for interface in list(self.ports):
+            self._destroy_port(self.server, interface, self.ports.pop(interface))
+        if self.server is not None:
+            self._remove_server(self.address, self.server)
+        self.release()
+        self.server = None
+        self.address = None
@@ -0,0 +1,90 @@
+"""
+Lightweight nested timing spans for the driver commands.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# set to 0, false or off to disable the spans.
+SPANS_ENV = "BYTEBLOWER_SPANS"
+
+
+def spans_enabled():
+    return os.environ.get(SPANS_ENV, "on").lower() not in ("0", "false", "off", "no")
+
+
+class Spans(object):
+    """Measure nested spans, log their durations and append them as JSON lines to the metrics file.
+
+    Spans nest per thread, the path of a span is the names of all its parents and its own name separated by '/'.
+
+    :param metrics_file: full path to the JSON lines metrics file, None to log only.
+    :param enabled: False to make span a no-op.
+    """
+
+    def __init__(self, logger, metrics_file=None, enabled=True):
+        self.logger = logger
+        self.metrics_file = metrics_file
+        self.enabled = enabled and logger is not None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.pending = []
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the enclosed block.
+
+        :param attributes: extra JSON serializable values to record with the span.
+        """
+        if not self.enabled:
+            yield
+            return
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append(name)
+        path = "/".join(stack)
+        error = None
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            self._record(path, len(stack), duration, error, attributes)
+
+    def _record(self, path, depth, duration, error, attributes):
+        message = f"span {path} {duration * 1000:.1f} ms" + (f" failed: {error}" if error else "")
+        if depth:
+            self.logger.debug(message)
+        else:
+            self.logger.info(message)
+        if not self.metrics_file:
+            return
+        record = {"time": time.time(), "span": path, "depth": depth, "duration": round(duration, 6)}
+        if error:
+            record["error"] = error
+        record.update(attributes)
+        with self.lock:
+            self.pending.append(json.dumps(record))
+            # write once per root span to keep the cost of nested spans to a list append.
+            if not depth:
+                self._flush()
+
+    def flush(self):
+        """Append pending records to the metrics file."""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        try:
+            with open(self.metrics_file, "a") as writer:
+                writer.write("\n".join(self.pending) + "\n")
+        except OSError as e:
+            self.logger.warning(f"Failed to write metrics file {self.metrics_file} - {e}")
+        self.pending = []
@@ -0,0 +1,153 @@
+"""
+Supervision of the ByteBlower CLT process tree.
+"""
+import time
+
+from byteblower_lazy import psutil
+
+CLT_PROCESS_NAME = "byteblower-clt"
+
+CLT_TERMINATE_TIMEOUT = 10
+CLT_KILL_TIMEOUT = 5
+# children of the CLT are looked up again every CLT_TREE_REFRESH samples.
+CLT_TREE_REFRESH = 10
+
+CLT_METRICS = ["cpu_percent", "rss_mb"]
+
+WAIT_POLL_INTERVAL = 0.1
+
+
+def is_clt_process(name):
+    return (name or "").lower().startswith(CLT_PROCESS_NAME)
+
+
+def wait_processes(processes, timeout):
+    """Wait for processes to exit, exited processes that were not reaped yet by their parent count as exited.
+
+    :return: processes still running after the timeout.
+    """
+    deadline = time.time() + timeout
+    alive = list(processes)
+    while True:
+        _, alive = psutil.wait_procs(alive, min(WAIT_POLL_INTERVAL, max(deadline - time.time(), 0)))
+        alive = [process for process in alive if _is_running(process)]
+        if not alive or time.time() >= deadline:
+            return alive
+
+
+def _is_running(process):
+    try:
+        return process.status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+def reap_orphan_clts(logger, timeout=CLT_KILL_TIMEOUT):
+    """Kill CLT processes left by crashed runs, i.e. CLT processes whose parent process is gone.
+
+    A process is orphan if its parent does not exist, was re-parented to init or is a newer process that reused the pid.
+
+    :return: list of killed pids.
+    """
+    processes = {}
+    for process in psutil.process_iter(["name", "ppid", "create_time"]):
+        processes[process.pid] = process
+    orphans = []
+    for process in processes.values():
+        if not is_clt_process(process.info["name"]):
+            continue
+        ppid = process.info["ppid"]
+        parent = processes.get(ppid)
+        create_time = process.info["create_time"] or 0
+        if not ppid or ppid == 1 or parent is None or (parent.info["create_time"] or 0) > create_time:
+            orphans.append(process)
+    for process in orphans:
+        logger.warning(f"Kill orphan CLT process {process.pid}, parent {process.info['ppid']}")
+        try:
+            process.kill()
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.Error as e:
+            logger.warning(f"Failed to kill orphan CLT process {process.pid} - {e}")
+    wait_processes(orphans, timeout)
+    return [process.pid for process in orphans]
+
+
+class CltSupervisor(object):
+    """Track the CLT process tree by its root PID, sample its resources and stop it.
+
+    :param pid: CLT process id, raises psutil.NoSuchProcess if the process already exited.
+    """
+
+    def __init__(self, logger, pid, terminate_timeout=CLT_TERMINATE_TIMEOUT):
+        self.logger = logger
+        self.pid = pid
+        self.terminate_timeout = terminate_timeout
+        self.process = psutil.Process(pid)
+        self.tree = {pid: self.process}
+        self.samples = 0
+        self.killed = []
+
+    def _refresh_tree(self):
+        try:
+            children = self.process.children(recursive=True)
+        except psutil.NoSuchProcess:
+            children = []
+        tree = {self.pid: self.process}
+        for child in children:
+            # keep the known Process objects, cpu_percent is measured since the previous call on the same object.
+            tree[child.pid] = self.tree.get(child.pid, child)
+        self.tree = tree
+
+    def sample(self):
+        """Get the CPU and RSS of the CLT process tree.
+
+        :return: (CPU percent since the previous sample, RSS MB), None if the CLT exited.
+        """
+        if self.samples % CLT_TREE_REFRESH == 0:
+            self._refresh_tree()
+        self.samples += 1
+        cpu_percent = 0.0
+        rss = 0
+        alive = False
+        for process in list(self.tree.values()):
+            try:
+                with process.oneshot():
+                    if process.status() == psutil.STATUS_ZOMBIE:
+                        raise psutil.NoSuchProcess(process.pid)
+                    cpu_percent += process.cpu_percent(None)
+                    rss += process.memory_info().rss
+                alive = True
+            except psutil.Error:
+                self.tree.pop(process.pid, None)
+        return (cpu_percent, rss / 1000000.0) if alive else None
+
+    def stop(self):
+        """Terminate the CLT process tree, kill the processes that did not exit within the terminate timeout.
+
+        :return: pids of the processes that had to be killed.
+        """
+        self._refresh_tree()
+        tree = list(self.tree.values())
+        for process in tree:
+            try:
+                process.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        start = time.time()
+        alive = wait_processes(tree, self.terminate_timeout)
+        if alive:
+            self.logger.warning(
+                f"CLT processes {[p.pid for p in alive]} did not exit within {self.terminate_timeout} seconds, kill them"
+            )
+            for process in alive:
+                try:
+                    process.kill()
+                except psutil.NoSuchProcess:
+                    pass
+            still_alive = wait_processes(alive, CLT_KILL_TIMEOUT)
+            if still_alive:
+                self.logger.error(f"CLT processes {[p.pid for p in still_alive]} did not exit after kill")
+        self.killed = [p.pid for p in alive]
+        self.logger.debug(f"CLT process tree stopped in {time.time() - start:.2f} seconds, killed {self.killed}")
+        return self.killed
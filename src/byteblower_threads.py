@@ -1,143 +1,628 @@
+import asyncio
 import io
 import os
 import re
 import subprocess
 import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
 
-import psutil
-import rpyc
+from byteblower_clt import CltOutputParser, CltState
+from byteblower_engine import EngineTask
+from byteblower_harvester import HistoryHarvester
+from byteblower_lazy import psutil, rpyc
+from byteblower_samples import SampleRing
+from byteblower_supervisor import CLT_METRICS, CltSupervisor
 
+EP_CONNECT_TIMEOUT = 3
+EP_COMMAND_TIMEOUT = 30
+EP_PING_INTERVAL = 10
 
-class ServerThread(threading.Thread):
-    def __init__(self, logger, clt, project, scenario, output, interval=1):
-        threading.Thread.__init__(self)
+# State field of the agent status line that shows the endpoint is registered with the meeting point.
+EP_REGISTERED_RE = re.compile(r"^Status:\s*(registered|armed|running)\b", re.IGNORECASE)
+
+EP_MAX_PENDING_SAMPLES = 10000
+# until registered the endpoint is drained continuously, each drain waits on the endpoint up to this timeout.
+EP_REGISTRATION_DRAIN_TIMEOUT = 0.2
+
+CLT_READ_SIZE = 64 * 1024
+
+STATS_SAMPLE_INTERVAL = 1
+STATS_EP_SAMPLES = 60
+
+PORT_METRICS = ["cumulative_mb", "interval_mb"]
+CLT_SERIES = "CLT"
+
+# Executed on the endpoint side through the RPyC classic connection. The reader thread follows the agent stdout locally
+# on the endpoint and drain returns everything parsed since the previous call in a single round trip. The result is
+# made of tuples, strings and numbers only so RPyC passes it by value.
+EP_STATUS_READER_CODE = """
+import re
+import threading
+import time
+from collections import deque
+
+
+class EpStatusReader(object):
+    def __init__(self, popen, registered_pattern, max_samples):
+        self.popen = popen
+        self.registered_re = re.compile(registered_pattern, re.IGNORECASE)
+        self.samples = deque(maxlen=max_samples)
+        self.registered = False
+        self.eof = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._read, name="EpStatusReader")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _read(self):
+        try:
+            for raw_line in iter(self.popen.stdout.readline, b""):
+                line = raw_line.decode("utf-8", "replace").strip()
+                with self.condition:
+                    if not self.registered and self.registered_re.search(line):
+                        self.registered = True
+                    fields = line.split()
+                    if line.startswith("Status:") and len(fields) > 1:
+                        values = tuple(float(v) for v in re.findall(r"\\d+\\.\\d+", line))
+                        self.samples.append((time.time(), fields[1], values))
+                    self.condition.notify_all()
+        finally:
+            with self.condition:
+                self.eof = True
+                self.condition.notify_all()
+
+    def drain(self, timeout):
+        with self.condition:
+            if not self.samples and not self.eof:
+                self.condition.wait(timeout)
+            samples = tuple(self.samples)
+            self.samples.clear()
+            exit_code = self.popen.poll() if self.eof else None
+            return samples, self.registered, self.eof, exit_code, time.time()
+"""
+
+
+def connect_endpoint(ip, connect_timeout=EP_CONNECT_TIMEOUT, command_timeout=EP_COMMAND_TIMEOUT):
+    """Open RPyC classic connection to endpoint with bounded connect and command timeouts.
+
+    :param connect_timeout: TCP connect timeout in seconds, single attempt.
+    :param command_timeout: timeout in seconds for each synchronous request over the connection.
+    """
+    stream = rpyc.core.stream.SocketStream.connect(
+        ip, rpyc.utils.classic.DEFAULT_SERVER_PORT, timeout=connect_timeout, attempts=1
+    )
+    return rpyc.utils.factory.connect_stream(
+        stream, rpyc.core.service.ClassicService, config={"sync_request_timeout": command_timeout}
+    )
+
+
+def is_transport_error(error):
+    """Check if error is a failure of the RPyC connection itself, exceptions raised on the endpoint are not.
+
+    :param error: exception raised by an RPyC call.
+    """
+    if hasattr(error, "_remote_tb"):
+        return False
+    return isinstance(error, (EOFError, OSError, rpyc.AsyncResultTimeout))
+
+
+class EpConnectionPool(object):
+    """Persistent RPyC classic connections to endpoints, keyed by endpoint IP.
+
+    A connection is handed out as is if it was used in the last ping_interval seconds, otherwise it is pinged first.
+    Closed or dead connections are replaced transparently. Connections held by running agents are never discarded.
+    """
+
+    def __init__(
+        self, logger, connect_timeout=EP_CONNECT_TIMEOUT, command_timeout=EP_COMMAND_TIMEOUT, ping_interval=EP_PING_INTERVAL
+    ):
+        self.logger = logger
+        self.connect_timeout = connect_timeout
+        self.command_timeout = command_timeout
+        self.ping_interval = ping_interval
+        self.connections = {}
+        self.last_used = {}
+        self.locks = {}
+        self.holders = {}
+        self.lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.reconnected = 0
+
+    def get(self, ip, connect_timeout=None, hold=False):
+        """Get live connection to the endpoint, connect if needed.
+
+        :param connect_timeout: connect timeout for new connection, default to the pool connect timeout.
+        :param hold: True if the connection is used by a running agent until release is called.
+        """
+        with self.lock:
+            ip_lock = self.locks.setdefault(ip, threading.Lock())
+        with ip_lock:
+            conn = self.connections.get(ip)
+            if conn is not None and self._is_alive(ip, conn):
+                self.reused += 1
+                self.logger.debug(f"EP {ip} connection reused ({self._counters()})")
+            else:
+                if conn is not None:
+                    self.reconnected += 1
+                    self._close(conn)
+                conn = connect_endpoint(ip, connect_timeout or self.connect_timeout, self.command_timeout)
+                self.connections[ip] = conn
+                self.created += 1
+                self.logger.debug(f"EP {ip} connection created ({self._counters()})")
+            self.last_used[ip] = time.time()
+            if hold:
+                with self.lock:
+                    self.holders[ip] = self.holders.get(ip, 0) + 1
+            return conn
+
+    def release(self, ip):
+        """Release connection held by get with hold."""
+        with self.lock:
+            if self.holders.get(ip, 0) > 1:
+                self.holders[ip] -= 1
+            else:
+                self.holders.pop(ip, None)
+
+    def discard(self, ip):
+        """Close and forget the endpoint connection after a transport error, so next get will reconnect.
+
+        Connections held by running agents are kept, a dead connection is replaced by the next get anyway.
+
+        :return: True if the connection was discarded.
+        """
+        with self.lock:
+            if self.holders.get(ip):
+                self.logger.debug(f"EP {ip} connection is held by {self.holders[ip]} agents, not discarded")
+                return False
+            conn = self.connections.pop(ip, None)
+        if conn is not None:
+            self._close(conn)
+        return True
+
+    def close(self):
+        """Close all connections."""
+        with self.lock:
+            connections, self.connections = self.connections, {}
+        for conn in connections.values():
+            self._close(conn)
+        self.logger.info(f"EP connection pool closed ({self._counters()})")
+
+    def _is_alive(self, ip, conn):
+        if conn.closed:
+            return False
+        if time.time() - self.last_used.get(ip, 0) < self.ping_interval:
+            return True
+        try:
+            conn.ping(timeout=self.connect_timeout)
+            return True
+        except Exception as e:
+            self.logger.debug(f"EP {ip} connection is dead: {e}")
+            return False
+
+    def _counters(self):
+        return f"created {self.created}, reused {self.reused}, reconnected {self.reconnected}"
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+CltRun = namedtuple("CltRun", ["project", "scenario", "output", "flows", "expected_flows"], defaults=(None, None))
+CltRun.__doc__ = """CLT run arguments.
+
+:ivar output: CLT reports output folder.
+:ivar flows: flow names in the project, to identify flows in the CLT output.
+:ivar expected_flows: number of flows in the scenario.
+"""
+
+
+class ServerThread(EngineTask):
+    """Run the ByteBlower CLT and follow its output, the CLT process tree is stopped through CltSupervisor.
+
+    The CLT output is read from its pipe as soon as it is written, copied to the CLT log and parsed incrementally into
+    CltEvents, see CltState for the resulting run state and events queue.
+
+    :param run: CltRun.
+    :ivar completed: set when the CLT exited, failed or stopped all the scenario flows.
+    """
+
+    def __init__(self, logger, clt, run, state_changed=None, engine=None):
+        super().__init__(engine)
         self.logger = logger
         self.clt = clt
-        self.project = project
-        self.scenario = scenario
-        self.output = output
-        self.interval = interval
-        self.finished = threading.Event()
-        self.setDaemon(True)
+        self.project = run.project
+        self.scenario = run.scenario
+        self.output = run.output
+        self.flows = run.flows
         self.logger.info("Server thread Initiated")
-        self.failed = None
         self.popen = None
-        self.traffic_running = False
+        self.supervisor = None
+        self.start_failed = None
+        self.state_changed = state_changed or threading.Event()
+        self.completed = threading.Event()
+        self.clt_state = CltState(self.logger, self.state_changed, expected_flows=run.expected_flows, completed=self.completed)
+
+    @property
+    def failed(self):
+        return self.start_failed or self.clt_state.failed
+
+    @property
+    def traffic_running(self):
+        return self.clt_state.traffic_running
+
+    @property
+    def traffic_started(self):
+        return self.clt_state.traffic_started.isSet()
+
+    def get_events(self):
+        """Pop all CLT events parsed since the previous call."""
+        return self.clt_state.get_events()
 
     def stop(self):
         self.logger.debug("Stopping Server thread")
-        self.finished.set()
-        if self.popen:
-            self.popen.terminate()
-        self.logger.debug("Past Server Thread Terminate Call")
-        self.traffic_running = False
-
-        # in case clt exists, kill the pid just to be sure
-        if self.popen:
-            self._kill_clt_by_pid(self.popen.pid)
+        self.stop_task()
+        self.clt_state.traffic_running = False
+        if self.supervisor:
+            self.supervisor.stop()
 
-    def run(self):
+    async def run(self):
         self.logger.info("Starting Server thread")
         server_cmd = [self.clt, "-project", self.project, "-scenario", self.scenario, "-output", self.output]
         self.logger.info(f"Run Server command - {server_cmd}")
-        self.traffic_running = False
-        self.failed = None
+        parser = CltOutputParser(self.clt_state.on_event, self.flows)
         filename, suffix = os.path.splitext(self.logger.handlers[0].baseFilename)
         clt_logger = filename + "-clt" + suffix
-        with io.open(clt_logger, "wb") as writer, io.open(clt_logger, "rb", 1) as reader:
-            self.popen = subprocess.Popen(server_cmd, stdout=writer, stderr=writer, universal_newlines=True)
-            while self.popen.poll() is None:
-                output = reader.read().decode("utf-8")
-                self._parse_output(output)
-                self.finished.wait(self.interval)
-            output = reader.read().decode("utf-8")
-            self._parse_output(output)
-        self.popen.wait()
-
-    def _parse_output(self, output):
-        if "StartTraffic" in output:
-            self.traffic_running = True
-        elif "StopTraffic" in output:
-            self.traffic_running = False
-        elif "Action failed" in output:
-            self.failed = [l for l in output.split("\n") if "Action failed" in l][0]
-        elif "!MESSAGE Failed" in output:
-            self.failed = [l for l in output.split("\n") if "!MESSAGE Failed" in l][0]
-        if self.failed:
-            raise Exception(self.failed)
-
-    def _kill_clt_by_pid(self, pid):
-        name = "ByteBlower-CLT"
-        processes = []
-        for process in psutil.process_iter():
-            name_, exe, cmdline = "", "", []
-            try:
-                name_ = process.name()
-                process.cmdline()
-                process.exe()
-            except (psutil.AccessDenied, psutil.ZombieProcess, OSError, SystemError):
-                pass
-            except psutil.NoSuchProcess:
-                continue
-            if name in name_ and process.pid == pid:
-                processes.append(process)
-        if processes:
-            processes[0].kill()
-
-
-class EpThread(threading.Thread):
-    def __init__(self, logger, ip, meetingpoint, ep_clt, name, interval=0.25):
-        threading.Thread.__init__(self)
+        try:
+            with io.open(clt_logger, "wb") as writer:
+                try:
+                    self.popen = await asyncio.create_subprocess_exec(
+                        *server_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+                    )
+                except Exception as e:
+                    self.start_failed = f"Failed to start CLT: {e}"
+                    self.logger.error(self.start_failed)
+                    return
+                try:
+                    self.supervisor = CltSupervisor(self.logger, self.popen.pid)
+                except psutil.NoSuchProcess:
+                    self.logger.debug("CLT exited before supervision started")
+                else:
+                    # stopped while the CLT was spawned.
+                    if self.finished.isSet():
+                        await self.engine.run_blocking(self.supervisor.stop)
+                self.state_changed.set()
+                while True:
+                    chunk = await self.popen.stdout.read(CLT_READ_SIZE)
+                    if not chunk:
+                        break
+                    writer.write(chunk)
+                    writer.flush()
+                    parser.feed(chunk)
+                parser.close()
+            await self.popen.wait()
+        finally:
+            exit_code = self.popen.returncode if self.popen else None
+            self.clt_state.on_exit(exit_code, stopped=self.finished.isSet())
+
+
+StatsSnapshot = namedtuple("StatsSnapshot", ["timestamp", "ports", "eps", "clt", "lost_intervals"])
+StatsSnapshot.__doc__ = """Immutable statistics snapshot.
+
+:ivar timestamp: sample time.
+:ivar ports: {port name: (cumulative Mb, interval Mb, intended Tx Mbps, expected Rx Mbps)}
+:ivar eps: {endpoint name: ((state, value strings...), ...)}, newest sample last.
+:ivar clt: (CLT CPU percent, CLT RSS MB) or None if the CLT is not supervised.
+:ivar lost_intervals: {port name: number of intervals lost since start because the result history overflowed}
+"""
+
+
+SamplingOptions = namedtuple(
+    "SamplingOptions",
+    ["interval", "ep_samples", "store", "profiles", "start_time"],
+    defaults=(STATS_SAMPLE_INTERVAL, STATS_EP_SAMPLES, None, None, None),
+)
+SamplingOptions.__doc__ = """StatsSampler options.
+
+:ivar interval: sampling interval in seconds.
+:ivar ep_samples: number of newest samples of each endpoint kept in the snapshot.
+:ivar store: optional SeriesStore to record all ports intervals and endpoints samples, every interval added to the
+    ports result histories since the previous sample is recorded with its server timestamp converted to the controller
+    clock.
+:ivar profiles: optional ({port name: intended Tx RateProfile}, {port name: expected Rx RateProfile}), when set the
+    intended and expected rates are looked up at the sample time since start_time.
+:ivar start_time: scenario start time.
+"""
+
+
+class StatsSampler(EngineTask):
+    """Refresh all ports result histories at a fixed cadence and publish the results as an immutable StatsSnapshot.
+
+    Readers use the snapshot attribute without locking, sample can also be called directly when the task is not running.
+    On the engine each sample runs on the engine executor since byteblowerll calls are blocking.
+
+    :param bb_ports: {port name: byteblowerll ResultHistory}
+    :param eps_threads: {endpoint name: EpThread}
+    :param options: SamplingOptions, default options if not set.
+    :param clt: optional CltSupervisor to sample the CLT process tree resources.
+    """
+
+    def __init__(self, logger, bb_ports, eps_threads, intended_tx, options=None, clt=None, engine=None):
+        super().__init__(engine)
+        options = options or SamplingOptions()
+        self.clt = clt
         self.logger = logger
-        self.ip = ip
-        self.meetingpoint = meetingpoint
-        self.ep_clt = ep_clt
-        self.name = name
+        self.bb_ports = bb_ports
+        self.eps_threads = eps_threads
+        self.intended_tx = intended_tx
+        self.interval = options.interval
+        self.ep_samples = options.ep_samples
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.store = options.store
+        self.eps_totals = {}
+        self.harvester = HistoryHarvester(logger, self.store.start_time if self.store else None)
+        self.tx_profiles, self.rx_profiles = options.profiles or ({}, {})
+        self.start_time = options.start_time
+
+    def stop(self):
+        self.stop_task()
+
+    async def run(self):
+        self.logger.info("Starting statistics sampler thread")
+        while not self.finished.isSet():
+            start = time.time()
+            await self.engine.run_blocking(self.sample)
+            await self.wait_finished(max(self.interval - (time.time() - start), 0))
+
+    def sample(self):
+        """Refresh all ports and publish new snapshot.
+
+        :return: the new snapshot.
+        """
+        with self.lock:
+            timestamp = time.time()
+            ports = {}
+            for name, bb_port in self.bb_ports.items():
+                try:
+                    bb_port.Refresh()
+                    refresh_time = time.time()
+                    cumulative_bytes = bb_port.CumulativeLatestGet().ByteCountGet()
+                    interval_bytes = bb_port.IntervalLatestGet().ByteCountGet()
+                except Exception as e:
+                    self.logger.warning(f"Failed to refresh port {name} statistics - {e}")
+                    if self.snapshot and name in self.snapshot.ports:
+                        ports[name] = self.snapshot.ports[name]
+                    continue
+                cumulative_mb = "{0:.2f}".format(cumulative_bytes * 8 / 1000000.0)
+                interval_mb = "{0:.2f}".format(interval_bytes * 8 / 1000000.0)
+                ports[name] = (cumulative_mb, interval_mb) + self._intended_rates(name, timestamp)
+                if self.store:
+                    self._harvest(name, bb_port, refresh_time)
+            eps = {}
+            for name, ep_thread in self.eps_threads.items():
+                eps[name] = tuple(tuple(sample) for sample in ep_thread.counters.last(self.ep_samples))
+                if self.store:
+                    self.eps_totals[name], samples = ep_thread.counters.since(self.eps_totals.get(name, 0))
+                    for sample_timestamp, _, values in samples:
+                        self.store.append(name, sample_timestamp, values)
+            clt = None
+            if self.clt:
+                try:
+                    clt = self.clt.sample()
+                except Exception as e:
+                    self.logger.warning(f"Failed to sample CLT resources - {e}")
+                if clt and self.store:
+                    self.store.append(CLT_SERIES, timestamp, clt, CLT_METRICS)
+            lost_intervals = MappingProxyType(dict(self.harvester.lost))
+            self.snapshot = StatsSnapshot(timestamp, MappingProxyType(ports), MappingProxyType(eps), clt, lost_intervals)
+            return self.snapshot
+
+    def _harvest(self, name, bb_port, refresh_time):
+        """Append all intervals added to the port result history since the previous sample to the store."""
+        try:
+            intervals = self.harvester.harvest(name, bb_port, refresh_time)
+        except Exception as e:
+            self.logger.warning(f"Failed to harvest port {name} result history - {e}")
+            return
+        for timestamp, cumulative_bytes, interval_bytes in intervals:
+            cumulative_mb = cumulative_bytes * 8 / 1000000.0 if cumulative_bytes is not None else float("nan")
+            self.store.append(name, timestamp, [cumulative_mb, interval_bytes * 8 / 1000000.0], PORT_METRICS)
+
+    def _intended_rates(self, name, timestamp):
+        """Get (intended Tx, expected Rx) of port, the constant intended Tx and no expected Rx without profiles."""
+        if self.start_time is None or name not in self.tx_profiles:
+            return self.intended_tx.get(name), None
+        elapsed = timestamp - self.start_time
+        return self.tx_profiles[name].at(elapsed), self.rx_profiles[name].at(elapsed)
+
+
+EpAgent = namedtuple("EpAgent", ["name", "ip", "meetingpoint", "ep_clt"])
+EpAgent.__doc__ = """Wireless endpoint agent to run.
+
+:ivar name: endpoint logical name.
+:ivar ep_clt: full path to the agent executable on the endpoint.
+"""
+
+
+class EpThread(EngineTask):
+    """Run the wireless endpoint agent and collect its status samples.
+
+    The agent stdout is read on the endpoint by EpStatusReader, the task drains the parsed samples once per interval on
+    the engine executor, so endpoints share the engine threads instead of holding one thread each.
+
+    The samples are timestamped with the endpoint clock, they are converted to the controller clock with the lowest
+    offset observed between the endpoint time returned by drain and the controller time the drain returned.
+    """
+
+    def __init__(self, logger, agent, interval=1, pool=None, state_changed=None, counters=None, engine=None):
+        super().__init__(engine)
+        self.logger = logger
+        self.ip = agent.ip
+        self.meetingpoint = agent.meetingpoint
+        self.ep_clt = agent.ep_clt
+        self.name = agent.name
         self.interval = interval
-        self.finished = threading.Event()
-        self.setDaemon(True)
-        self.counters = []
+        self.counters = counters if counters is not None else SampleRing()
+        self.pool = pool
         self.rpyc = None
         self.popen = None
+        self.reader = None
+        self.held = False
+        self.clock_offset = None
+        self.failed = None
+        self.registered = threading.Event()
+        self.state_changed = state_changed or threading.Event()
         self.logger.info(f"EP {self.name} thread Initiated")
 
     def stop(self):
         self.logger.info(f"Stopping {self.name} thread")
-        self.finished.set()
-        # self.join()
+        self.stop_task()
+        broken = False
         if self.popen:
-            self.popen.terminate()
+            try:
+                self.popen.terminate()
+            except Exception as e:
+                if not is_transport_error(e):
+                    raise
+                # the agent can not be reached, stop_traffic must still stop the other threads.
+                self.logger.warning(f"EP {self.name} failed to terminate agent, connection lost - {e}")
+                broken = True
+        # pooled connections are closed by the pool owner.
+        if self.rpyc and not self.pool:
+            self.rpyc.close()
+        self._release()
+        if broken and self.pool:
+            self.pool.discard(self.ip)
 
-    def run(self):
-        self.logger.info(f"Starting {self.name} thread")
-        self.rpyc = rpyc.classic.connect(self.ip)
+    def _release(self):
+        if self.held:
+            self.held = False
+            self.pool.release(self.ip)
+
+    def launch(self):
+        """Connect to the endpoint and spawn the agent, raise on failure.
+
+        Called from run if the agent was not launched before the task was started.
+        """
         ep_cmd = [self.ep_clt, self.meetingpoint]
         self.logger.debug(f"EP {self.name} command: {ep_cmd}")
-        self.popen = self.rpyc.modules.subprocess.Popen(ep_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if self.pool:
+            self.rpyc = self.pool.get(self.ip, hold=True)
+            self.held = True
+        else:
+            self.rpyc = rpyc.classic.connect(self.ip)
+        try:
+            self.popen = self.rpyc.modules.subprocess.Popen(ep_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                self.rpyc.execute(EP_STATUS_READER_CODE)
+                self.reader = self.rpyc.namespace["EpStatusReader"](
+                    self.popen, EP_REGISTERED_RE.pattern, EP_MAX_PENDING_SAMPLES
+                )
+            except Exception as e:
+                self.logger.error(f"EP {self.name} failed to start status reader, terminate agent - {e}")
+                self._terminate_agent()
+                raise
+        except Exception:
+            self._release()
+            raise
+
+    def _terminate_agent(self):
+        """Terminate the remote agent, kill it if terminate failed."""
+        popen, self.popen = self.popen, None
+        try:
+            popen.terminate()
+        except Exception as e:
+            self.logger.warning(f"EP {self.name} failed to terminate agent, kill it - {e}")
+            try:
+                popen.kill()
+            except Exception as kill_error:
+                self.logger.error(f"EP {self.name} failed to kill agent - {kill_error}")
+
+    async def run(self):
+        self.logger.info(f"Starting {self.name} thread")
+        if not self.popen:
+            try:
+                await self.engine.run_blocking(self.launch)
+            except Exception as e:
+                self._fail(f"failed to start agent - {e}")
+                return
         while not self.finished.isSet():
-            self.finished.wait(self.interval)
-            raw_status = self.popen.stdout.readline().decode("utf-8").strip()
-            self.logger.debug(f"EP {self.name} raw: {raw_status}")
-            status = raw_status if raw_status.startswith("Status:") else None
-            if status:
-                new_status = [status.split()[1]] + re.findall("\d+\.\d+", status)
-                self.counters.append(new_status)
-                self.logger.info(f"EP {self.name} status: {new_status}")
+            # drain continuously until registered so start_traffic is released as soon as possible.
+            if self.registered.isSet():
+                if await self.wait_finished(self.interval):
+                    break
+                drain_timeout = 0
+            else:
+                drain_timeout = EP_REGISTRATION_DRAIN_TIMEOUT
+            try:
+                samples, registered, eof, exit_code, ep_time = await self.engine.run_blocking(self.reader.drain, drain_timeout)
+            except Exception as e:
+                if not self.finished.isSet():
+                    self._fail(f"lost connection to agent - {e}")
+                break
+            self._append_samples(samples, ep_time)
+            if registered and not self.registered.isSet():
+                self.logger.info(f"EP {self.name} registered with meeting point {self.meetingpoint}")
+                self.registered.set()
+                self.state_changed.set()
+            if eof:
+                if not self.finished.isSet():
+                    self._fail(f"agent exited with code {exit_code}")
+                break
+
+    def _append_samples(self, samples, ep_time):
+        """Append drained samples to the counters, converted from the endpoint clock to the controller clock.
+
+        :param ep_time: endpoint time when the samples were drained.
+        """
+        offset = time.time() - ep_time
+        self.clock_offset = min(offset, self.clock_offset if self.clock_offset is not None else offset)
+        for timestamp, state, values in samples:
+            self.counters.append(timestamp + self.clock_offset, state, values)
+        if samples:
+            self.logger.info(f"EP {self.name} status: {[samples[-1][1]] + list(samples[-1][2])} ({len(samples)} samples)")
+
+    def _fail(self, msg):
+        self.failed = msg
+        self.logger.error(f"EP {self.name} {msg}")
+        self.state_changed.set()
 
 
 class EpCmd(object):
-    def __init__(self, logger, ip, name):
+    def __init__(self, logger, ip, name, connect_timeout=EP_CONNECT_TIMEOUT, command_timeout=EP_COMMAND_TIMEOUT, pool=None):
         self.logger = logger
         self.ip = ip
         self.name = name
+        self.connect_timeout = connect_timeout
+        self.command_timeout = command_timeout
+        self.pool = pool
         self.conn = None
         self._get_connection()
 
     def _get_connection(self):
 
-        self.conn = rpyc.classic.connect(self.ip)
+        if self.pool:
+            self.conn = self.pool.get(self.ip, self.connect_timeout)
+        else:
+            self.conn = connect_endpoint(self.ip, self.connect_timeout, self.command_timeout)
         self.logger.info(f"EP {self.name} Command Connection Initiated")
 
+    def close(self, broken=False):
+        """Close own connection, pooled connections are kept open unless broken.
+
+        :param broken: True if the connection failed with a transport error and should not be reused.
+        """
+        if not self.pool:
+            self.conn.close()
+        elif broken:
+            self.pool.discard(self.ip)
+
     def run_command(self, ep_cmd):
         """
         send command to endpoint as list of of strings ex. ['ping', 'google.com']
@@ -145,6 +630,8 @@ class EpCmd(object):
         :return:
         """
         self.logger.debug(f"EP {self.name} command: {ep_cmd}")
-        outp = self.conn.modules.subprocess.check_output(ep_cmd).decode("utf-8")
+        result = rpyc.async_(self.conn.modules.subprocess.check_output)(ep_cmd)
+        result.set_expiry(self.command_timeout)
+        outp = result.value.decode("utf-8")
         self.logger.debug(f"EP {self.name} command: {ep_cmd}, returned with output: {outp}")
         return outp
@@ -0,0 +1,344 @@
+"""
+Local stand-ins for the ByteBlower CLT, wireless endpoints, byteblowerll and CloudShell reservation.
+
+Used by the offline benchmarks, POSIX only - the fake executables are python scripts with shebang and the endpoints RPyC
+servers listen on 127.0.0.x addresses.
+"""
+import stat
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+from rpyc.core.service import SlaveService
+from rpyc.utils.classic import DEFAULT_SERVER_PORT
+from rpyc.utils.server import ThreadedServer
+
+from src.byteblower_handler import BYTEBLOWER_ENDPOINT_MODEL, BYTEBLOWER_PORT_MODEL
+
+FAKE_CLT = """
+import os
+import re
+import sys
+import time
+
+args = dict(zip(sys.argv[1::2], sys.argv[2::2]))
+duration = float({duration!r})
+with open(args["-project"]) as project:
+    flows = re.findall(r'<Flow name="([^"]+)"', project.read())
+print("Loading project " + args["-project"], flush=True)
+print("Starting scenario " + args["-scenario"], flush=True)
+for flow in flows:
+    print(" 0.000s  Action StartTraffic " + flow, flush=True)
+for progress in range(10, 100, 10):
+    time.sleep(duration / 10)
+    print(f"  {{progress}}% done", flush=True)
+time.sleep(duration / 10)
+for flow in flows:
+    print(f" {{duration:.3f}}s Action StopTraffic " + flow, flush=True)
+os.makedirs(args["-output"], exist_ok=True)
+with open(args["-output"] + "/report.csv", "w") as report:
+    report.write("Frame Blasting Flows\\nFlow,Tx Frames,Rx Frames\\n")
+    report.writelines(f"{{flow}},1000,1000\\n" for flow in flows)
+print("Scenario finished", flush=True)
+"""
+
+FAKE_EP_AGENT = """
+import sys
+import time
+
+print("Connecting to meeting point " + sys.argv[1], flush=True)
+print("Status: Registered 0.00 0.00", flush=True)
+while True:
+    time.sleep({interval!r})
+    print("Status: Running 12.34 56.78", flush=True)
+"""
+
+FAKE_NETSH = """
+print("    State                  : connected")
+"""
+
+
+def write_script(path: Path, code: str) -> str:
+    path.write_text(f"#!{sys.executable}\n{code}")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return path.as_posix()
+
+
+def write_executables(bin_dir: Path, clt_duration: float, ep_interval: float = 0.25) -> SimpleNamespace:
+    """Write fake CLT, endpoint agent and netsh, netsh is found through PATH so bin_dir should be added to PATH."""
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    return SimpleNamespace(
+        clt=write_script(bin_dir.joinpath("ByteBlower-CLT"), FAKE_CLT.format(duration=clt_duration)),
+        ep_agent=write_script(bin_dir.joinpath("byteblower-wireless-endpoint"), FAKE_EP_AGENT.format(interval=ep_interval)),
+        netsh=write_script(bin_dir.joinpath("netsh"), FAKE_NETSH),
+    )
+
+
+def write_project(path: Path, ports: List[str], eps: List[str], flows: int, duration: int = 60) -> None:
+    """Write a ByteBlower project with the requested ports and endpoints and flows spread over them."""
+    gui_ports = ports + eps
+    sources: Dict[int, list] = {i: [] for i in range(len(gui_ports))}
+    destinations: Dict[int, list] = {i: [] for i in range(len(gui_ports))}
+    lines = [
+        '<?xml version="1.0" encoding="ASCII"?>',
+        '<byteblowerguimodel_v1_3:ByteBlowerProject xmi:version="2.0" xmlns:xmi="http://www.omg.org/XMI" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        'xmlns:byteblowerguimodel_v1_3="http:///com.excentis.products.byteblower.gui.model.ecore" name="benchmark">',
+        '  <Scenario name="benchmark">',
+    ]
+    for flow in range(flows):
+        lines.append(
+            f'    <measurements xsi:type="byteblowerguimodel_v1_3:FlowMeasurement" flow="//@Flow.{flow}">\n'
+            f'      <flowStartEvent scheduledTime="0"/>\n'
+            f'      <flowStopEvent scheduledTime="{duration * 1000000000}"/>\n'
+            f"    </measurements>"
+        )
+    lines.append("  </Scenario>")
+    for flow in range(flows):
+        source, destination = flow % len(gui_ports), (flow + 1) % len(gui_ports)
+        sources[source].append(f"//@Flow.{flow}")
+        destinations[destination].append(f"//@Flow.{flow}")
+        lines.append(
+            f'  <Flow name="FLOW_{flow + 1}" source="//@ByteBlowerGuiPort.{source}" '
+            f'destination="//@ByteBlowerGuiPort.{destination}" FlowTemplate="//@FlowTemplate.{flow}"/>'
+        )
+    for flow in range(flows):
+        lines.append(
+            f'  <FlowTemplate xsi:type="byteblowerguimodel_v1_3:FrameBlastingFlow" name="FRAME_BLASTING_{flow + 1}" '
+            f'Flow="//@Flow.{flow}" frameInterval="100000">\n'
+            f'    <frameBlastingFrames weight="1" frame="//@Frame.{flow}"/>\n'
+            f"  </FlowTemplate>"
+        )
+    for flow in range(flows):
+        lines.append(f'  <Frame name="FRAME_{flow + 1}" bytesHexString="{"00" * 1500}"/>')
+    for index, name in enumerate(gui_ports):
+        bytes_lists = {
+            "MacAddress": [0, 0, 0, 0, 0, index],
+            "IpAddress": [10, 0, 0, index],
+            "Netmask": [-1, -1, -1, 0],
+            "DefaultGateway": [10, 0, 0, 1],
+        }
+        xml_bytes = {k: "\n".join(f"        <bytes>{b}</bytes>" for b in v) for k, v in bytes_lists.items()}
+        port_id = "-1" if name in eps else "0"
+        lines.append(
+            f'  <ByteBlowerGuiPort name="{name}" theSourceOfFlow="{" ".join(sources[index])}" '
+            f'theDestinationOfFlow="{" ".join(destinations[index])}">\n'
+            f'    <layer2Configuration xsi:type="byteblowerguimodel_v1_3:EthernetConfiguration">\n'
+            f'      <MacAddress>\n{xml_bytes["MacAddress"]}\n      </MacAddress>\n'
+            f"    </layer2Configuration>\n"
+            f'    <ipv4Configuration isActive="true" addressConfiguration="Fixed">\n'
+            f'      <IpAddress>\n{xml_bytes["IpAddress"]}\n      </IpAddress>\n'
+            f'      <Netmask>\n{xml_bytes["Netmask"]}\n      </Netmask>\n'
+            f'      <DefaultGateway>\n{xml_bytes["DefaultGateway"]}\n      </DefaultGateway>\n'
+            f"    </ipv4Configuration>\n"
+            f'    <ByteBlowerGuiPortConfiguration physicalServerAddress="127.0.0.1" physicalInterfaceId="0" '
+            f'physicalPortId="{port_id}"/>\n'
+            f"  </ByteBlowerGuiPort>"
+        )
+    lines.append("</byteblowerguimodel_v1_3:ByteBlowerProject>")
+    path.write_text("\n".join(lines) + "\n")
+
+
+class EndpointServers:
+    """RPyC classic servers impersonating the wireless endpoints, one per 127.0.0.x address."""
+
+    def __init__(self, count: int, first_address: int = 10) -> None:
+        self.ips = [f"127.0.0.{first_address + i}" for i in range(count)]
+        self.servers = []
+        for ip in self.ips:
+            server = ThreadedServer(SlaveService, hostname=ip, port=DEFAULT_SERVER_PORT, reuse_addr=True)
+            threading.Thread(target=server.start, daemon=True).start()
+            self.servers.append(server)
+
+    def close(self) -> None:
+        for server in self.servers:
+            server.close()
+
+
+INTERVAL_DURATION_NS = 1000000000
+
+
+class StubCounters:
+    def __init__(self, byte_count: int, timestamp: int = 0) -> None:
+        self.byte_count = byte_count
+        self.timestamp = timestamp
+
+    def ByteCountGet(self) -> int:  # pylint: disable=invalid-name
+        return self.byte_count
+
+    def TimestampGet(self) -> int:  # pylint: disable=invalid-name
+        return self.timestamp
+
+    def IntervalDurationGet(self) -> int:  # pylint: disable=invalid-name
+        return INTERVAL_DURATION_NS
+
+
+class StubResultHistory:
+    """Stand-in for byteblowerll ResultHistory, each Refresh costs refresh_latency like a server round trip.
+
+    Each Refresh closes one interval of byte_count bytes, the intervals are one second apart from the first refresh.
+    The server clock is clock_skew seconds ahead of the local clock and the refresh timestamp is the newest interval end.
+    """
+
+    def __init__(self, refresh_latency: float, byte_count: int = 125000, clock_skew: float = 0) -> None:
+        self.refresh_latency = refresh_latency
+        self.byte_count = byte_count
+        self.refreshes = 0
+        self.start = time.time_ns() + int(clock_skew * 1e9)
+        self.refresh_timestamp = self.start
+        self.destroyed = False
+        self.intervals: List[StubCounters] = []
+        self.cumulatives: List[StubCounters] = []
+
+    def Refresh(self) -> None:  # pylint: disable=invalid-name
+        time.sleep(self.refresh_latency)
+        self.refreshes += 1
+        timestamp = self.start + self.refreshes * INTERVAL_DURATION_NS
+        self.refresh_timestamp = timestamp
+        self.intervals.append(StubCounters(self.byte_count, timestamp))
+        self.cumulatives.append(StubCounters(self.refreshes * self.byte_count, timestamp))
+
+    def CumulativeLatestGet(self) -> StubCounters:  # pylint: disable=invalid-name
+        return StubCounters(self.refreshes * self.byte_count)
+
+    def IntervalLatestGet(self) -> StubCounters:  # pylint: disable=invalid-name
+        return StubCounters(self.byte_count)
+
+    def RefreshTimestampGet(self) -> int:  # pylint: disable=invalid-name
+        return self.refresh_timestamp
+
+    def IntervalLengthGet(self) -> int:  # pylint: disable=invalid-name
+        return len(self.intervals)
+
+    def IntervalGetByIndex(self, index: int) -> StubCounters:  # pylint: disable=invalid-name
+        return self.intervals[index]
+
+    def CumulativeLengthGet(self) -> int:  # pylint: disable=invalid-name
+        return len(self.cumulatives)
+
+    def CumulativeGetByIndex(self, index: int) -> StubCounters:  # pylint: disable=invalid-name
+        return self.cumulatives[index]
+
+    def Clear(self) -> None:  # pylint: disable=invalid-name
+        self.intervals = []
+        self.cumulatives = []
+
+
+class StubTrigger:
+    def __init__(self, refresh_latency: float) -> None:
+        self.filter = None
+        self.history = StubResultHistory(refresh_latency)
+
+    def FilterSet(self, bpf: str) -> None:  # pylint: disable=invalid-name
+        self.filter = bpf
+
+    def ResultClear(self) -> None:  # pylint: disable=invalid-name
+        self.history.refreshes = 0
+
+    def ResultHistoryGet(self) -> StubResultHistory:  # pylint: disable=invalid-name
+        return self.history
+
+
+class StubPort:
+    def __init__(self, server: "StubServer", interface: str) -> None:
+        self.server = server
+        self.interface = interface
+        self.triggers: List[StubTrigger] = []
+
+    def RxTriggerBasicAdd(self) -> StubTrigger:  # pylint: disable=invalid-name
+        self.triggers.append(StubTrigger(self.server.latency))
+        return self.triggers[-1]
+
+    def RxTriggerBasicRemove(self, trigger: StubTrigger) -> None:  # pylint: disable=invalid-name
+        self.triggers.remove(trigger)
+        trigger.history.destroyed = True
+
+
+class StubServer:
+    def __init__(self, address: str, latency: float) -> None:
+        self.address = address
+        self.latency = latency
+        self.ports: List[StubPort] = []
+
+    def PortCreate(self, interface: str) -> StubPort:  # pylint: disable=invalid-name
+        time.sleep(self.latency)
+        self.ports.append(StubPort(self, interface))
+        return self.ports[-1]
+
+    def PortDestroy(self, port: StubPort) -> None:  # pylint: disable=invalid-name
+        self.ports.remove(port)
+
+
+class StubByteBlower:
+    """Stand-in for byteblowerll.byteblower.ByteBlower singleton, server calls take latency seconds."""
+
+    latency = 0.001
+    servers: List[StubServer] = []
+
+    @classmethod
+    def InstanceGet(cls) -> "StubByteBlower":  # pylint: disable=invalid-name
+        return cls()
+
+    def ServerAdd(self, address: str) -> StubServer:  # pylint: disable=invalid-name
+        time.sleep(self.latency)
+        self.servers.append(StubServer(address, self.latency))
+        return self.servers[-1]
+
+    def ServerRemove(self, server: StubServer) -> None:  # pylint: disable=invalid-name
+        self.servers.remove(server)
+
+
+stub_byteblowerll = SimpleNamespace(ByteBlower=StubByteBlower)
+
+
+class FakeReservation:
+    """Fake CloudShell reservation with ByteBlower ports and endpoints, counts the API calls."""
+
+    def __init__(self, ports: List[str], eps: List[str], eps_ips: List[str]) -> None:
+        self.resources = []
+        self.attributes = {}
+        self.api_calls = 0
+        self.reservation_id = "reservation-1"
+        for index, logical_name in enumerate(ports):
+            name = f"ByteBlower/Module1/Port-{index + 1}"
+            self.resources.append(SimpleNamespace(Name=name, ResourceModelName=BYTEBLOWER_PORT_MODEL))
+            self.attributes[name] = {
+                "Logical Name": logical_name,
+                "Mac Address": f"00:ff:0a:00:00:{index + 1:02x}",
+                "Address": f"10.0.0.{index + 1}",
+                "Gateway": "10.0.0.254",
+                "Netmask": "255.255.255.0",
+            }
+        for index, (logical_name, ip) in enumerate(zip(eps, eps_ips)):
+            name = f"ByteBlower/EP-{index + 1}"
+            self.resources.append(SimpleNamespace(Name=name, ResourceModelName=BYTEBLOWER_ENDPOINT_MODEL))
+            self.attributes[name] = {"Logical Name": logical_name, "Identifier": f"ep-{index + 1}", "Address": ip}
+
+    def get_resources_from_reservation(self, _, *resource_models: str) -> list:
+        self.api_calls += 1
+        return [r for r in self.resources if r.ResourceModelName in resource_models]
+
+    def get_family_attribute(self, _, resource_name: str, attribute: str) -> str:
+        self.api_calls += 1
+        return self.attributes[resource_name][attribute]
+
+    def get_resource_attributes(self, _, resource_name: str) -> dict:
+        self.api_calls += 1
+        return dict(self.attributes[resource_name])
+
+    def get_reservation_id(self, _) -> str:
+        return self.reservation_id
+
+
+def fake_context(executables: SimpleNamespace) -> SimpleNamespace:
+    """Fake ResourceCommandContext of the controller service."""
+    attributes = {
+        "ByteBlower Controller Shell 2G.Address": "127.0.0.1",
+        "ByteBlower Controller Shell 2G.Meeting Point": "127.0.0.1",
+        "ByteBlower Controller Shell 2G.Client Install Path": executables.clt,
+        "ByteBlower Controller Shell 2G.Endpoint Install Path": executables.ep_agent,
+    }
+    return SimpleNamespace(resource=SimpleNamespace(name="ByteBlower Controller", attributes=attributes))
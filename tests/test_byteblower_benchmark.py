@@ -0,0 +1,135 @@
+"""
+Offline benchmarks of the driver commands with local stand-ins for CloudShell, ByteBlower server, CLT and endpoints.
+
+Sweep ports, endpoints and flows counts with BYTEBLOWER_BENCHMARK_SWEEP="ports:eps:flows,..." and keep the results with
+BYTEBLOWER_BENCHMARK_OUTPUT=<json file> to compare versions.
+"""
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from src import byteblower_handler
+from src.byteblower_handler import ByteBlowerHandler
+from tests.byteblower_stand_ins import (
+    EndpointServers,
+    FakeReservation,
+    StubByteBlower,
+    fake_context,
+    stub_byteblowerll,
+    write_executables,
+    write_project,
+)
+
+DEFAULT_SWEEP = "2:0:8,4:2:32,8:4:128"
+RT_STATISTICS_CALLS = 20
+CLT_DURATION = 1.0
+# the handler imports its sibling modules as top level modules, patch the module it uses.
+byteblower_reservation = sys.modules[byteblower_handler.ReservationAttributes.__module__]
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="stand-ins are POSIX scripts and 127.0.0.x servers")
+
+sweep = [tuple(int(n) for n in c.split(":")) for c in os.environ.get("BYTEBLOWER_BENCHMARK_SWEEP", DEFAULT_SWEEP).split(",")]
+results = []
+
+
+def _driver_version() -> str:
+    driver_metadata = Path(__file__).parent.parent.joinpath("src", "drivermetadata.xml")
+    return ET.parse(driver_metadata).getroot().attrib["Version"]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def results_file(tmp_path_factory: pytest.TempPathFactory) -> None:
+    yield
+    output = os.environ.get("BYTEBLOWER_BENCHMARK_OUTPUT") or tmp_path_factory.mktemp("benchmark").joinpath("results.json")
+    report = {
+        "version": _driver_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    Path(output).write_text(json.dumps(report, indent=2))
+    print(f"\nbenchmark results saved to {output}\n{json.dumps(results, indent=2)}")
+
+
+def _timed(timings: Dict[str, float], phase: str, func, *args) -> object:
+    start = time.perf_counter()
+    result = func(*args)
+    timings[phase] = round(time.perf_counter() - start, 4)
+    return result
+
+
+@pytest.mark.parametrize("ports,eps,flows", sweep)
+def test_benchmark(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, ports: int, eps: int, flows: int) -> None:
+    ports_names = [f"PORT_{i + 1}" for i in range(ports)]
+    eps_names = [f"EP{i + 1:02}" for i in range(eps)]
+    executables = write_executables(tmp_path.joinpath("bin"), CLT_DURATION)
+    project = tmp_path.joinpath("benchmark.bbp")
+    write_project(project, ports_names, eps_names, flows)
+    servers = EndpointServers(eps)
+    reservation = FakeReservation(ports_names, eps_names, servers.ips)
+
+    monkeypatch.setenv("PATH", f"{tmp_path.joinpath('bin')}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(byteblower_handler, "PROJECTS_DIR", tmp_path.joinpath("projects").as_posix())
+    monkeypatch.setattr(byteblower_handler, "byteblower", stub_byteblowerll)
+    monkeypatch.setattr(byteblower_reservation, "get_resources_from_reservation", reservation.get_resources_from_reservation)
+    monkeypatch.setattr(byteblower_reservation, "get_resource_attributes", reservation.get_resource_attributes)
+    monkeypatch.setattr(byteblower_reservation, "get_reservation_id", reservation.get_reservation_id)
+
+    logger = logging.getLogger(f"benchmark-{ports}-{eps}-{flows}")
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.FileHandler(tmp_path.joinpath("driver.log")))
+    context = fake_context(executables)
+    handler = ByteBlowerHandler()
+    handler.initialize(context, logger)
+
+    timings = {}
+    api_calls = {}
+    try:
+        for phase, func, args in (
+            ("load_config", handler.load_config, (context, project.as_posix(), "benchmark")),
+            ("reload_config", handler.load_config, (context, project.as_posix(), "benchmark")),
+            ("start_traffic", handler.start_traffic, (context, "False")),
+        ):
+            calls = reservation.api_calls
+            _timed(timings, phase, func, *args)
+            api_calls[phase] = reservation.api_calls - calls
+        start = time.perf_counter()
+        for _ in range(RT_STATISTICS_CALLS):
+            rt_stats = handler.get_rt_statistics()
+        timings["get_rt_statistics"] = round((time.perf_counter() - start) / RT_STATISTICS_CALLS, 4)
+        delta = handler.get_rt_statistics_delta()
+        start = time.perf_counter()
+        for _ in range(RT_STATISTICS_CALLS):
+            delta = handler.get_rt_statistics_delta(delta["cursor"])
+        timings["get_rt_statistics_delta"] = round((time.perf_counter() - start) / RT_STATISTICS_CALLS, 4)
+        # payload sizes of a single poll as returned to CloudShell.
+        payload = {"rt_statistics": len(str(rt_stats)), "rt_statistics_delta": len(json.dumps(delta, separators=(",", ":")))}
+        _timed(timings, "stop_traffic", handler.stop_traffic)
+        session_counters = dict(handler.bb_session.counters)
+    finally:
+        handler.cleanup()
+        servers.close()
+    assert not StubByteBlower.servers
+
+    assert set(ports_names + eps_names).issubset(rt_stats)
+    assert session_counters["ports_reused"] == ports
+    results.append(
+        {
+            "ports": ports,
+            "eps": eps,
+            "flows": flows,
+            "timings": timings,
+            "api_calls": api_calls,
+            "session": session_counters,
+            "payload": payload,
+        }
+    )
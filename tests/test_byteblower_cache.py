@@ -0,0 +1,63 @@
+"""
+Tests for ByteBlower projects cache.
+"""
+import logging
+import shutil
+from pathlib import Path
+
+from src.byteblower_cache import ProjectCache
+
+config_file = Path(__file__).parent.joinpath("test_config.bbp")
+
+logger = logging.getLogger("test_byteblower_cache")
+
+
+def _add(cache: ProjectCache, attributes: dict) -> str:
+    key = ProjectCache.key(config_file.as_posix(), attributes)
+    shutil.copyfile(config_file, cache.project_file(key))
+    cache.put(key, {"intended_tx": {"WAN_PORT": 10}, "attributes": attributes})
+    return key
+
+
+def test_key() -> None:
+    attributes = {"ports": {"WAN_PORT": {"Address": "10.0.0.1", "Netmask": "255.0.0.0"}}}
+    reordered = {"ports": {"WAN_PORT": {"Netmask": "255.0.0.0", "Address": "10.0.0.1"}}}
+    changed = {"ports": {"WAN_PORT": {"Address": "10.0.0.2", "Netmask": "255.0.0.0"}}}
+    key = ProjectCache.key(config_file.as_posix(), attributes)
+    assert key == ProjectCache.key(config_file.as_posix(), reordered)
+    assert key != ProjectCache.key(config_file.as_posix(), changed)
+    assert key != ProjectCache.key(Path(__file__).parent.joinpath("yoram_magic_1port.bbp").as_posix(), attributes)
+
+
+def test_get_put(tmp_path: Path) -> None:
+    cache = ProjectCache(logger, tmp_path.as_posix())
+    key = ProjectCache.key(config_file.as_posix(), {})
+    assert cache.get(key) is None
+    _add(cache, {})
+    project, metadata = cache.get(key)
+    assert Path(project).read_bytes() == config_file.read_bytes()
+    assert metadata["intended_tx"] == {"WAN_PORT": 10}
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.clear()
+    assert not list(tmp_path.iterdir())
+    assert cache.get(key) is None
+
+
+def test_lru_eviction(tmp_path: Path) -> None:
+    cache = ProjectCache(logger, tmp_path.as_posix(), max_entries=2)
+    first = _add(cache, {"run": 1})
+    second = _add(cache, {"run": 2})
+    assert cache.get(first)
+    third = _add(cache, {"run": 3})
+    assert cache.get(second) is None
+    assert cache.get(first)
+    assert cache.get(third)
+    assert len(list(Path(cache.cache_dir).iterdir())) == 4
+
+
+def test_size_eviction(tmp_path: Path) -> None:
+    cache = ProjectCache(logger, tmp_path.as_posix(), max_size=config_file.stat().st_size)
+    first = _add(cache, {"run": 1})
+    second = _add(cache, {"run": 2})
+    assert cache.get(first) is None
+    assert cache.get(second)
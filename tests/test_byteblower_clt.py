@@ -0,0 +1,97 @@
+"""
+Tests for the ByteBlower CLT output parser.
+"""
+import logging
+import stat
+import sys
+import threading
+from pathlib import Path
+
+from src.byteblower_clt import (
+    FAILURE,
+    FLOW_START,
+    FLOW_STOP,
+    PROGRESS,
+    SCENARIO_START,
+    WARNING,
+    CltEvent,
+    CltOutputParser,
+    CltState,
+)
+from src.byteblower_threads import CltRun, ServerThread
+
+CLT_OUTPUT = """Loading project 'test_config.bbp'
+Starting scenario 'Scenario1'
+ 0.000s  Action StartTraffic FLOW_1
+ 0.000s  Action StartTraffic FLOW_12
+   50.0% done
+Warning: port PORT_A link speed is 100 Mbps
+ 10.000s Action StopTraffic FLOW_12
+ 10.000s Action StopTraffic FLOW_1
+Scenario finished
+"""
+
+logger = logging.getLogger("test_byteblower_clt")
+
+
+def _parse(chunks: list, flows: list = None) -> list:
+    events = []
+    parser = CltOutputParser(events.append, flows)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return events
+
+
+def test_parse_lines() -> None:
+    events = _parse([CLT_OUTPUT], ["FLOW_1", "FLOW_12"])
+    assert [e.type for e in events] == [SCENARIO_START, FLOW_START, FLOW_START, PROGRESS, WARNING, FLOW_STOP, FLOW_STOP]
+    assert [e.flow for e in events if e.type in (FLOW_START, FLOW_STOP)] == ["FLOW_1", "FLOW_12", "FLOW_12", "FLOW_1"]
+    assert events[3].progress == 50.0
+
+
+def test_parse_partial_chunks() -> None:
+    output = (CLT_OUTPUT + "!MESSAGE Failed to resolve ✓ address").encode("utf-8")
+    expected = [(e.type, e.line) for e in _parse([output])]
+    assert expected[-1] == (FAILURE, "!MESSAGE Failed to resolve ✓ address")
+    # split everywhere, including inside lines and inside multi byte characters.
+    for size in (1, 3, 7):
+        chunks = [output[i : i + size] for i in range(0, len(output), size)]
+        assert [(e.type, e.line) for e in _parse(chunks)] == expected
+
+
+def test_state() -> None:
+    state_changed = threading.Event()
+    state = CltState(logger, state_changed, max_events=4)
+    parser = CltOutputParser(state.on_event)
+    parser.feed(CLT_OUTPUT.split("PORT_A")[0])
+    assert state.traffic_started.isSet()
+    assert state.traffic_running
+    assert state_changed.isSet()
+    assert state.progress == 50.0
+    parser.feed(CLT_OUTPUT.split("PORT_A")[1])
+    assert not state.traffic_running
+    assert not state.failed
+    events = state.get_events()
+    assert len(events) == 4
+    assert state.dropped == 3
+    assert state.get_events() == []
+    state.on_event(CltEvent(FAILURE, "Action failed"))
+    assert state.failed == "Action failed"
+
+
+def test_server_thread(tmp_path: Path) -> None:
+    clt = tmp_path.joinpath("clt.py")
+    clt.write_text(f"#!{sys.executable}\nfor line in {CLT_OUTPUT.splitlines()!r}:\n    print(line, flush=True)\n")
+    clt.chmod(clt.stat().st_mode | stat.S_IEXEC)
+    server_logger = logging.getLogger("test_byteblower_clt.server")
+    server_logger.addHandler(logging.FileHandler(tmp_path.joinpath("server.log")))
+    state_changed = threading.Event()
+    clt_run = CltRun("project", "scenario", "output", ["FLOW_1", "FLOW_12"])
+    server_thread = ServerThread(server_logger, clt.as_posix(), clt_run, state_changed)
+    server_thread.start()
+    server_thread.join(10)
+    assert server_thread.traffic_started
+    assert not server_thread.traffic_running
+    assert not server_thread.failed
+    assert [e.flow for e in server_thread.get_events() if e.type == FLOW_START] == ["FLOW_1", "FLOW_12"]
@@ -0,0 +1,702 @@
+"""
+Tests for ByteBlowerHandler with local stand-ins for endpoints and CloudShell.
+"""
+import json
+import logging
+import stat
+import subprocess
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from src import byteblower_handler
+from src.byteblower_cache import ProjectCache
+from src.byteblower_driver import ByteBlowerControllerShell2GDriver
+from src.byteblower_engine import ENGINE_MAX_WORKERS
+from src.byteblower_handler import ByteBlowerHandler
+from src.byteblower_project import RateProfile
+from src.byteblower_report import CltReport
+from src.byteblower_series import SeriesStore
+from src.byteblower_threads import CltRun, EpAgent, EpThread, SamplingOptions, ServerThread
+from tests.byteblower_stand_ins import FakeReservation, StubByteBlower, StubResultHistory, stub_byteblowerll, write_project
+
+EP_LATENCY = 0.2
+# the handler imports its sibling modules as top level modules, patch the module it uses.
+byteblower_reservation = sys.modules[byteblower_handler.ReservationAttributes.__module__]
+
+
+class FakePopen:
+    """Stand-in for the remote byteblower-wireless-endpoint.exe Popen."""
+
+    def __init__(self) -> None:
+        self.terminated = threading.Event()
+        self.stdout = self
+
+    def readline(self) -> bytes:
+        if self.terminated.wait(0.05):
+            return b""
+        return b"Status: Registered 0.00 0.00\n"
+
+    def poll(self) -> int:
+        return 0 if self.terminated.is_set() else None
+
+    def terminate(self) -> None:
+        self.terminated.set()
+
+    def kill(self) -> None:
+        self.terminated.set()
+
+
+class FakeEpConnection:
+    """Stand-in for an RPyC classic connection, Popen takes EP_LATENCY like a remote spawn, code executes locally."""
+
+    def __init__(self, fail: bool = False, fail_reader: bool = False) -> None:
+        self.fail = fail
+        self.fail_reader = fail_reader
+        self.popens = []
+        self.modules = SimpleNamespace(subprocess=SimpleNamespace(Popen=self.popen))
+        self.namespace = {}
+
+    def execute(self, code: str) -> None:
+        if self.fail_reader:
+            raise EOFError("connection closed by peer")
+        exec(code, self.namespace)
+
+    def popen(self, *_, **__) -> FakePopen:
+        time.sleep(EP_LATENCY)
+        if self.fail:
+            raise OSError("agent not found")
+        self.popens.append(FakePopen())
+        return self.popens[-1]
+
+
+class FakeEpPool:
+    def __init__(self, failed_ips: tuple = ()) -> None:
+        self.connections = {}
+        self.failed_ips = failed_ips
+        self.released = []
+        self.discarded = []
+
+    def get(self, ip: str, hold: bool = False) -> FakeEpConnection:
+        return self.connections.setdefault(ip, FakeEpConnection(ip in self.failed_ips))
+
+    def release(self, ip: str) -> None:
+        self.released.append(ip)
+
+    def discard(self, ip: str) -> bool:
+        self.discarded.append(ip)
+        return True
+
+
+@pytest.fixture()
+def handler(monkeypatch: pytest.MonkeyPatch) -> ByteBlowerHandler:
+    monkeypatch.setattr(
+        byteblower_reservation, "get_resource_attributes", lambda _, n: {"Address": f"10.0.0.{n.split('-')[-1]}"}
+    )
+    monkeypatch.setattr(byteblower_reservation, "get_reservation_id", lambda _: "reservation-1")
+    monkeypatch.setattr(byteblower_handler, "reap_orphan_clts", lambda logger: [])
+    handler = ByteBlowerHandler()
+    handler.logger = logging.getLogger("test_byteblower_handler")
+    handler.service = SimpleNamespace(meeting_point="10.0.0.254", endpoint_install_path="byteblower-wireless-endpoint.exe")
+    yield handler
+    handler.stop_traffic()
+
+
+def _reserve_eps(handler: ByteBlowerHandler, eps: int) -> None:
+    reservation_eps = {f"EP{i:02}": SimpleNamespace(Name=f"BB1/EP-{i}") for i in range(1, eps + 1)}
+    handler.run_context = handler.run_context._replace(reservation_eps=reservation_eps)
+
+
+def _start_eps(handler: ByteBlowerHandler, state_changed: threading.Event) -> dict:
+    eps_threads = handler._start_eps_threads(None, handler.run_context.reservation_eps, state_changed)
+    handler.run_context = handler.run_context._replace(eps_threads=eps_threads)
+    return eps_threads
+
+
+def test_start_eps_threads_time_is_flat(handler: ByteBlowerHandler) -> None:
+    durations = {}
+    for eps in [2, 16]:
+        handler.eps_pool = FakeEpPool()
+        _reserve_eps(handler, eps)
+        start = time.perf_counter()
+        eps_threads = _start_eps(handler, threading.Event())
+        durations[eps] = time.perf_counter() - start
+        assert len(eps_threads) == eps
+        assert all(t.popen for t in eps_threads.values())
+        handler.stop_traffic()
+    print(f"start endpoints durations {durations}")
+    assert durations[16] < 2 * durations[2]
+    assert durations[16] < 16 * EP_LATENCY / 4
+
+
+def test_start_eps_threads_rollback(handler: ByteBlowerHandler) -> None:
+    handler.eps_pool = FakeEpPool(failed_ips=("10.0.0.3",))
+    _reserve_eps(handler, 8)
+    with pytest.raises(Exception, match="EP03, IP 10.0.0.3 - agent not found"):
+        _start_eps(handler, threading.Event())
+    assert handler.run_context.eps_threads == {}
+    popens = [p for c in handler.eps_pool.connections.values() for p in c.popens]
+    assert len(popens) == 7
+    assert all(p.terminated.is_set() for p in popens)
+
+
+def test_ep_thread_reader_failure(handler: ByteBlowerHandler) -> None:
+    pool = FakeEpPool()
+    connection = pool.connections["10.0.0.1"] = FakeEpConnection(fail_reader=True)
+    ep_thread = EpThread(handler.logger, EpAgent("EP01", "10.0.0.1", "10.0.0.254", "agent.exe"), pool=pool)
+    with pytest.raises(EOFError):
+        ep_thread.launch()
+    # the agent is not left running on the endpoint.
+    assert len(connection.popens) == 1
+    assert connection.popens[0].terminated.is_set()
+    assert ep_thread.popen is None
+    assert pool.released == ["10.0.0.1"]
+
+
+def test_stop_traffic_lost_endpoint(handler: ByteBlowerHandler, tmp_path: Path) -> None:
+    handler.eps_pool = FakeEpPool()
+    _reserve_eps(handler, 3)
+    eps_threads = _start_eps(handler, threading.Event())
+    _start_server_thread(handler, tmp_path, _clt(tmp_path, ["Action StartTraffic FLOW_1"], exit_delay=30))
+    lost_popen = handler.eps_pool.connections["10.0.0.2"].popens[0]
+
+    def terminate() -> None:
+        raise EOFError("connection closed by peer")
+
+    lost_popen.terminate = terminate
+    handler.stop_traffic()
+    # the other endpoints and the CLT are stopped, the dead connection is dropped from the pool.
+    assert handler.eps_pool.connections["10.0.0.1"].popens[0].terminated.is_set()
+    assert handler.eps_pool.connections["10.0.0.3"].popens[0].terminated.is_set()
+    server_thread = handler.run_context.server_thread
+    server_thread.join(5)
+    assert not server_thread.is_alive()
+    assert handler.eps_pool.discarded == ["10.0.0.2"]
+    assert sorted(handler.eps_pool.released) == ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    lost_popen.terminated.set()
+    assert all(not t.failed for t in eps_threads.values())
+
+
+def test_eps_share_engine_threads(handler: ByteBlowerHandler) -> None:
+    handler.eps_pool = FakeEpPool()
+    threads_count = {}
+    for eps in [4, 64]:
+        _reserve_eps(handler, eps)
+        eps_threads = _start_eps(handler, threading.Event())
+        assert all(t.registered.wait(5) for t in eps_threads.values())
+        # the agents readers run on the endpoints, here they run locally.
+        threads_count[eps] = len([t for t in threading.enumerate() if t.name != "EpStatusReader"])
+        handler.stop_traffic()
+    print(f"threads count {threads_count}")
+    assert threads_count[64] - threads_count[4] <= ENGINE_MAX_WORKERS
+
+
+class FakeEpCmd:
+    """Stand-in for EpCmd, the behaviour of each endpoint is selected by the last byte of its IP."""
+
+    behaviours = {}
+    closed = []
+
+    def __init__(self, logger, ip, name, connect_timeout, command_timeout, pool=None) -> None:
+        self.ip = ip
+        self.behaviour = self.behaviours.get(ip, "connected")
+        if self.behaviour == "connect_failed":
+            raise ConnectionRefusedError("connection refused")
+
+    def run_command(self, _: list) -> str:
+        if self.behaviour == "hang":
+            time.sleep(2)
+        if self.behaviour == "command_failed":
+            raise EOFError("connection closed by peer")
+        if self.behaviour == "remote_failed":
+            error = subprocess.CalledProcessError(1, "findstr")
+            error._remote_tb = "Traceback (most recent call last): ..."
+            raise error
+        return "    State                  : disconnected" if self.behaviour == "disconnected" else "    State : connected"
+
+    def close(self, broken: bool = False) -> None:
+        self.closed.append((self.ip, broken))
+
+
+def test_endpoints_wifi_status(handler: ByteBlowerHandler, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(byteblower_handler, "EpCmd", FakeEpCmd)
+    FakeEpCmd.behaviours = {
+        "10.0.0.2": "hang",
+        "10.0.0.3": "connect_failed",
+        "10.0.0.4": "command_failed",
+        "10.0.0.6": "remote_failed",
+    }
+    FakeEpCmd.closed = []
+    _reserve_eps(handler, 16)
+    start = time.perf_counter()
+    eps_status = handler.get_endpoints_wifi_status(None, deadline=0.5)
+    # endpoints are checked concurrently and the hanging endpoint does not delay the result beyond the deadline.
+    assert time.perf_counter() - start < 1
+    assert set(eps_status) == {f"EP{i:02}" for i in range(1, 17)}
+    assert all(set(status) == {"ip", "state", "latency", "error"} for status in eps_status.values())
+    assert eps_status["EP01"] == {
+        "ip": "10.0.0.1",
+        "state": "connected",
+        "latency": eps_status["EP01"]["latency"],
+        "error": None,
+    }
+    assert eps_status["EP02"]["state"] == "timeout"
+    assert eps_status["EP02"]["latency"] == 0.5
+    assert "EP02 did not answer within 0.5 seconds" in eps_status["EP02"]["error"]
+    assert eps_status["EP03"]["state"] == "connect_failed"
+    assert "connection refused" in eps_status["EP03"]["error"]
+    assert eps_status["EP04"]["state"] == "command_failed"
+    # only transport errors discard the pooled connection, a command that failed on the endpoint keeps it.
+    assert ("10.0.0.4", True) in FakeEpCmd.closed
+    assert eps_status["EP06"]["state"] == "command_failed"
+    assert ("10.0.0.6", False) in FakeEpCmd.closed
+    assert all(eps_status[f"EP{i:02}"]["state"] == "connected" for i in [5] + list(range(7, 17)))
+
+    FakeEpCmd.behaviours = {"10.0.0.5": "disconnected"}
+    with pytest.raises(Exception, match=r"disconnected from wifi: \[\('EP05', '10.0.0.5'\)\]"):
+        handler._validate_endpoint_wifi(None)
+    FakeEpCmd.behaviours = {"10.0.0.3": "connect_failed", "10.0.0.5": "disconnected"}
+    with pytest.raises(Exception, match="EP03 could not establish RPyC command connection"):
+        handler._validate_endpoint_wifi(None)
+    FakeEpCmd.behaviours = {}
+    assert handler._validate_endpoint_wifi(None) == "All Endpoints Connected to Wifi"
+
+
+def test_ep_thread_batches_samples(handler: ByteBlowerHandler) -> None:
+    handler.eps_pool = FakeEpPool()
+    _reserve_eps(handler, 1)
+    state_changed = threading.Event()
+    ep_thread = _start_eps(handler, state_changed)["EP01"]
+    ep_thread.interval = 0.5
+    assert ep_thread.registered.wait(1)
+    time.sleep(1.2)
+    samples = len(ep_thread.counters)
+    assert samples >= 10
+    assert handler.get_rt_statistics(2)["EP01"] == [["Registered", "0.00", "0.00"]] * 2
+    start = time.perf_counter()
+    handler.stop_traffic()
+    ep_thread.join(2)
+    assert not ep_thread.is_alive()
+    assert time.perf_counter() - start < 1
+    assert not ep_thread.failed
+
+
+def test_ep_thread_agent_exit(handler: ByteBlowerHandler) -> None:
+    handler.eps_pool = FakeEpPool()
+    _reserve_eps(handler, 1)
+    state_changed = threading.Event()
+    ep_thread = _start_eps(handler, state_changed)["EP01"]
+    handler.eps_pool.connections["10.0.0.1"].popens[0].terminate()
+    ep_thread.join(2)
+    assert ep_thread.failed == "agent exited with code 0"
+
+
+class FakeResultHistory(StubResultHistory):
+    """Stand-in for byteblowerll ResultHistory, Refresh takes a server round trip and closes an 8 Mb interval."""
+
+    def __init__(self) -> None:
+        super().__init__(0.001, 1000000)
+
+
+def test_stats_sampler(handler: ByteBlowerHandler) -> None:
+    bb_ports = {f"PORT_{i}": FakeResultHistory() for i in range(64)}
+    intended_tx = {name: 100 for name in bb_ports}
+    handler.run_context = handler.run_context._replace(bb_ports=bb_ports, intended_tx=intended_tx)
+    rt_stats = handler.get_rt_statistics()
+    assert rt_stats["PORT_0"] == ["8.00", "8.00", 100, None]
+
+    stats_sampler = byteblower_handler.StatsSampler(handler.logger, bb_ports, {}, intended_tx, SamplingOptions(interval=0.1))
+    handler.run_context = handler.run_context._replace(stats_sampler=stats_sampler)
+    stats_sampler.start()
+    time.sleep(0.3)
+    start = time.perf_counter()
+    for _ in range(100):
+        rt_stats = handler.get_rt_statistics()
+    assert time.perf_counter() - start < 64 * 0.001
+    assert float(rt_stats["PORT_0"][0]) >= 16
+    assert time.time() - rt_stats["_meta"]["timestamp"] < 1
+    assert set(rt_stats) == set(bb_ports) | {"_meta"}
+    handler.stop_traffic()
+
+
+def test_rt_statistics_delta(handler: ByteBlowerHandler, tmp_path: Path) -> None:
+    assert handler.get_rt_statistics_delta() == {"cursor": "", "reset": False, "series": {}}
+    bb_ports = {f"PORT_{i}": FakeResultHistory() for i in range(4)}
+    series_store = SeriesStore(handler.logger, tmp_path.as_posix())
+    stats_sampler = byteblower_handler.StatsSampler(
+        handler.logger, bb_ports, {}, {}, SamplingOptions(interval=0.1, store=series_store)
+    )
+    handler.run_context = handler.run_context._replace(stats_sampler=stats_sampler, series_store=series_store)
+    stats_sampler.start()
+    time.sleep(0.35)
+    delta = handler.get_rt_statistics_delta()
+    samples = len(delta["series"]["PORT_0"]["samples"])
+    assert samples >= 2
+    time.sleep(0.25)
+    delta = handler.get_rt_statistics_delta(delta["cursor"], names=["PORT_0"])
+    assert list(delta["series"]) == ["PORT_0"]
+    # only the samples since the previous call, no sample is returned twice.
+    assert delta["series"]["PORT_0"]["samples"][0][1] == (samples + 1) * 8
+    handler.stop_traffic()
+    series_store.close()
+
+
+def test_stats_sampler_harvests_history(handler: ByteBlowerHandler, tmp_path: Path) -> None:
+    history = FakeResultHistory()
+    series_store = SeriesStore(handler.logger, tmp_path.as_posix())
+    stats_sampler = byteblower_handler.StatsSampler(
+        handler.logger, {"PORT_A": history}, {}, {}, SamplingOptions(store=series_store)
+    )
+    handler.run_context = handler.run_context._replace(stats_sampler=stats_sampler, series_store=series_store)
+    stats_sampler.sample()
+    # the server closed 3 more intervals between two samples.
+    for _ in range(3):
+        history.Refresh()
+    stats_sampler.sample()
+    samples = handler.get_rt_statistics_delta()["series"]["PORT_A"]["samples"]
+    assert [sample[1:] for sample in samples] == [[8.0 * i, 8.0] for i in range(1, 6)]
+    assert "lost_intervals" not in handler.get_rt_statistics()["_meta"]
+
+    for _ in range(3):
+        history.Refresh()
+    del history.intervals[-3:-1]
+    assert handler.get_rt_statistics()["_meta"]["lost_intervals"] == {"PORT_A": 2}
+    series_store.close()
+
+
+def test_stats_sampler_profiles(handler: ByteBlowerHandler) -> None:
+    bb_ports = {"PORT_A": FakeResultHistory()}
+    tx_profiles = {"PORT_A": RateProfile([0.0, 10.0, 20.0], [30.0, 50.0, 0.0])}
+    rx_profiles = {"PORT_A": RateProfile([5.0], [15.0])}
+    sampler = byteblower_handler.StatsSampler(
+        handler.logger,
+        bb_ports,
+        {},
+        {"PORT_A": 80},
+        SamplingOptions(profiles=(tx_profiles, rx_profiles), start_time=time.time() - 12),
+    )
+    assert sampler.sample().ports["PORT_A"][2:] == (50.0, 15.0)
+    sampler.start_time = time.time() - 25
+    assert sampler.sample().ports["PORT_A"][2:] == (0.0, 15.0)
+
+
+def _clt(tmp_path: Path, lines: list, exit_delay: float = 0.2, exit_code: int = 0) -> str:
+    """Fake CLT script that prints lines with a short pause between them."""
+    clt = tmp_path.joinpath("clt.py")
+    clt.write_text(
+        f"#!{sys.executable}\nimport time\nfor line in {lines!r}:\n    print(line, flush=True)\n    time.sleep(0.1)\n"
+        f"time.sleep({exit_delay})\nraise SystemExit({exit_code})\n"
+    )
+    clt.chmod(clt.stat().st_mode | stat.S_IEXEC)
+    return clt.as_posix()
+
+
+def _start_server_thread(handler: ByteBlowerHandler, tmp_path: Path, clt: str) -> None:
+    server_logger = logging.getLogger("test_byteblower_handler.server")
+    if not server_logger.handlers:
+        server_logger.addHandler(logging.FileHandler(tmp_path.joinpath("server.log")))
+    server_thread = ServerThread(server_logger, clt, CltRun("project", "scenario", "output", expected_flows=2))
+    handler.run_context = handler.run_context._replace(
+        scenario="scenario", scenarios={"scenario": {"duration": 1, "flows": 2}}, server_thread=server_thread
+    )
+    server_thread.start()
+
+
+def test_get_statistics(handler: ByteBlowerHandler, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    with pytest.raises(Exception, match="No statistics - traffic was not started"):
+        handler.get_statistics(None, "port", None)
+    with pytest.raises(Exception, match="Invalid output type xml"):
+        handler.get_statistics(None, "port", "XML")
+    report = {
+        "ports": [{"port": "PORT_A", "tx": {"frames": 10}}],
+        "wirelessEndpoints": [{"name": "EP01", "rx": {"frames": 5}}],
+    }
+    tmp_path.joinpath("report.json").write_text(json.dumps(report))
+    handler.run_context = handler.run_context._replace(clt_report=CltReport(handler.logger, tmp_path.as_posix()))
+
+    # JSON output is returned as JSON string, not as python dict repr.
+    output = handler.get_statistics(None, "Endpoint", " JSON ")
+    assert isinstance(output, str)
+    assert json.loads(output) == {"wirelessEndpoints": [{"name": "EP01", "rx.frames": 5}]}
+
+    attached = []
+    monkeypatch.setattr(byteblower_handler, "attach_stats_csv", lambda _, __, view, stats: attached.append((view, stats)))
+    output = handler.get_statistics(None, None, None)
+    assert output == "Section,port,tx.frames\nports,PORT_A,10\n"
+    assert attached == [("port", output)]
+
+
+def test_wait_for_traffic_end(handler: ByteBlowerHandler, tmp_path: Path) -> None:
+    lines = ["Action StartTraffic FLOW_1", "Action StartTraffic FLOW_2", "50%", "Action StopTraffic FLOW_1"]
+    _start_server_thread(handler, tmp_path, _clt(tmp_path, lines + ["Action StopTraffic FLOW_2"]))
+    start = time.perf_counter()
+    assert handler._wait_for_traffic_end(progress_interval=0.1) == "Finished"
+    assert time.perf_counter() - start < 2
+    assert handler.clt_progress == 50.0
+
+
+def test_wait_for_traffic_end_failure(handler: ByteBlowerHandler, tmp_path: Path) -> None:
+    lines = ["Action StartTraffic FLOW_1", "Action failed: port PORT_A link down"]
+    _start_server_thread(handler, tmp_path, _clt(tmp_path, lines, exit_delay=30))
+    with pytest.raises(Exception, match="Traffic failed - Action failed: port PORT_A link down"):
+        handler._wait_for_traffic_end(progress_interval=0.1)
+
+
+@pytest.mark.parametrize("exit_code", [0, 3])
+def test_clt_exits_mid_flow(handler: ByteBlowerHandler, tmp_path: Path, exit_code: int) -> None:
+    lines = ["Action StartTraffic FLOW_1", "Action StartTraffic FLOW_2", "Action StopTraffic FLOW_1"]
+    _start_server_thread(handler, tmp_path, _clt(tmp_path, lines, exit_code=exit_code))
+    with pytest.raises(Exception, match=f"Traffic failed - CLT exited with code {exit_code} while 1 flows were running"):
+        handler._wait_for_traffic_end(progress_interval=0.1)
+    server_thread = handler.run_context.server_thread
+    assert not server_thread.traffic_running
+    assert server_thread.clt_state.exit_code == exit_code
+    with pytest.raises(Exception, match="Server Failed: CLT exited"):
+        handler.get_test_status()
+
+
+def test_clt_exit_code(handler: ByteBlowerHandler, tmp_path: Path) -> None:
+    lines = [
+        "Action StartTraffic FLOW_1",
+        "Action StartTraffic FLOW_2",
+        "Action StopTraffic FLOW_1",
+        "Action StopTraffic FLOW_2",
+    ]
+    _start_server_thread(handler, tmp_path, _clt(tmp_path, lines, exit_code=2))
+    with pytest.raises(Exception, match="Server Failed: CLT exited with code 2$"):
+        handler.run_context.server_thread.join(5)
+        handler.get_test_status()
+
+
+def test_wait_for_traffic_end_timeout(handler: ByteBlowerHandler, tmp_path: Path) -> None:
+    _start_server_thread(handler, tmp_path, _clt(tmp_path, ["Action StartTraffic FLOW_1"], exit_delay=30))
+    with pytest.raises(Exception, match="Traffic did not end within 0.5 seconds"):
+        handler._wait_for_traffic_end(timeout=0.5, progress_interval=0.1)
+    handler.run_context.server_thread.join(5)
+    assert not handler.run_context.server_thread.is_alive()
+
+
+def test_statistics_during_reloads(handler: ByteBlowerHandler, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Hammer get_rt_statistics and get_test_status while load_config alternates between two port sets."""
+    ports_sets = [["PORT_1", "PORT_2"], ["PORT_1", "PORT_2", "PORT_3", "PORT_4"]]
+    project = tmp_path.joinpath("project.bbp")
+    write_project(project, ports_sets[1], [], flows=8)
+    reservations = [FakeReservation(ports, [], []) for ports in ports_sets]
+    reservation = reservations[0]
+    monkeypatch.setattr(byteblower_handler, "byteblower", stub_byteblowerll)
+    monkeypatch.setattr(
+        byteblower_reservation, "get_resources_from_reservation", lambda *a: reservation.get_resources_from_reservation(*a)
+    )
+    monkeypatch.setattr(byteblower_reservation, "get_resource_attributes", lambda *a: reservation.get_resource_attributes(*a))
+    handler.service.address = "127.0.0.1"
+    handler.project_cache = ProjectCache(handler.logger, tmp_path.joinpath("cache").as_posix())
+    handler.load_config(None, project.as_posix(), "benchmark")
+
+    finished = threading.Event()
+    errors = []
+    calls = []
+
+    def read_statistics() -> None:
+        while not finished.is_set():
+            try:
+                rt_stats = handler.get_rt_statistics()
+                assert handler.get_test_status() == "Not started"
+            except Exception as e:
+                errors.append(repr(e))
+                return
+            ports = sorted(name for name in rt_stats if name != "_meta")
+            if ports not in ports_sets or any(rt_stats[name][2] is None for name in ports):
+                errors.append(f"inconsistent statistics {rt_stats}")
+                return
+            calls.append(len(ports))
+
+    readers = [threading.Thread(target=read_statistics) for _ in range(8)]
+    for reader in readers:
+        reader.start()
+    try:
+        for i in range(50):
+            reservation = reservations[i % 2]
+            handler.load_config(None, project.as_posix(), "benchmark")
+    finally:
+        finished.set()
+        for reader in readers:
+            reader.join()
+        handler.cleanup()
+    assert not errors
+    assert set(calls) == {2, 4}
+    assert handler.bb_session is None
+    assert not StubByteBlower.servers
+
+
+def test_start_traffic_twice(handler: ByteBlowerHandler, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """The result histories are kept between runs, a new run must not harvest the intervals of the previous runs."""
+    project = tmp_path.joinpath("project.bbp")
+    write_project(project, ["PORT_1", "PORT_2"], [], flows=2)
+    reservation = FakeReservation(["PORT_1", "PORT_2"], [], [])
+    monkeypatch.setattr(byteblower_handler, "byteblower", stub_byteblowerll)
+    monkeypatch.setattr(byteblower_reservation, "get_resources_from_reservation", reservation.get_resources_from_reservation)
+    monkeypatch.setattr(byteblower_reservation, "get_resource_attributes", reservation.get_resource_attributes)
+    logger = logging.getLogger("test_byteblower_handler.start_traffic")
+    logger.addHandler(logging.FileHandler(tmp_path.joinpath("controller.log")))
+    handler.logger = logger
+    handler.service.address = "127.0.0.1"
+    lines = ["Action StartTraffic FLOW_1", "Action StartTraffic FLOW_2"]
+    handler.service.client_install_path = _clt(tmp_path, lines, exit_delay=30)
+    handler.project_cache = ProjectCache(handler.logger, tmp_path.joinpath("cache").as_posix())
+    handler.load_config(None, project.as_posix(), "benchmark")
+    try:
+        for _ in range(2):
+            # intervals of the previous run and of the idle time since load_config.
+            for history in handler.run_context.bb_ports.values():
+                history.refresh_latency = 0
+                for _ in range(600):
+                    history.Refresh()
+            handler.start_traffic(None, "False")
+            handler.run_context.stats_sampler.sample()
+            handler.stop_traffic()
+            samples = handler.get_rt_statistics_delta()["series"]["PORT_1"]["samples"]
+            assert 0 < len(samples) <= 2
+            assert all(sample[0] >= 0 for sample in samples)
+            assert handler.query_statistics(["PORT_1"])["PORT_1"]["interval_mb"]["count"] == len(samples)
+    finally:
+        handler.cleanup()
+        logger.handlers[0].close()
+        logger.handlers = []
+
+
+def test_rewrite_project_missing_port(handler: ByteBlowerHandler, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    project = tmp_path.joinpath("project.bbp")
+    write_project(project, ["PORT_1", "PORT_2"], [], flows=2)
+    ports_attributes = {
+        name: {"Name": f"BB/Module1/Port-{i}", "Mac Address": "00-FF-0A-00-00-01", "Address": "10.0.0.1"}
+        for i, name in enumerate(["PORT_1", "PORT_2"], start=1)
+    }
+    for attributes in ports_attributes.values():
+        attributes.update({"Gateway": "10.0.0.254", "Netmask": "255.255.255.0"})
+    new_project = tmp_path.joinpath("new_project.bbp").as_posix()
+    handler._rewrite_project(project.as_posix(), new_project, {}, ports_attributes)
+    # the project must not be loaded with the original addresses of a port that was not patched.
+    monkeypatch.setattr(byteblower_handler, "rewrite_project", lambda *_: ["PORT_1"])
+    with pytest.raises(Exception, match=r"Failed to patch configuration ports \['PORT_2'\]"):
+        handler._rewrite_project(project.as_posix(), new_project, {}, ports_attributes)
+
+
+def test_load_config_replaces_sampler(handler: ByteBlowerHandler, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """The old sampler is stopped before the server setup and old ports are destroyed only after the new context swap."""
+    project = tmp_path.joinpath("project.bbp")
+    write_project(project, ["PORT_1", "PORT_2", "PORT_3"], [], flows=3)
+    reservation = FakeReservation(["PORT_1", "PORT_2", "PORT_3"], [], [])
+    monkeypatch.setattr(byteblower_handler, "byteblower", stub_byteblowerll)
+    monkeypatch.setattr(
+        byteblower_reservation, "get_resources_from_reservation", lambda *a: reservation.get_resources_from_reservation(*a)
+    )
+    monkeypatch.setattr(byteblower_reservation, "get_resource_attributes", lambda *a: reservation.get_resource_attributes(*a))
+    handler.service.address = "127.0.0.1"
+    handler.project_cache = ProjectCache(handler.logger, tmp_path.joinpath("cache").as_posix())
+    handler.load_config(None, project.as_posix(), "benchmark")
+    run = handler.run_context
+    stats_sampler = byteblower_handler.StatsSampler(
+        handler.logger, run.bb_ports, {}, run.intended_tx, SamplingOptions(interval=0.01)
+    )
+    handler.run_context = run._replace(stats_sampler=stats_sampler)
+    stats_sampler.start()
+
+    setup_server = handler._setup_server
+    checks = []
+
+    def checked_setup_server(*args: object) -> dict:
+        checks.append(("sampler stopped", not stats_sampler.is_alive()))
+        bb_ports = setup_server(*args)
+        checks.append(("published ports alive", not any(h.destroyed for h in handler.run_context.bb_ports.values())))
+        return bb_ports
+
+    monkeypatch.setattr(handler, "_setup_server", checked_setup_server)
+    reservation = FakeReservation(["PORT_1", "PORT_2"], [], [])
+    try:
+        handler.load_config(None, project.as_posix(), "benchmark")
+        assert checks == [("sampler stopped", True), ("published ports alive", True)]
+        assert run.bb_ports["PORT_3"].destroyed
+        assert set(handler.run_context.bb_ports) == {"PORT_1", "PORT_2"}
+    finally:
+        handler.cleanup()
+
+
+def test_load_config_reads_edited_attributes(
+    handler: ByteBlowerHandler, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    project = tmp_path.joinpath("project.bbp")
+    write_project(project, ["PORT_1", "PORT_2"], [], flows=2)
+    reservation = FakeReservation(["PORT_1", "PORT_2"], [], [])
+    monkeypatch.setattr(byteblower_handler, "byteblower", stub_byteblowerll)
+    monkeypatch.setattr(byteblower_reservation, "get_resources_from_reservation", reservation.get_resources_from_reservation)
+    monkeypatch.setattr(byteblower_reservation, "get_resource_attributes", reservation.get_resource_attributes)
+    handler.service.address = "127.0.0.1"
+    handler.project_cache = ProjectCache(handler.logger, tmp_path.joinpath("cache").as_posix())
+    try:
+        handler.load_config(None, project.as_posix(), "benchmark")
+        first_project = handler.run_context.project
+        reservation.attributes["ByteBlower/Module1/Port-1"]["Address"] = "10.0.1.1"
+        # the commands after load_config use the attributes read by the load.
+        assert handler.reservation.get(None, "ByteBlower/Module1/Port-1", "Address") == "10.0.0.1"
+
+        handler.load_config(None, project.as_posix(), "benchmark")
+        assert handler.run_context.project != first_project
+        gui_ports = {p.attrib["name"]: p for p in ET.parse(handler.run_context.project).getroot().iter("ByteBlowerGuiPort")}
+        ip_address = gui_ports["PORT_1"].find("ipv4Configuration").find("IpAddress").findall("bytes")
+        assert [int(b.text) for b in ip_address] == [10, 0, 1, 1]
+    finally:
+        handler.cleanup()
+
+
+def test_load_config_reaps_orphans_once(handler: ByteBlowerHandler, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    project = tmp_path.joinpath("project.bbp")
+    write_project(project, ["PORT_1"], [], flows=1)
+    reservation = FakeReservation(["PORT_1"], [], [])
+    monkeypatch.setattr(byteblower_handler, "byteblower", stub_byteblowerll)
+    monkeypatch.setattr(byteblower_reservation, "get_resources_from_reservation", reservation.get_resources_from_reservation)
+    monkeypatch.setattr(byteblower_reservation, "get_resource_attributes", reservation.get_resource_attributes)
+    reaps = []
+    monkeypatch.setattr(byteblower_handler, "reap_orphan_clts", reaps.append)
+    handler.service.address = "127.0.0.1"
+    handler.project_cache = ProjectCache(handler.logger, tmp_path.joinpath("cache").as_posix())
+    try:
+        handler.load_config(None, project.as_posix(), "benchmark")
+        handler.load_config(None, project.as_posix(), "benchmark")
+        assert reaps == [handler.logger]
+    finally:
+        handler.cleanup()
+
+
+def test_start_traffic_registration_timeout(
+    handler: ByteBlowerHandler, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    driver = ByteBlowerControllerShell2GDriver()
+    calls = []
+    monkeypatch.setattr(driver.handler, "_start_traffic", lambda *args: calls.append(args[1:]))
+    driver.start_traffic(None, "False", "5")
+    driver.start_traffic(None, "False", "")
+    assert calls == [(5.0, byteblower_handler.TRAFFIC_START_TIMEOUT), (60, byteblower_handler.TRAFFIC_START_TIMEOUT)]
+    with pytest.raises(Exception, match="Invalid registration timeout 0"):
+        handler.start_traffic(None, "False", 0)
+
+    # endpoints that do not register fail start_traffic after the requested timeout.
+    handler.eps_pool = FakeEpPool()
+    _reserve_eps(handler, 1)
+    monkeypatch.setattr(handler, "_validate_endpoint_wifi", lambda _: None)
+    monkeypatch.setattr(FakePopen, "readline", lambda self: b"" if self.terminated.wait(0.05) else b"Status: Idle\n")
+    logger = logging.getLogger("test_byteblower_handler.registration")
+    logger.addHandler(logging.FileHandler(tmp_path.joinpath("controller.log")))
+    handler.logger = logger
+    start = time.perf_counter()
+    try:
+        with pytest.raises(Exception, match=r"did not register with meeting point 10.0.0.254 within 0.5 seconds"):
+            handler.start_traffic(None, "False", 0.5)
+        assert time.perf_counter() - start < 2
+    finally:
+        logger.handlers[0].close()
+        logger.handlers = []
@@ -0,0 +1,90 @@
+"""
+Tests for the result history harvester.
+"""
+import logging
+import time
+
+import pytest
+
+from src.byteblower_harvester import HistoryHarvester
+from tests.byteblower_stand_ins import StubResultHistory
+
+logger = logging.getLogger("test_byteblower_harvester")
+
+
+@pytest.fixture()
+def history() -> StubResultHistory:
+    return StubResultHistory(refresh_latency=0)
+
+
+def test_harvest_all_intervals(history: StubResultHistory) -> None:
+    harvester = HistoryHarvester(logger)
+    assert harvester.harvest("PORT_1", history) == []
+    # the caller polls slower than the server interval.
+    for polls in (3, 1, 0, 5):
+        for _ in range(polls):
+            history.Refresh()
+        intervals = harvester.harvest("PORT_1", history)
+        assert len(intervals) == polls
+    assert history.IntervalLengthGet() == 9
+    intervals = HistoryHarvester(logger).harvest("PORT_1", history)
+    assert [cumulative for _, cumulative, _ in intervals] == [i * 125000 for i in range(1, 10)]
+    assert [interval for _, _, interval in intervals] == [125000] * 9
+    assert [t2 - t1 for (t1, _, _), (t2, _, _) in zip(intervals, intervals[1:])] == pytest.approx([1.0] * 8)
+    assert not harvester.lost
+
+
+def test_harvest_overflow(history: StubResultHistory, caplog: pytest.LogCaptureFixture) -> None:
+    harvester = HistoryHarvester(logger)
+    for _ in range(3):
+        history.Refresh()
+    assert len(harvester.harvest("PORT_1", history)) == 3
+
+    # the server buffer dropped intervals 5 and 6 before they were refreshed.
+    for _ in range(5):
+        history.Refresh()
+    del history.intervals[4:6]
+    del history.cumulatives[4:6]
+    intervals = harvester.harvest("PORT_1", history)
+    assert len(intervals) == 3
+    assert harvester.lost == {"PORT_1": 2}
+    assert "PORT_1 result history overflowed, 2 intervals lost" in caplog.text
+
+    # the client history lost everything since the previous harvest.
+    for _ in range(4):
+        history.Refresh()
+    history.intervals = history.intervals[-1:]
+    history.cumulatives = history.cumulatives[-1:]
+    assert len(harvester.harvest("PORT_1", history)) == 1
+    assert harvester.lost == {"PORT_1": 5}
+
+
+def test_harvest_clock_skew() -> None:
+    # the server clock is an hour ahead of the controller clock.
+    history = StubResultHistory(refresh_latency=0, clock_skew=3600)
+    harvester = HistoryHarvester(logger)
+    for _ in range(3):
+        history.Refresh()
+    refresh_time = time.time()
+    intervals = harvester.harvest("PORT_1", history, refresh_time)
+    # the newest interval ends at the refresh, converted to the controller clock.
+    assert [timestamp for timestamp, _, _ in intervals] == pytest.approx([refresh_time - 2, refresh_time - 1, refresh_time])
+    assert harvester.clock_offsets["PORT_1"] == pytest.approx(-3600 - 3, abs=1)
+
+    # a slower refresh round trip does not move the converted timestamps.
+    history.Refresh()
+    intervals = harvester.harvest("PORT_1", history, refresh_time + 1 + 0.5)
+    assert [timestamp for timestamp, _, _ in intervals] == pytest.approx([refresh_time + 1])
+
+
+def test_harvest_since_start_time(history: StubResultHistory) -> None:
+    # intervals of a previous run are still in the history.
+    for _ in range(100):
+        history.Refresh()
+    harvester = HistoryHarvester(logger, start_time=time.time())
+    history.Refresh()
+    intervals = harvester.harvest("PORT_1", history, time.time())
+    assert len(intervals) == 1
+    assert not harvester.lost
+    history.Refresh()
+    assert len(harvester.harvest("PORT_1", history, time.time())) == 1
@@ -0,0 +1,68 @@
+"""
+Import time benchmark of the driver modules and tests for the deferred heavy imports.
+
+Set BYTEBLOWER_IMPORT_BUDGET_MS to fail when importing the driver takes longer than the budget.
+"""
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from src.byteblower_lazy import LazyModule, prewarm, prewarm_enabled
+
+HEAVY_MODULES = ["byteblowerll", "netaddr", "psutil", "rpyc"]
+
+logger = logging.getLogger("test_byteblower_imports")
+
+
+def _import_times(module: str) -> Dict[str, int]:
+    """Import module in a fresh interpreter with -X importtime.
+
+    :return: {module name: cumulative import time in microseconds}
+    """
+    src = Path(__file__).parent.parent.joinpath("src").as_posix()
+    env = dict(os.environ, PYTHONPATH=src)
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], env=env, stderr=subprocess.PIPE, check=True
+    ).stderr.decode()
+    times = {}
+    for line in output.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_driver_import_time() -> None:
+    pytest.importorskip("cloudshell.traffic.tg")
+    times = _import_times("byteblower_driver")
+    loaded = [m for m in HEAVY_MODULES if any(n == m or n.startswith(f"{m}.") for n in times)]
+    assert not loaded, f"heavy modules imported at driver load: {loaded}"
+    import_ms = times["byteblower_driver"] / 1000.0
+    print(f"\nbyteblower_driver import {import_ms:.1f} ms, byteblower_handler {times['byteblower_handler'] / 1000.0:.1f} ms")
+    budget = os.environ.get("BYTEBLOWER_IMPORT_BUDGET_MS")
+    if budget:
+        assert import_ms <= float(budget)
+
+
+def test_lazy_module() -> None:
+    module = LazyModule("colorsys")
+    assert not module.loaded
+    assert module.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert module.loaded
+    assert module.load() is sys.modules["colorsys"]
+    with pytest.raises(ImportError):
+        LazyModule("no_such_module").load()
+
+
+def test_prewarm(monkeypatch: pytest.MonkeyPatch) -> None:
+    modules = [LazyModule("json"), LazyModule("no_such_module")]
+    prewarm(logger, modules).join(10)
+    assert [m.loaded for m in modules] == [True, False]
+    monkeypatch.setenv("BYTEBLOWER_PREWARM", "off")
+    assert not prewarm_enabled()
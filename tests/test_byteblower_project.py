@@ -0,0 +1,248 @@
+"""
+Tests for ByteBlower project helpers.
+"""
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import pytest
+
+from src.byteblower_project import (
+    PortPatch,
+    ProjectIndex,
+    RateProfile,
+    get_flow_rate,
+    get_intended_tx,
+    get_rate_profiles,
+    rewrite_project,
+)
+
+config_4_cpes = Path(__file__).parent.joinpath("test_config_4_cpes.bbp")
+
+patches = {
+    "WAN_PORT": PortPatch(
+        mac_address="00-FF-0A-80-00-01", ip_address="10.1.200.3", gateway="10.1.200.1", netmask="255.255.0.0"
+    ),
+    "PORT_A": PortPatch(
+        mac_address="00:FF:0A:80:00:02",
+        ip_address="192.168.1.10",
+        gateway="192.168.1.1",
+        netmask="255.255.255.0",
+        configuration={"physicalPortId": "12"},
+    ),
+    "EP01_2G": PortPatch(configuration={"physicalInterfaceId": "0fd6e8e4-bb1e-4b8e-8dd6-6b3a8a1b2c3d"}),
+}
+
+
+def _bytes(xml_gui_port: ET.Element, *path: str) -> list:
+    return [int(b.text) for b in xml_gui_port.find("/".join(path)).findall("bytes")]
+
+
+def _scale_project(source: Path, target: Path, copies: int) -> None:
+    """Append `copies` duplicates of every Frame so the project size grows like in multi-CPE projects."""
+    lines = source.read_text().splitlines(keepends=True)
+    first_port = next(i for i, line in enumerate(lines) if line.lstrip().startswith("<ByteBlowerGuiPort "))
+    frames = []
+    in_frame = False
+    for line in lines[:first_port]:
+        in_frame = in_frame or line.lstrip().startswith("<Frame ")
+        if in_frame:
+            frames.append(line)
+        in_frame = in_frame and not line.lstrip().startswith("</Frame>")
+    target.write_text("".join(lines[:first_port] + frames * copies + lines[first_port:]))
+
+
+def _legacy_rewrite(source: str, target: str, port_patches: dict) -> None:
+    """The ElementTree based rewrite that load_config used before the streaming rewriter."""
+    xml = ET.parse(source)
+    xml_gui_ports = xml.getroot().findall("ByteBlowerGuiPort")
+    for name, patch in port_patches.items():
+        xml_gui_port = [p for p in xml_gui_ports if p.attrib["name"] == name][0]
+        for (parent, entry), values in patch.byte_values().items():
+            for value, xml_byte in zip(values, xml_gui_port.find(parent).find(entry).findall("bytes")):
+                xml_byte.text = value
+        xml_gui_port.find("ByteBlowerGuiPortConfiguration").attrib.update(patch.configuration)
+    xml.write(target)
+    with open(source, "r") as p_f:
+        project_lines = p_f.readlines()
+        with open(target, "r+") as np_f:
+            new_project_lines = np_f.readlines()
+            new_project_lines[0] = project_lines[1]
+            new_project_lines[-1] = project_lines[-1]
+            np_f.seek(0)
+            np_f.writelines(new_project_lines)
+
+
+def test_rewrite_without_patches(tmp_path: Path) -> None:
+    target = tmp_path.joinpath("project.bbp")
+    assert rewrite_project(config_4_cpes.as_posix(), target.as_posix(), {}) == []
+    assert target.read_bytes() == config_4_cpes.read_bytes()
+
+
+def test_rewrite_project(tmp_path: Path) -> None:
+    target = tmp_path.joinpath("project.bbp")
+    assert sorted(rewrite_project(config_4_cpes.as_posix(), target.as_posix(), patches)) == sorted(patches)
+
+    source_lines = config_4_cpes.read_text().splitlines()
+    target_lines = target.read_text().splitlines()
+    assert len(source_lines) == len(target_lines)
+    assert target_lines[:2] == source_lines[:2]
+    assert target_lines[-1] == source_lines[-1]
+
+    xml_gui_ports = {p.attrib["name"]: p for p in ET.parse(target).getroot().findall("ByteBlowerGuiPort")}
+    wan_port = xml_gui_ports["WAN_PORT"]
+    assert _bytes(wan_port, "layer2Configuration", "MacAddress") == [0, -1, 10, -128, 0, 1]
+    assert _bytes(wan_port, "ipv4Configuration", "IpAddress") == [10, 1, -56, 3]
+    assert _bytes(wan_port, "ipv4Configuration", "DefaultGateway") == [10, 1, -56, 1]
+    assert _bytes(wan_port, "ipv4Configuration", "Netmask") == [-1, -1, 0, 0]
+    assert _bytes(wan_port, "ipv6Configuration", "IpAddress") == [0] * 16
+    port_a = xml_gui_ports["PORT_A"]
+    assert _bytes(port_a, "ipv4Configuration", "IpAddress") == [-64, -88, 1, 10]
+    assert port_a.find("ByteBlowerGuiPortConfiguration").attrib["physicalPortId"] == "12"
+    ep = xml_gui_ports["EP01_2G"]
+    assert ep.find("ByteBlowerGuiPortConfiguration").attrib["physicalInterfaceId"] == "0fd6e8e4-bb1e-4b8e-8dd6-6b3a8a1b2c3d"
+
+    source_gui_ports = {p.attrib["name"]: p for p in ET.parse(config_4_cpes).getroot().findall("ByteBlowerGuiPort")}
+    for name in set(source_gui_ports) - set(patches):
+        assert ET.tostring(source_gui_ports[name]) == ET.tostring(xml_gui_ports[name])
+
+
+def test_rewrite_matches_legacy(tmp_path: Path) -> None:
+    streaming = tmp_path.joinpath("streaming.bbp")
+    legacy = tmp_path.joinpath("legacy.bbp")
+    rewrite_project(config_4_cpes.as_posix(), streaming.as_posix(), patches)
+    _legacy_rewrite(config_4_cpes.as_posix(), legacy.as_posix(), patches)
+    streaming_root = ET.parse(streaming).getroot()
+    legacy_root = ET.parse(legacy).getroot()
+    assert [ET.tostring(e) for e in streaming_root] == [ET.tostring(e) for e in legacy_root]
+
+
+def test_rewrite_escaped_split_tag(tmp_path: Path) -> None:
+    source = tmp_path.joinpath("source.bbp")
+    text = config_4_cpes.read_text().replace('<ByteBlowerGuiPort name="PORT_A" ', '<ByteBlowerGuiPort\n      name="A&amp;B" ')
+    source.write_text(text)
+    target = tmp_path.joinpath("project.bbp")
+    assert rewrite_project(source.as_posix(), target.as_posix(), {"A&B": patches["PORT_A"]}) == ["A&B"]
+    xml_gui_ports = {p.attrib["name"]: p for p in ET.parse(target).getroot().findall("ByteBlowerGuiPort")}
+    assert _bytes(xml_gui_ports["A&B"], "layer2Configuration", "MacAddress") == [0, -1, 10, -128, 0, 2]
+    assert xml_gui_ports["A&B"].find("ByteBlowerGuiPortConfiguration").attrib["physicalPortId"] == "12"
+    assert len(target.read_text().splitlines()) == len(text.splitlines())
+
+
+def test_rewrite_escapes_values(tmp_path: Path) -> None:
+    target = tmp_path.joinpath("project.bbp")
+    value = 'a&b <"c">'
+    patch = PortPatch(configuration={"physicalInterfaceId": value, "description": value})
+    assert rewrite_project(config_4_cpes.as_posix(), target.as_posix(), {"EP01_2G": patch}) == ["EP01_2G"]
+    xml_gui_ports = {p.attrib["name"]: p for p in ET.parse(target).getroot().findall("ByteBlowerGuiPort")}
+    configuration = xml_gui_ports["EP01_2G"].find("ByteBlowerGuiPortConfiguration").attrib
+    assert configuration["physicalInterfaceId"] == value
+    assert configuration["description"] == value
+
+
+def test_rewrite_self_closing_port(tmp_path: Path) -> None:
+    source = tmp_path.joinpath("source.bbp")
+    lines = config_4_cpes.read_text().splitlines(keepends=True)
+    # PORT_A without addresses, the following ports must not be rewritten with its patch.
+    start = next(i for i, line in enumerate(lines) if '<ByteBlowerGuiPort name="PORT_A"' in line)
+    end = next(i for i in range(start, len(lines)) if lines[i].strip() == "</ByteBlowerGuiPort>")
+    lines[start : end + 1] = ['  <ByteBlowerGuiPort name="PORT_A" natted="true" mtu="1500"/>\n']
+    source.write_text("".join(lines))
+    target = tmp_path.joinpath("project.bbp")
+    assert rewrite_project(source.as_posix(), target.as_posix(), {"PORT_A": patches["PORT_A"]}) == ["PORT_A"]
+    assert target.read_text() == source.read_text()
+
+
+def _legacy_intended_tx(bbl_config_file_name: str) -> dict:
+    """The ElementTree based get_intended_tx that load_config used before the project index."""
+    xml_root = ET.parse(bbl_config_file_name).getroot()
+    xml_flows_templates = xml_root.findall("FlowTemplate")
+    xml_frames = xml_root.findall("Frame")
+    bb_ports_intended_tx = {}
+    for xml_gui_port in xml_root.findall("ByteBlowerGuiPort"):
+        bb_ports_intended_tx[xml_gui_port.attrib["name"]] = 0
+        for bb_flow in xml_gui_port.attrib["theSourceOfFlow"].split():
+            xml_flow = [f for f in xml_flows_templates if f.attrib["Flow"] == bb_flow][0]
+            frame_index = int(xml_flow.find("frameBlastingFrames").attrib["frame"].split(".")[-1])
+            frame_interval_ns = float(xml_flow.attrib["frameInterval"])
+            frame_length = len(xml_frames[frame_index].attrib["bytesHexString"]) / 2
+            intended_mbps = 1000000000 / frame_interval_ns * frame_length * 8 / 1000 / 1000
+            bb_ports_intended_tx[xml_gui_port.attrib["name"]] += int(intended_mbps)
+    return bb_ports_intended_tx
+
+
+def test_project_index() -> None:
+    project_index = ProjectIndex(config_4_cpes.as_posix())
+    assert len(project_index.ports) == 9
+    assert len(project_index.flows) == len(project_index.templates) == len(project_index.frames) == 16
+    wan_port = project_index.ports["WAN_PORT"]
+    assert wan_port.reference == "//@ByteBlowerGuiPort.0"
+    assert wan_port.configuration["physicalPortId"] == "-1"
+    assert len(wan_port.sources) == 8
+    assert project_index.ports["PORT_A"].configuration["physicalPortId"] == "44"
+    flow = project_index.flows["//@Flow.1"]
+    assert flow.name == "FLOW_2"
+    assert flow.source == "//@ByteBlowerGuiPort.1"
+    template = project_index.templates["//@Flow.1"]
+    assert template.reference == flow.template
+    assert template.frames == [("//@Frame.1", 1)]
+    assert project_index.frames["//@Frame.1"].length == 1500
+    scenario = project_index.scenarios["test_config_4_cpes"]
+    assert len(scenario.measurements) == 16
+    assert (scenario.measurements[1].flow, scenario.measurements[1].start) == ("//@Flow.1", 0)
+    assert scenario.duration == 20
+
+
+@pytest.mark.parametrize("config", ["test_config", "test_config_4_cpes", "test_config_4_cpes_12h", "yoram_magic_1port"])
+def test_intended_tx(config: str) -> None:
+    config_file = Path(__file__).parent.joinpath(f"{config}.bbp").as_posix()
+    assert get_intended_tx(ProjectIndex(config_file)) == _legacy_intended_tx(config_file)
+
+
+def test_rate_profile() -> None:
+    profile = RateProfile.from_steps([(10.0, 20.0), (0.0, 30.0), (20.0, -30.0), (10.0, -5.0), (30.0, -15.0), (None, -1.0)])
+    assert profile.times == [0.0, 10.0, 20.0, 30.0]
+    assert profile.rates == [30.0, 45.0, 15.0, 0.0]
+    assert [profile.at(t) for t in (-1, 0, 9.99, 10, 25, 1000)] == [0.0, 30.0, 30.0, 45.0, 15.0, 0.0]
+    assert RateProfile.from_dict(profile.to_dict()).at(15) == 45.0
+
+
+def test_rate_profiles() -> None:
+    project_index = ProjectIndex(config_4_cpes.as_posix())
+    # FLOW_1 blasts two frames, weights 1 and 3.
+    template = project_index.templates["//@Flow.0"]
+    template.frames = [("//@Frame.0", 1), ("//@Frame.2", 3)]
+    frames_length = [project_index.frames[f].length for f, _ in template.frames]
+    flow_1_rate = 1000000000 / float(template.attributes["frameInterval"]) * (frames_length[0] + 3 * frames_length[1]) / 4
+    assert get_flow_rate(project_index, "//@Flow.0") == pytest.approx(flow_1_rate * 8 / 1000000)
+    # stagger FLOW_2 (PORT_A -> WAN_PORT) to 5..15 seconds.
+    scenario = project_index.scenarios["test_config_4_cpes"]
+    scenario.measurements[1].start, scenario.measurements[1].stop = 5.0, 15.0
+
+    profiles = get_rate_profiles(project_index, "test_config_4_cpes")
+    assert profiles["tx"]["PORT_A"].to_dict() == {"times": [5.0, 15.0], "rates": [30.0, 0.0]}
+    assert profiles["rx"]["WAN_PORT"].at(10) - profiles["rx"]["WAN_PORT"].at(1) == pytest.approx(30.0)
+    assert profiles["flows"]["FLOW_2"].at(4.9) == 0.0
+    assert profiles["flows"]["FLOW_1"].at(0) == pytest.approx(flow_1_rate * 8 / 1000000)
+    assert profiles["tx"]["WAN_PORT"].at(20) == 0.0
+    assert get_rate_profiles(project_index, "no_such_scenario") == {"tx": {}, "rx": {}, "flows": {}}
+
+
+@pytest.mark.parametrize("copies", [16, 64])
+def test_rewrite_benchmark(tmp_path: Path, copies: int) -> None:
+    source = tmp_path.joinpath("scaled.bbp")
+    _scale_project(config_4_cpes, source, copies)
+
+    start = time.perf_counter()
+    _legacy_rewrite(source.as_posix(), tmp_path.joinpath("legacy.bbp").as_posix(), patches)
+    _legacy_intended_tx(tmp_path.joinpath("legacy.bbp").as_posix())
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    project_index = ProjectIndex(source.as_posix())
+    rewrite_project(source.as_posix(), tmp_path.joinpath("streaming.bbp").as_posix(), patches)
+    get_intended_tx(project_index)
+    streaming = time.perf_counter() - start
+
+    print(f"{source.stat().st_size} bytes - legacy {legacy * 1000:.1f} ms, streaming {streaming * 1000:.1f} ms")
+    assert streaming < legacy
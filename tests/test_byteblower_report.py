@@ -0,0 +1,112 @@
+"""
+Tests for the ByteBlower CLT report parser with synthetic report files.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from src import byteblower_report
+from src.byteblower_report import CltReport, iter_json_records
+
+logger = logging.getLogger("test_byteblower_report")
+
+FLOWS = 20000
+
+
+@pytest.fixture()
+def output_dir(tmp_path: Path) -> Path:
+    """Synthetic CLT output folder with large sectioned CSV report."""
+    with tmp_path.joinpath("report.csv").open("w", newline="") as writer:
+        report = csv.writer(writer)
+        report.writerow(["Port Results", "", ""])
+        report.writerow(["Port", "Tx Frames", "Rx Frames"])
+        for i in range(8):
+            report.writerow([f"PORT_{i}", 1000 * i, 999 * i])
+        report.writerow([])
+        report.writerow(["Frame Blasting Flows", "", ""])
+        report.writerow(["Flow", "Tx Frames", "Loss"])
+        for i in range(FLOWS):
+            report.writerow([f"FLOW_{i}", 100, i % 3])
+        report.writerow([])
+        report.writerow(["Test Info", "", ""])
+        report.writerow(["Key", "Value", ""])
+        report.writerow(["Duration", "60s", ""])
+        report.writerow([])
+        report.writerow(["Wireless Endpoints", "", ""])
+        report.writerow(["Name", "Rx Frames", "Rx Bytes"])
+        for i in range(1, 5):
+            report.writerow([f"EP{i:02}", i, i * 1500])
+    return tmp_path
+
+
+def test_iter_json_records(tmp_path: Path) -> None:
+    records = {
+        "ports": [{"name": f"PORT_{i}", "tx": i * 1.5e9, "text": "a, [b]: {c}"} for i in range(100)],
+        "empty": [],
+        "x": 1,
+    }
+    report_file = tmp_path.joinpath("report.json")
+    report_file.write_text(json.dumps(records))
+    for chunk_size in (1, 7, 1024 * 1024):
+        parsed = list(iter_json_records(report_file.as_posix(), chunk_size))
+        assert parsed == [("ports", r) for r in records["ports"]] + [("x", 1)]
+    report_file.write_text(json.dumps(records["ports"]))
+    assert [r for _, r in iter_json_records(report_file.as_posix(), 5)] == records["ports"]
+
+
+def test_views(output_dir: Path) -> None:
+    report = CltReport(logger, output_dir.as_posix())
+    flows = report.view("Flow")
+    assert list(flows.sections) == ["Frame Blasting Flows"]
+    assert len(flows.sections["Frame Blasting Flows"]) == FLOWS
+    assert flows.sections["Frame Blasting Flows"][2] == {"Flow": "FLOW_2", "Tx Frames": "100", "Loss": "2"}
+    assert list(report.views) == ["flow"]
+
+    ports = list(csv.DictReader(io.StringIO(report.view("port").to_csv())))
+    assert len(ports) == 8
+    assert ports[1] == {"Section": "Port Results", "Port": "PORT_1", "Tx Frames": "1000", "Rx Frames": "999"}
+
+    endpoints = report.view("endpoint").to_json()
+    assert endpoints["Wireless Endpoints"][1] == {"Name": "EP02", "Rx Frames": "2", "Rx Bytes": "3000"}
+
+    with pytest.raises(Exception, match="Invalid view"):
+        report.view("session")
+
+
+def test_views_cache(output_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    report = CltReport(logger, output_dir.as_posix())
+    parsed = []
+    iter_csv_records = byteblower_report.iter_csv_records
+    monkeypatch.setattr(byteblower_report, "iter_csv_records", lambda path: parsed.append(path) or iter_csv_records(path))
+    flows = report.view("flow")
+    assert report.view("flow") is flows
+    assert len(parsed) == 1
+    output_dir.joinpath("report.csv").write_text("Flows\nFlow,Loss\nFLOW_1,0\n")
+    flows = report.view("flow")
+    assert len(parsed) == 2
+    assert flows.sections == {"Flows": [{"Flow": "FLOW_1", "Loss": "0"}]}
+
+
+def test_report_files(output_dir: Path) -> None:
+    # report of a previous run in the same output folder.
+    previous = time.time() - 60
+    os.utime(output_dir.joinpath("report.csv"), (previous, previous))
+    report = CltReport(logger, output_dir.as_posix(), time.time() - 1)
+    with pytest.raises(Exception, match="No CSV or JSON reports of the run found"):
+        report.view("port")
+
+    # the run reports in both formats, only the JSON report is read.
+    output_dir.joinpath("run.csv").write_text("Port Results\nPort,Tx Frames\nPORT_1,10\n")
+    ports = {"ports": [{"port": "PORT_1", "tx": {"frames": 10}}]}
+    output_dir.joinpath("run.json").write_text(json.dumps(ports))
+    assert report.view("port").to_json() == {"ports": [{"port": "PORT_1", "tx.frames": 10}]}
+
+    # the run reports in CSV only.
+    output_dir.joinpath("run.json").unlink()
+    assert report.view("port").to_json() == {"Port Results": [{"Port": "PORT_1", "Tx Frames": "10"}]}
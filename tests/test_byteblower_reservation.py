@@ -0,0 +1,71 @@
+"""
+Tests for the reservation attributes cache.
+"""
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from src import byteblower_reservation
+from src.byteblower_handler import BYTEBLOWER_ENDPOINT_MODEL, BYTEBLOWER_PORT_MODEL
+from src.byteblower_reservation import ReservationAttributes, get_resource_attributes
+from tests.byteblower_stand_ins import FakeReservation
+
+logger = logging.getLogger("test_byteblower_reservation")
+
+
+@pytest.fixture()
+def reservation(monkeypatch: pytest.MonkeyPatch) -> FakeReservation:
+    reservation = FakeReservation(["PORT_1", "PORT_2"], ["EP01"], ["10.0.1.1"])
+    monkeypatch.setattr(byteblower_reservation, "get_resources_from_reservation", reservation.get_resources_from_reservation)
+    monkeypatch.setattr(byteblower_reservation, "get_resource_attributes", reservation.get_resource_attributes)
+    monkeypatch.setattr(byteblower_reservation, "get_reservation_id", reservation.get_reservation_id)
+    return reservation
+
+
+def test_get_resource_attributes(monkeypatch: pytest.MonkeyPatch) -> None:
+    details = SimpleNamespace(
+        ResourceModelName="ByteBlower Chassis.GenericTrafficGeneratorPort",
+        ResourceFamilyName="CS_TrafficGeneratorPort",
+        ResourceAttributes=[
+            SimpleNamespace(Name="ByteBlower Chassis.GenericTrafficGeneratorPort.Logical Name", Value="PORT_1"),
+            SimpleNamespace(Name="CS_TrafficGeneratorPort.Address", Value="10.0.0.1"),
+            SimpleNamespace(Name="Mac Address", Value="00:ff:0a:00:00:01"),
+        ],
+    )
+    calls = []
+    session = SimpleNamespace(GetResourceDetails=lambda name: calls.append(name) or details)
+    monkeypatch.setattr(byteblower_reservation, "get_cs_session", lambda _: session)
+    attributes = get_resource_attributes(None, "ByteBlower/Module1/Port-1")
+    assert calls == ["ByteBlower/Module1/Port-1"]
+    assert attributes["Logical Name"] == "PORT_1"
+    assert attributes["Address"] == "10.0.0.1"
+    assert attributes["CS_TrafficGeneratorPort.Address"] == "10.0.0.1"
+    assert attributes["Mac Address"] == "00:ff:0a:00:00:01"
+
+
+def test_cache(reservation: FakeReservation) -> None:
+    cache = ReservationAttributes(logger)
+    resources = cache.resources(None, BYTEBLOWER_ENDPOINT_MODEL, BYTEBLOWER_PORT_MODEL)
+    assert len(resources) == 3
+    for _ in range(3):
+        for resource in resources:
+            for attribute in reservation.attributes[resource.Name]:
+                cache.get(None, resource.Name, attribute)
+    # one call for the resources and one per resource.
+    assert reservation.api_calls == 4
+    assert cache.counters["attributes_calls"] == 3
+    with pytest.raises(Exception, match="has no attribute Identifier"):
+        cache.get(None, "ByteBlower/Module1/Port-1", "Identifier")
+
+    # resources that left the reservation are dropped.
+    reservation.resources = reservation.resources[1:]
+    cache.resources(None, BYTEBLOWER_ENDPOINT_MODEL, BYTEBLOWER_PORT_MODEL)
+    assert "ByteBlower/Module1/Port-1" not in cache.attributes
+    assert "ByteBlower/Module1/Port-2" in cache.attributes
+
+    # new reservation.
+    reservation.reservation_id = "reservation-2"
+    reservation.attributes["ByteBlower/Module1/Port-2"]["Address"] = "10.0.2.2"
+    assert cache.get(None, "ByteBlower/Module1/Port-2", "Address") == "10.0.2.2"
+    assert cache.counters["invalidations"] == 1
@@ -0,0 +1,92 @@
+"""
+Tests for the endpoint samples ring buffer.
+"""
+import time
+
+from src.byteblower_samples import SampleRing
+
+
+def test_ring() -> None:
+    ring = SampleRing(capacity=8)
+    assert ring.last(4) == []
+    for i in range(20):
+        ring.append(float(i), "Running" if i % 2 else "Registered", [i, i * 10])
+    assert len(ring) == 8
+    assert ring.total == 20
+    assert ring.last() == [["Running", "19.00", "190.00"]]
+    assert ring.last(3, with_timestamp=True) == [
+        [17.0, "Running", "17.00", "170.00"],
+        [18.0, "Registered", "18.00", "180.00"],
+        [19.0, "Running", "19.00", "190.00"],
+    ]
+    assert [s[0] for s in ring.last(100, with_timestamp=True)] == [float(i) for i in range(12, 20)]
+    assert ring.state_names == ["Registered", "Running"]
+
+
+def test_missing_values() -> None:
+    ring = SampleRing(capacity=4, values=3)
+    ring.append(0.0, "Running", [1.0])
+    assert ring.last() == [["Running", "1.00", "nan", "nan"]]
+
+
+def test_wide_values() -> None:
+    ring = SampleRing(capacity=4)
+    ring.append(0.0, "Registered", [1.0, 2.0])
+    # endpoints may report more values than the previous samples, all the values are kept.
+    ring.append(1.0, "Running", [1.0, 2.0, 3.0, 4.0])
+    assert len(ring) == 2
+    assert ring.last(2) == [["Registered", "1.00", "2.00", "nan", "nan"], ["Running", "1.00", "2.00", "3.00", "4.00"]]
+    assert ring.since(1)[1] == [(1.0, "Running", (1.0, 2.0, 3.0, 4.0))]
+
+
+def test_downsample() -> None:
+    ring = SampleRing(capacity=8, downsample=True)
+    for i in range(9):
+        ring.append(float(i), "Running", [float(i), 0.0])
+    # oldest half (0..3) merged pairwise, newest samples kept as is.
+    assert [s[0] for s in ring.last(100, with_timestamp=True)] == [1.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0]
+    assert [s[1] for s in ring.last(2)] == ["7.00", "8.00"]
+    assert ring.last(100)[0][1] == "0.50"
+    for i in range(9, 10000):
+        ring.append(float(i), "Running", [float(i), 0.0])
+    assert len(ring) <= 8
+    assert ring.last(1, with_timestamp=True)[0][0] == 9999.0
+
+
+def test_downsample_odd_half() -> None:
+    ring = SampleRing(capacity=10, downsample=True)
+    for i in range(11):
+        ring.append(float(i), "Running", [float(i), 0.0])
+    # oldest half (0..4) is odd, 0..3 merged pairwise and 4 kept as is.
+    assert [s[0] for s in ring.last(100, with_timestamp=True)] == [1.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0]
+    assert [s[1] for s in ring.last(100)[:3]] == ["0.50", "2.50", "4.00"]
+
+
+def test_last_does_not_copy_history() -> None:
+    small = SampleRing(capacity=64)
+    large = SampleRing(capacity=256 * 1024)
+    for ring in (small, large):
+        for i in range(ring.capacity):
+            ring.append(float(i), "Running", [1.0, 2.0])
+    durations = {}
+    for ring in (small, large):
+        start = time.perf_counter()
+        for _ in range(1000):
+            ring.last(4)
+        durations[ring.capacity] = time.perf_counter() - start
+    assert durations[large.capacity] < 5 * durations[small.capacity]
+
+
+def test_since() -> None:
+    ring = SampleRing(capacity=4)
+    for i in range(3):
+        ring.append(float(i), "Running", [float(i), 0.0])
+    total, samples = ring.since(0)
+    assert total == 3
+    assert samples == [(0.0, "Running", (0.0, 0.0)), (1.0, "Running", (1.0, 0.0)), (2.0, "Running", (2.0, 0.0))]
+    for i in range(3, 10):
+        ring.append(float(i), "Running", [float(i), 0.0])
+    total, samples = ring.since(total)
+    assert total == 10
+    assert [s[0] for s in samples] == [6.0, 7.0, 8.0, 9.0]
+    assert ring.since(total) == (10, [])
@@ -0,0 +1,116 @@
+"""
+Tests for the run statistics time series store.
+"""
+import logging
+import os
+import statistics
+from pathlib import Path
+
+import pytest
+
+from src.byteblower_series import SeriesStore, percentile
+
+logger = logging.getLogger("test_byteblower_series")
+
+
+@pytest.fixture()
+def store(tmp_path: Path) -> SeriesStore:
+    store = SeriesStore(logger, tmp_path.as_posix(), chunk_size=100)
+    yield store
+    store.close()
+
+
+def test_percentile() -> None:
+    assert percentile([1.0], 99) == 1.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile([1.0, 2.0, 3.0, 4.0], 100) == 4.0
+
+
+def test_query(store: SeriesStore) -> None:
+    for i in range(1050):
+        store.append("PORT_A", store.start_time + i, [float(i), float(i % 10)], ["cumulative_mb", "interval_mb"])
+        store.append("EP01", store.start_time + i + 0.5, [float(i % 7)])
+    assert len(store.series["PORT_A"]) == 1050
+    assert store.series["PORT_A"].spill_files[0].size == 1000
+
+    summary = store.query()
+    assert summary["PORT_A"]["cumulative_mb"]["count"] == 1050
+    assert summary["PORT_A"]["cumulative_mb"]["max"] == 1049.0
+    assert summary["EP01"]["value1"]["mean"] == pytest.approx(statistics.mean(i % 7 for i in range(1050)))
+
+    # window crosses the spilled and in memory samples.
+    summary = store.query(["PORT_A"], start=950, end=1010, percentiles=[50, 99])
+    assert list(summary) == ["PORT_A"]
+    cumulative = summary["PORT_A"]["cumulative_mb"]
+    assert cumulative["count"] == 61
+    assert (cumulative["min"], cumulative["max"], cumulative["mean"]) == (950.0, 1010.0, 980.0)
+    assert cumulative["p50"] == 980.0
+    assert summary["PORT_A"]["interval_mb"]["max"] == 9.0
+
+    assert store.query(["PORT_A"], start=5000)["PORT_A"]["cumulative_mb"] == {"count": 0}
+    with pytest.raises(Exception, match="No statistics for PORT_B"):
+        store.query(["PORT_B"])
+
+
+def test_close(store: SeriesStore) -> None:
+    for i in range(150):
+        store.append("PORT_A", store.start_time + i, [float(i)])
+    store.query()
+    spill_dir = store.spill_dir
+    assert os.listdir(spill_dir)
+    store.close()
+    assert not os.path.exists(spill_dir)
+
+
+def test_out_of_order(store: SeriesStore) -> None:
+    # every 10th sample arrives 2.5 seconds late, across the spilled and in memory samples.
+    times = [i - 2.5 if i % 10 == 9 else i for i in range(150)]
+    for i, t in enumerate(times):
+        store.append("PORT_A", store.start_time + t, [float(i)])
+    series = store.series["PORT_A"]
+    clamped = [series.spill_files[0].values()[i] - store.start_time for i in range(100)] + [
+        t - store.start_time for t in series.columns[0]
+    ]
+    assert clamped == [max(times[: i + 1]) for i in range(150)]
+
+    assert store.query(start=8, end=8)["PORT_A"]["value1"]["count"] == 2
+    assert store.query(start=97.5, end=100)["PORT_A"]["value1"]["count"] == 3
+    assert store.query()["PORT_A"]["value1"]["count"] == 150
+
+    delta = store.delta()
+    assert [s[1] for s in delta["series"]["PORT_A"]["samples"]] == [float(i) for i in range(150)]
+    store.append("PORT_A", store.start_time + 150, [150.0])
+    store.append("PORT_A", store.start_time + 149, [151.0])
+    delta = store.delta(delta["cursor"])
+    assert delta["series"]["PORT_A"]["samples"] == [[150.0, 150.0], [150.0, 151.0]]
+
+
+def test_delta(store: SeriesStore) -> None:
+    for i in range(150):
+        store.append("PORT_A", store.start_time + i, [float(i), float(i % 10)], ["cumulative_mb", "interval_mb"])
+    delta = store.delta()
+    assert delta["series"]["PORT_A"]["columns"] == ["time", "cumulative_mb", "interval_mb"]
+    # samples cross the spilled and in memory samples.
+    assert len(delta["series"]["PORT_A"]["samples"]) == 150
+    assert delta["series"]["PORT_A"]["samples"][-1] == [149.0, 149.0, 9.0]
+    assert not delta["reset"]
+
+    store.append("PORT_A", store.start_time + 150, [150.0])
+    store.append("EP01", store.start_time + 149.5, [1.0])
+    delta = store.delta(delta["cursor"])
+    assert delta["series"] == {
+        "PORT_A": {"columns": ["time", "cumulative_mb", "interval_mb"], "samples": [[150.0, 150.0, None]]},
+        "EP01": {"columns": ["time", "value1"], "samples": [[149.5, 1.0]]},
+    }
+    assert store.delta(delta["cursor"])["series"] == {}
+
+    delta = store.delta(None, ["PORT_A"], interval=60)
+    assert delta["series"]["PORT_A"]["columns"] == ["time", "count", "cumulative_mb", "interval_mb"]
+    assert delta["series"]["PORT_A"]["samples"] == [[0.0, 60, 29.5, 4.5], [60.0, 60, 89.5, 4.5], [120.0, 31, 135.0, 4.5]]
+
+    other = SeriesStore(logger)
+    delta = other.delta(delta["cursor"])
+    assert delta["reset"]
+    assert delta["series"] == {}
+    with pytest.raises(Exception, match="No statistics for PORT_B"):
+        store.delta(names=["PORT_B"])
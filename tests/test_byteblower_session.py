@@ -0,0 +1,56 @@
+"""
+Tests for the session scoped ByteBlower API objects.
+"""
+import logging
+
+from src.byteblower_session import ByteBlowerSession
+from tests.byteblower_stand_ins import StubByteBlower
+
+logger = logging.getLogger("test_byteblower_session")
+
+
+def test_session() -> None:
+    bb = StubByteBlower.InstanceGet()
+    bb.servers.clear()
+    session = ByteBlowerSession(logger, bb)
+    ports = {"WAN_PORT": ("trunk-1-1", None), "PORT_A": ("trunk-1-2", "ip and host 10.0.0.2")}
+    bb_ports = session.setup("10.1.1.1", ports)
+    server = bb.servers[-1]
+    assert [p.interface for p in server.ports] == ["trunk-1-1", "trunk-1-2"]
+    assert server.ports[1].triggers[0].filter == "ip and host 10.0.0.2"
+    wan_history = bb_ports["WAN_PORT"]
+    wan_history.Refresh()
+
+    # same ports, one changed filter and one new port.
+    ports["PORT_A"] = ("trunk-1-2", "ip and host 10.0.0.3")
+    ports["PORT_B"] = ("trunk-1-3", None)
+    bb_ports = session.setup("10.1.1.1", ports)
+    assert bb.servers == [server]
+    assert bb_ports["WAN_PORT"] is wan_history
+    assert wan_history.refreshes == 0
+    assert server.ports[1].triggers[0].filter == "ip and host 10.0.0.3"
+    assert session.counters["servers_reused"] == 1
+    assert session.counters["ports_reused"] == 2
+    assert session.counters["ports_created"] == 3
+    assert session.counters["filters_set"] == 2
+
+    # removed port is destroyed on release, once its result history is no longer used.
+    del ports["WAN_PORT"]
+    session.setup("10.1.1.1", ports)
+    assert [p.interface for p in server.ports] == ["trunk-1-1", "trunk-1-2", "trunk-1-3"]
+    session.release()
+    assert [p.interface for p in server.ports] == ["trunk-1-2", "trunk-1-3"]
+    assert session.counters["ports_destroyed"] == 1
+
+    # new server address replaces all objects.
+    session.setup("10.1.1.2", ports)
+    assert [s.address for s in bb.servers] == ["10.1.1.1", "10.1.1.2"]
+    assert [p.interface for p in server.ports] == ["trunk-1-2", "trunk-1-3"]
+    session.release()
+    assert [s.address for s in bb.servers] == ["10.1.1.2"]
+    assert not server.ports
+    assert session.counters["servers_created"] == 2
+
+    session.close()
+    assert not bb.servers
+    assert not session.ports
@@ -0,0 +1,88 @@
+"""
+Tests for the timing spans.
+"""
+import json
+import logging
+import threading
+from pathlib import Path
+
+import pytest
+
+from src.byteblower_spans import SPANS_ENV, Spans, spans_enabled
+
+
+@pytest.fixture
+def logger() -> logging.Logger:
+    logger = logging.getLogger("test_spans")
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def test_nested_spans(logger: logging.Logger, tmp_path: Path) -> None:
+    metrics_file = tmp_path.joinpath("metrics.jsonl")
+    spans = Spans(logger, metrics_file.as_posix())
+    with spans.span("load_config", scenario="s1"):
+        with spans.span("project"):
+            pass
+        # nested records are written with their root span.
+        assert not metrics_file.exists()
+        with spans.span("server_setup"):
+            pass
+    with spans.span("get_test_status"):
+        pass
+    records = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert [r["span"] for r in records] == [
+        "load_config/project",
+        "load_config/server_setup",
+        "load_config",
+        "get_test_status",
+    ]
+    assert [r["depth"] for r in records] == [1, 1, 0, 0]
+    assert records[2]["scenario"] == "s1"
+    assert records[2]["duration"] >= max(records[0]["duration"], records[1]["duration"])
+
+
+def test_span_error(logger: logging.Logger, tmp_path: Path) -> None:
+    metrics_file = tmp_path.joinpath("metrics.jsonl")
+    spans = Spans(logger, metrics_file.as_posix())
+    with pytest.raises(ValueError):
+        with spans.span("start_traffic"):
+            with spans.span("clt_start"):
+                raise ValueError("CLT failed")
+    records = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert [(r["span"], r["error"]) for r in records] == [
+        ("start_traffic/clt_start", "CLT failed"),
+        ("start_traffic", "CLT failed"),
+    ]
+
+
+def test_spans_per_thread(logger: logging.Logger, tmp_path: Path) -> None:
+    metrics_file = tmp_path.joinpath("metrics.jsonl")
+    spans = Spans(logger, metrics_file.as_posix())
+
+    def command(name: str) -> None:
+        for _ in range(100):
+            with spans.span(name):
+                with spans.span("phase"):
+                    pass
+
+    threads = [threading.Thread(target=command, args=(f"command{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    records = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert len(records) == 800
+    assert {r["span"] for r in records} == {f"command{i}" for i in range(4)} | {f"command{i}/phase" for i in range(4)}
+
+
+def test_disabled(logger: logging.Logger, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    metrics_file = tmp_path.joinpath("metrics.jsonl")
+    monkeypatch.setenv(SPANS_ENV, "off")
+    assert not spans_enabled()
+    spans = Spans(logger, metrics_file.as_posix(), enabled=spans_enabled())
+    with spans.span("load_config"):
+        pass
+    assert not metrics_file.exists()
+    monkeypatch.delenv(SPANS_ENV)
+    assert spans_enabled()
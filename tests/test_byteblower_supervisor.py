@@ -0,0 +1,95 @@
+"""
+Tests for the CLT process supervisor.
+"""
+import logging
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import psutil
+import pytest
+
+from src.byteblower_supervisor import CltSupervisor, reap_orphan_clts
+from tests.byteblower_stand_ins import write_script
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="fake CLT is POSIX script")
+
+logger = logging.getLogger("test_byteblower_supervisor")
+
+# CLT that runs a child process, with ignore_term both ignore SIGTERM.
+FAKE_CLT_TREE = """
+import signal
+import subprocess
+import sys
+import time
+
+if {ignore_term!r}:
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+if len(sys.argv) == 1:
+    subprocess.Popen([sys.argv[0], "child"])
+print("started", flush=True)
+time.sleep(60)
+"""
+
+
+def _start_clt(tmp_path: Path, ignore_term: bool) -> subprocess.Popen:
+    clt = write_script(tmp_path.joinpath("ByteBlower-CLT"), FAKE_CLT_TREE.format(ignore_term=ignore_term))
+    popen = subprocess.Popen([clt], stdout=subprocess.PIPE)
+    assert popen.stdout.readline() == b"started\n"
+    return popen
+
+
+@pytest.mark.parametrize("ignore_term", [False, True])
+def test_stop(tmp_path: Path, ignore_term: bool) -> None:
+    popen = _start_clt(tmp_path, ignore_term)
+    supervisor = CltSupervisor(logger, popen.pid, terminate_timeout=0.5)
+    # wait for the child process.
+    for _ in range(50):
+        supervisor._refresh_tree()
+        if len(supervisor.tree) == 2:
+            break
+        time.sleep(0.1)
+    tree = list(supervisor.tree)
+    assert len(tree) == 2
+
+    cpu_percent, rss_mb = supervisor.sample()
+    assert cpu_percent >= 0
+    assert rss_mb > 1
+
+    start = time.perf_counter()
+    killed = supervisor.stop()
+    assert sorted(killed) == (sorted(tree) if ignore_term else [])
+    assert time.perf_counter() - start < (2 if ignore_term else 0.5)
+    popen.wait(5)
+    assert not any(psutil.pid_exists(pid) and psutil.Process(pid).status() != psutil.STATUS_ZOMBIE for pid in tree)
+    assert supervisor.sample() is None
+
+
+def test_reap_orphan_clts(tmp_path: Path) -> None:
+    clt = write_script(tmp_path.joinpath("ByteBlower-CLT"), FAKE_CLT_TREE.format(ignore_term=True))
+    running = _start_clt(tmp_path, ignore_term=False)
+    # the shell exits right away so the CLT started in background is orphan.
+    subprocess.run(["sh", "-c", f"{clt} child > /dev/null &"], check=True)
+    orphans = []
+    for _ in range(50):
+        orphans = [
+            p.pid
+            for p in psutil.process_iter(["ppid", "cmdline"])
+            if p.info["cmdline"] and p.info["cmdline"][-2:] == [clt, "child"] and p.info["ppid"] != running.pid
+        ]
+        if orphans:
+            break
+        time.sleep(0.1)
+    assert len(orphans) == 1
+    parent = psutil.Process(orphans[0]).ppid()
+    if parent != 1 and psutil.pid_exists(parent):
+        CltSupervisor(logger, running.pid, terminate_timeout=0.5).stop()
+        psutil.Process(orphans[0]).kill()
+        pytest.skip(f"orphans are re-parented to subreaper {parent}")
+
+    assert orphans[0] in reap_orphan_clts(logger)
+    assert not psutil.pid_exists(orphans[0]) or psutil.Process(orphans[0]).status() == psutil.STATUS_ZOMBIE
+    # CLT with live parent is not touched.
+    assert running.poll() is None
+    CltSupervisor(logger, running.pid, terminate_timeout=0.5).stop()
@@ -0,0 +1,199 @@
+"""
+Tests for the endpoints connection pool and the agent status reader.
+"""
+import logging
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import byteblower_threads
+from src.byteblower_threads import (
+    EP_REGISTERED_RE,
+    EP_STATUS_READER_CODE,
+    EpAgent,
+    EpConnectionPool,
+    EpThread,
+    is_transport_error,
+)
+
+logger = logging.getLogger("test_byteblower_threads")
+
+
+class FakeConnection:
+    """Stand-in for an RPyC classic connection."""
+
+    def __init__(self) -> None:
+        self.closed = False
+        self.dead = False
+        self.pings = 0
+
+    def ping(self, timeout: float) -> None:
+        self.pings += 1
+        if self.dead:
+            raise EOFError("connection closed by peer")
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture()
+def connections(monkeypatch: pytest.MonkeyPatch) -> list:
+    connections = []
+    monkeypatch.setattr(
+        byteblower_threads, "connect_endpoint", lambda *_: connections.append(FakeConnection()) or connections[-1]
+    )
+    return connections
+
+
+def test_pool_reuse_and_ping(connections: list) -> None:
+    pool = EpConnectionPool(logger, ping_interval=60)
+    conn = pool.get("10.0.0.1")
+    assert pool.get("10.0.0.1") is conn
+    assert pool.get("10.0.0.2") is not conn
+    assert (pool.created, pool.reused, pool.reconnected) == (2, 1, 0)
+    # recently used connections are not pinged.
+    assert conn.pings == 0
+
+    pool.ping_interval = 0
+    assert pool.get("10.0.0.1") is conn
+    assert conn.pings == 1
+
+    # dead and closed connections are replaced.
+    conn.dead = True
+    new_conn = pool.get("10.0.0.1")
+    assert new_conn is not conn and conn.closed
+    new_conn.closed = True
+    assert pool.get("10.0.0.1") is connections[-1]
+    assert (pool.created, pool.reused, pool.reconnected) == (4, 2, 2)
+
+    pool.close()
+    assert all(c.closed for c in connections)
+
+
+def test_pool_discard(connections: list) -> None:
+    pool = EpConnectionPool(logger)
+    conn = pool.get("10.0.0.1")
+    assert pool.discard("10.0.0.1")
+    assert conn.closed
+    assert pool.get("10.0.0.1") is not conn
+
+    # connections held by running agents are not discarded.
+    held = pool.get("10.0.0.2", hold=True)
+    pool.get("10.0.0.2", hold=True)
+    assert not pool.discard("10.0.0.2")
+    pool.release("10.0.0.2")
+    assert not pool.discard("10.0.0.2")
+    pool.release("10.0.0.2")
+    assert not held.closed
+    assert pool.discard("10.0.0.2")
+    assert held.closed
+
+
+def test_is_transport_error() -> None:
+    assert is_transport_error(EOFError("stream has been closed"))
+    assert is_transport_error(ConnectionResetError())
+    assert is_transport_error(byteblower_threads.rpyc.AsyncResultTimeout("result expired"))
+    remote_error = FileNotFoundError("netsh")
+    remote_error._remote_tb = "Traceback (most recent call last): ..."
+    assert not is_transport_error(remote_error)
+    assert not is_transport_error(ValueError())
+
+
+class FakeAgentPopen:
+    """Stand-in for the agent Popen, stdout returns the lines then EOF once released."""
+
+    def __init__(self, lines: list, exit_code: int = 0) -> None:
+        self.lines = [line.encode() + b"\n" for line in lines]
+        self.exit_code = exit_code
+        self.release = threading.Event()
+        self.stdout = self
+
+    def readline(self) -> bytes:
+        if self.lines:
+            return self.lines.pop(0)
+        self.release.wait(5)
+        return b""
+
+    def poll(self) -> int:
+        return self.exit_code if self.release.is_set() else None
+
+
+def _reader(popen: FakeAgentPopen, max_samples: int = 100, clock_skew: float = 0) -> object:
+    """Status reader executed locally, the endpoint clock is clock_skew seconds ahead of the local clock."""
+    namespace = {}
+    exec(EP_STATUS_READER_CODE, namespace)
+    namespace["time"] = SimpleNamespace(time=lambda: time.time() + clock_skew)
+    return namespace["EpStatusReader"](popen, EP_REGISTERED_RE.pattern, max_samples)
+
+
+def _drain_all(reader: object) -> tuple:
+    samples = ()
+    for _ in range(50):
+        new_samples, registered, eof, exit_code, _ = reader.drain(0.1)
+        samples += new_samples
+        if len(samples) and not reader.popen.lines:
+            return samples, registered, eof, exit_code
+    return samples, registered, eof, exit_code
+
+
+@pytest.mark.parametrize(
+    "line,registered",
+    [
+        ("Status: Registered 0.00 0.00", True),
+        ("status: ARMED 1.50 2.50", True),
+        ("Status: Running 10.00 20.00", True),
+        ("Status: not registered 0.00 0.00", False),
+        ("Status: Unregistered 0.00 0.00", False),
+        ("running self-test", False),
+        ("Endpoint registered with meeting point", False),
+    ],
+)
+def test_reader_registration(line: str, registered: bool) -> None:
+    popen = FakeAgentPopen([line, "Status: Idle 0.00 0.00"])
+    reader = _reader(popen)
+    _, is_registered, _, _ = _drain_all(reader)
+    assert is_registered == registered
+    popen.release.set()
+
+
+def test_reader_samples_and_exit_code() -> None:
+    popen = FakeAgentPopen(["starting agent", "Status: Registered 1.00 2.00", "Status: Running 3.50 4.25"], exit_code=3)
+    reader = _reader(popen)
+    samples, registered, eof, exit_code = _drain_all(reader)
+    assert [(state, values) for _, state, values in samples] == [("Registered", (1.0, 2.0)), ("Running", (3.5, 4.25))]
+    assert registered and not eof and exit_code is None
+    popen.release.set()
+    reader.thread.join(5)
+    assert reader.drain(0)[:4] == ((), True, True, 3)
+
+
+def test_reader_bounded_backlog() -> None:
+    popen = FakeAgentPopen([f"Status: Running {i}.00 0.00" for i in range(50)])
+    reader = _reader(popen, max_samples=10)
+    popen.release.set()
+    reader.thread.join(5)
+    samples, _, eof, exit_code, _ = reader.drain(0)
+    # only the newest samples are kept while nobody drains.
+    assert [values[0] for _, _, values in samples] == [float(i) for i in range(40, 50)]
+    assert eof and exit_code == 0
+
+
+def test_ep_thread_clock_skew() -> None:
+    popen = FakeAgentPopen(["Status: Registered 1.00 2.00", "Status: Running 3.00 4.00"])
+    ep_thread = EpThread(logger, EpAgent("EP01", "10.0.0.1", "10.0.0.254", "agent.exe"), interval=0.1)
+    ep_thread.popen = popen
+    # the endpoint clock is an hour behind the controller clock.
+    ep_thread.reader = _reader(popen, clock_skew=-3600)
+    ep_thread.start()
+    assert ep_thread.registered.wait(5)
+    time.sleep(0.3)
+    ep_thread.stop_task()
+    popen.release.set()
+    ep_thread.join(5)
+    _, samples = ep_thread.counters.since(0)
+    assert [state for _, state, _ in samples] == ["Registered", "Running"]
+    # the samples are stored in the controller clock.
+    assert all(abs(time.time() - timestamp) < 5 for timestamp, _, _ in samples)
+    assert ep_thread.clock_offset == pytest.approx(3600, abs=1)